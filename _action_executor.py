@@ -0,0 +1,315 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Executes the actions of recognized utterances on a thread of their own.
+
+RepeatRule used to execute its actions on the thread that delivers
+recognitions, so a long macro, e.g. a series of keys with "enter/100" delays,
+held up the next recognition. RepeatRule now submits the actions of an
+utterance that only sends keys to the executor and returns. The executor runs
+them one utterance after the other, in the order they were spoken. Other
+actions, such as Function and Mimic, may call into the engine, which is only
+safe on the thread that delivers recognitions. Utterances with such actions
+are run there, after the queued utterances, but without waiting for them: they
+are queued as well, and once the executor reaches one, a timer on the engine
+thread runs it while the executor waits. Recognition goes on meanwhile, so
+"stop" still works while a long macro runs ahead of such an utterance.
+
+The queue is bounded: if it is full, the utterance is dropped and reported,
+rather than executed long after it was spoken. Speaking "stop" runs
+CancelAction right away, which drops the queued utterances and stops the
+running one at the next checkpoint: between actions, between keystroke bursts
+and before each Key or Text action sends its keys.
+"""
+
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from dragonfly import (
+    ActionBase,
+    ActionSeries,
+    BoundAction,
+    Key,
+    Pause,
+    Text,
+)
+from dragonfly.timer import Timer
+
+from _dragonfly_utils import wrap_keyboards
+from _lazy_actions import LazyAction
+
+# Set to False to execute actions on the recognition thread, like before.
+enabled = True
+
+
+class Cancelled(Exception):
+    """Raised at a checkpoint of an utterance that was cancelled."""
+
+
+class ExecutorStats(object):
+
+    def __init__(self):
+        self.submitted = 0
+        self.inline = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, wait):
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def report(self):
+        started = max(self.completed + self.cancelled, 1)
+        return ("Executor: %d utterances, %d completed, %d cancelled, "
+                "%d rejected, %d run on the recognition thread; queue depth "
+                "max %d; wait %.1f ms average, %.1f ms max" % (
+                    self.submitted,
+                    self.completed,
+                    self.cancelled,
+                    self.rejected,
+                    self.inline,
+                    self.max_depth,
+                    self.total_wait * 1000 / started,
+                    self.max_wait * 1000))
+
+
+class _Deferred(object):
+    """An utterance to run on the engine thread once the executor reaches it.
+    done is set when it has run or was dropped.
+    """
+
+    def __init__(self, generation, function, args):
+        self.generation = generation
+        self.function = function
+        self.args = args
+        self.done = threading.Event()
+
+
+class ActionExecutor(object):
+    """Worker thread with a bounded queue of utterances. cleanup is called
+    after an utterance was cancelled, e.g. to release held modifier keys.
+    """
+
+    def __init__(self, max_pending=8, cleanup=None, poll_interval=0.02):
+        self.max_pending = max_pending
+        self.cleanup = cleanup
+        self.poll_interval = poll_interval
+        self.stats = ExecutorStats()
+        self._queue = queue.Queue(max_pending)
+        # Deferred utterances the executor has reached, see run().
+        self._reached = queue.Queue()
+        self._timer = None
+        self._thread = None
+        # Utterances submitted before the last cancellation are dropped.
+        self._generation = 0
+        self._running_generation = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run,
+                                            name="ActionExecutor")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def submit(self, function, *args):
+        """Queues function(*args) and returns whether it was accepted. Without
+        enabled, it is called right away.
+        """
+        if not enabled:
+            function(*args)
+            return True
+        if not self._put(function, args):
+            return False
+        self.stats.submitted += 1
+        return True
+
+    def run(self, function, *args):
+        """Calls function(*args) on the calling thread, the engine thread, after
+        the queued utterances have been executed. If there are any, it is
+        queued behind them and returns right away, and a timer calls it once
+        the executor reaches it. Returns whether it was accepted.
+        """
+        if not enabled or not self._queue.unfinished_tasks:
+            self.stats.inline += 1
+            function(*args)
+            return True
+        if self._timer is None:
+            self._timer = Timer(self.run_deferred, self.poll_interval)
+        return self._put(self._defer,
+                         (_Deferred(self._generation, function, args),))
+
+    def run_deferred(self):
+        """Calls the deferred utterances the executor has reached, dropping
+        those queued before a cancellation. Called on the engine thread.
+        """
+        while True:
+            try:
+                deferred = self._reached.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if deferred.generation == self._generation:
+                    self.stats.inline += 1
+                    deferred.function(*deferred.args)
+            except Exception as error:
+                print("Executor: %s failed: %r" % (deferred.function, error))
+            finally:
+                deferred.done.set()
+
+    def _put(self, function, args):
+        self.start()
+        try:
+            self._queue.put_nowait((self._generation, time.time(), function,
+                                    args))
+        except queue.Full:
+            self.stats.rejected += 1
+            print("Executor queue full, utterance dropped.")
+            return False
+        self.stats.max_depth = max(self.stats.max_depth, self._queue.qsize())
+        return True
+
+    def _defer(self, deferred):
+        """Hands a deferred utterance to the engine thread and waits until it
+        has run, or until it is cancelled.
+        """
+        self._reached.put(deferred)
+        while not deferred.done.wait(self.poll_interval):
+            self.checkpoint()
+
+    def cancel(self):
+        """Drops the queued utterances and stops the running one."""
+        self._generation += 1
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            self.stats.cancelled += 1
+
+    def checkpoint(self):
+        """Raises Cancelled if called by the executor thread while running an
+        utterance that was cancelled.
+        """
+        if threading.current_thread() is self._thread \
+                and self._running_generation is not None \
+                and self._running_generation != self._generation:
+            raise Cancelled()
+
+    def wait(self):
+        """Waits until the queued utterances have been executed, running the
+        deferred ones on the calling thread, which must be the engine thread.
+        """
+        while self._queue.unfinished_tasks:
+            self.run_deferred()
+            time.sleep(0.001)
+        self.run_deferred()
+
+    def stop(self):
+        """Executes the queued utterances and ends the thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self.wait()
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            generation, submitted, function, args = item
+            try:
+                if generation != self._generation:
+                    self.stats.cancelled += 1
+                    continue
+                self.stats.record_wait(time.time() - submitted)
+                self._running_generation = generation
+                try:
+                    function(*args)
+                    # Deferred utterances count as run on the engine thread.
+                    if function != self._defer:
+                        self.stats.completed += 1
+                except Cancelled:
+                    self.stats.cancelled += 1
+                    self._running_generation = None
+                    if self.cleanup:
+                        self.cleanup()
+                except Exception as error:
+                    print("Executor: %s failed: %r" % (function, error))
+                finally:
+                    self._running_generation = None
+            finally:
+                self._queue.task_done()
+
+
+# Shared executor, kept alive across reloads of the command modules.
+executor = ActionExecutor()
+
+
+class CancellableKeyboard(object):
+    """Wraps the keyboard of Key and Text, checking for cancellation before
+    sending.
+    """
+
+    def __init__(self, keyboard):
+        self.keyboard = keyboard
+
+    def send_keyboard_events(self, events):
+        executor.checkpoint()
+        self.keyboard.send_keyboard_events(events)
+
+
+wrap_keyboards(CancellableKeyboard)
+
+
+class CancelAction(ActionBase):
+    """Cancels the running and queued utterances. RepeatRule executes it on
+    recognition instead of queueing it.
+    """
+
+    immediate = True
+
+    def _execute(self, data=None):
+        executor.cancel()
+
+
+def is_immediate(action):
+    """Returns whether the action must run on recognition, before the others
+    of its utterance are queued.
+    """
+    while True:
+        if isinstance(action, BoundAction):
+            action = action._action
+        elif isinstance(action, LazyAction):
+            action = action.action
+        else:
+            return getattr(action, "immediate", False)
+
+
+def sends_keys_only(action):
+    """Returns whether the action only sends keys through Key and Text, see
+    _keystroke_batching, so that it can run on the executor thread.
+    """
+    if isinstance(action, BoundAction):
+        return sends_keys_only(action._action)
+    elif isinstance(action, LazyAction):
+        return sends_keys_only(action.action)
+    elif isinstance(action, ActionSeries):
+        return all(sends_keys_only(child) for child in action._actions)
+    return (isinstance(action, (Key, Text, Pause))
+            or hasattr(action, "build_action")
+            or getattr(action, "batchable", False))
@@ -1,8 +1,9 @@
 import _dragonfly_utils as utils
 
+from _dict_lists import dict_lists
+from _spelled_sequences import spelled_sequence
+
 from dragonfly import (
-    DictList,
-    DictListRef,
     Function,
     RuleWrap,
     Text,
@@ -65,23 +66,24 @@ character_action_map = {
 char_map = dict((k, v.strip())
                 for (k, v) in utils.combine_maps(letters_map).iteritems())
 
-# Simple elements that may be referred to within a rule.
-numbers_dict_list  = DictList("numbers_dict_list", numbers_map)
-letters_dict_list = DictList("letters_dict_list", letters_map)
-char_dict_list = DictList("char_dict_list", char_map)
-letters_map_dict_list = DictList("letters_map_dict_list", letters_map)
+# Simple elements that may be referred to within a rule. The letter lists hold
+# the same items, so they share one list in the grammar.
+numbers_dict_list = dict_lists.get("numbers_dict_list", numbers_map)
+letters_dict_list = dict_lists.get("letters_dict_list", letters_map)
+char_dict_list = dict_lists.get("char_dict_list", char_map)
+letters_map_dict_list = dict_lists.get("letters_map_dict_list", letters_map)
 
 # A sequence of either short letters or long letters.
-letters_element = RuleWrap(None, utils.JoinedRepetition(
-    "", DictListRef(None, letters_dict_list), min=1, max=10))
+letters_element = RuleWrap(None, spelled_sequence(
+    letters_dict_list, min=1, max=10))
 
 # A sequence of numbers.
-numbers_element = RuleWrap(None, utils.JoinedRepetition(
-    "", DictListRef(None, numbers_dict_list), min=0, max=10))
+numbers_element = RuleWrap(None, spelled_sequence(
+    numbers_dict_list, min=0, max=10))
 
 # A sequence of characters.
-chars_element = RuleWrap(None, utils.JoinedRepetition(
-    "", DictListRef(None, char_dict_list), min=0, max=10))
+chars_element = RuleWrap(None, spelled_sequence(
+    char_dict_list, min=0, max=10))
 
 # Rule for printing a sequence of characters.
 character_rule = utils.create_rule(
@@ -0,0 +1,204 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Clipboard access shared by the actions that paste through the clipboard.
+
+Opening the clipboard fails while another application holds it open, so
+ClipboardService retries with a doubling delay, up to max_retry_delay, before
+giving up with ClipboardError. paste() puts text on the clipboard and executes
+the action that pastes it. With restore, it then restores the previous text.
+The actions of _commands.py leave the text on the clipboard, like they did
+before, and PasteText restores it, see _text_insertion. Only text is restored,
+so callers that must not lose other data, e.g. an image, check
+holds_other_data() first. The time spent opening the clipboard and the retries
+are counted in stats.
+
+The clipboard itself is accessed through a backend: Win32Backend uses
+win32clipboard, and MemoryBackend keeps the text in memory, e.g. to run and
+benchmark the actions on Linux.
+"""
+
+import time
+
+try:
+    import win32clipboard
+except ImportError:
+    win32clipboard = None
+
+
+class ClipboardError(Exception):
+    """Raised when the clipboard cannot be opened."""
+
+
+class Win32Backend(object):
+
+    def __init__(self):
+        self.errors = (win32clipboard.error,)
+        # Formats Windows converts the text to.
+        self.text_formats = set([win32clipboard.CF_TEXT,
+                                 win32clipboard.CF_UNICODETEXT,
+                                 win32clipboard.CF_OEMTEXT,
+                                 win32clipboard.CF_LOCALE])
+
+    def open(self):
+        win32clipboard.OpenClipboard()
+
+    def close(self):
+        win32clipboard.CloseClipboard()
+
+    def get_text(self):
+        if not win32clipboard.IsClipboardFormatAvailable(
+                win32clipboard.CF_UNICODETEXT):
+            return None
+        return win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
+
+    def set_text(self, text):
+        win32clipboard.EmptyClipboard()
+        win32clipboard.SetClipboardData(win32clipboard.CF_UNICODETEXT,
+                                        unicode(text))
+
+    def holds_other_data(self):
+        format = win32clipboard.EnumClipboardFormats(0)
+        while format:
+            if format not in self.text_formats:
+                return True
+            format = win32clipboard.EnumClipboardFormats(format)
+        return False
+
+
+class ClipboardBusy(Exception):
+    pass
+
+
+class MemoryBackend(object):
+    """Keeps the clipboard text in memory. Opening fails while busy is
+    positive, counting it down, to simulate another application holding the
+    clipboard. other_data is set to simulate data other than text, e.g. an
+    image.
+    """
+
+    errors = (ClipboardBusy,)
+
+    def __init__(self, text=None):
+        self.text = text
+        self.other_data = None
+        self.busy = 0
+
+    def open(self):
+        if self.busy > 0:
+            self.busy -= 1
+            raise ClipboardBusy()
+
+    def close(self):
+        pass
+
+    def get_text(self):
+        return self.text
+
+    def set_text(self, text):
+        self.text = unicode(text)
+        self.other_data = None
+
+    def holds_other_data(self):
+        return self.other_data is not None
+
+
+class ClipboardStats(object):
+
+    def __init__(self):
+        self.opens = 0
+        self.retries = 0
+        self.failures = 0
+        self.restores = 0
+        self.total_open_time = 0.0
+        self.max_open_time = 0.0
+
+    def record_open(self, seconds):
+        self.opens += 1
+        self.total_open_time += seconds
+        self.max_open_time = max(self.max_open_time, seconds)
+
+    def report(self):
+        return ("Clipboard: %d opens, %d retries, %d failures, %d restores; "
+                "open %.1f ms average, %.1f ms max" % (
+                    self.opens, self.retries, self.failures, self.restores,
+                    self.total_open_time * 1000 / max(self.opens, 1),
+                    self.max_open_time * 1000))
+
+
+class ClipboardService(object):
+
+    def __init__(self, backend=None, retries=6, retry_delay=0.01,
+                 max_retry_delay=0.16, restore=False, restore_delay=0.1):
+        if backend is None:
+            backend = Win32Backend() if win32clipboard else MemoryBackend()
+        self.backend = backend
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # Whether paste() restores the previous text by default, and how long
+        # it waits for the application to read the clipboard before.
+        self.restore = restore
+        self.restore_delay = restore_delay
+        self.sleep = time.sleep
+        self.stats = ClipboardStats()
+
+    def _open(self):
+        start = time.time()
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                self.backend.open()
+                self.stats.record_open(time.time() - start)
+                return
+            except self.backend.errors:
+                if attempt == self.retries:
+                    break
+                self.stats.retries += 1
+                self.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+        self.stats.failures += 1
+        raise ClipboardError("Could not open the clipboard after %d retries."
+                             % self.retries)
+
+    def get_text(self):
+        """Returns the text on the clipboard, or None if it holds no text."""
+        self._open()
+        try:
+            return self.backend.get_text()
+        finally:
+            self.backend.close()
+
+    def set_text(self, text):
+        self._open()
+        try:
+            self.backend.set_text(text)
+        finally:
+            self.backend.close()
+
+    def holds_other_data(self):
+        """Returns whether the clipboard holds data other than text, which
+        paste() would not restore.
+        """
+        self._open()
+        try:
+            return self.backend.holds_other_data()
+        finally:
+            self.backend.close()
+
+    def paste(self, text, action, restore=None):
+        """Puts text on the clipboard and executes action, which pastes it.
+        Then restores the previous text, if restore, by default self.restore.
+        """
+        restore = self.restore if restore is None else restore
+        previous = self.get_text() if restore else None
+        self.set_text(text)
+        action.execute()
+        if previous is not None:
+            self.sleep(self.restore_delay)
+            self.set_text(previous)
+            self.stats.restores += 1
+
+
+# Shared service, kept alive across reloads of the command modules.
+clipboard = ClipboardService()
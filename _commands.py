@@ -18,50 +18,97 @@ try:
 except ImportError:
     pass
 
-import win32clipboard
-
 from dragonfly import (
     ActionBase,
     Alternative,
     AppContext,
     CompoundRule,
     Config,
-    DictList,
-    DictListRef,
     Dictation,
     Function,
-    Grammar,
     IntegerRef,
-    Key,
-    List,
     ListRef,
     Mimic,
-    Mouse,
     Optional,
     Pause,
     Repeat,
     Repetition,
     RuleRef,
     RuleWrap,
-    Text,
+    Window,
     get_engine,
 )
 
 import dragonfly.log
 import _dragonfly_utils as utils
+import _lazy_actions
 import _personal_info as info
 
+# Actions in the maps below are only built when they are first spoken.
+from _lazy_actions import (
+    Key,
+    Mouse,
+    Text,
+)
+
+from _action_executor import (
+    CancelAction,
+    executor,
+)
+
 from _characters_and_numbers import (
     char_dict_list,
     letters_map_dict_list,
 )
 
+from _clipboard import clipboard
+from _dict_lists import dict_lists
+
 from _environment import Environment
 
+from _environment_resolver import (
+    FocusActivator,
+    ResolverGrammar,
+)
+from _format_cache import format_cache
+from _grammar_analysis import (
+    GrammarBudget,
+    check_environments,
+)
+from _identifier_index import (
+    IdentifierRefresher,
+    identifier_index,
+)
+from _incremental_reload import grammar_reloader
+from _keystroke_peephole import stats as peephole_stats
+from _latency import recorder as latency_recorder
+from _modifier_state import tracker as modifier_tracker
+from _utterance_recording import recorder as utterance_recorder
+from _pacing import (
+    Calibrator,
+    pacer,
+)
+from _rule_cache import rule_cache
+from _spelled_sequences import spelled_sequence
+from _text_insertion import stats as insertion_stats
+from _word_list_server import (
+    WordListServer,
+    WordListUpdater,
+)
+
+from _window_index import window_index
 from _window_switching import (
     outlook_n,
     slack_n,
 )
+from _word_lists import (
+    context_word_list,
+    context_words,
+    prefix_list,
+    prefix_words,
+    suffix_list,
+    suffix_words,
+)
 
 from _problematic_chars import (
     release,
@@ -226,14 +273,19 @@ class ToDir(ActionBase):
         self.clipboard = "explorer.exe " + path if run_explorer else path
 
     def _execute(self, data=None):
-        win32clipboard.OpenClipboard()
-        win32clipboard.EmptyClipboard()
-        try:
-            win32clipboard.SetClipboardData(win32clipboard.CF_UNICODETEXT, unicode(self.clipboard))
-        finally:
-            win32clipboard.CloseClipboard()
-            action = self.prefix + Key("c-v/5, enter")
-            action.execute() 
+        clipboard.paste(self.clipboard, self.prefix + Key("c-v/5, enter"))
+
+
+def calibrate_pacing():
+    """Calibrates the pacing profile of the foreground environment. Speak it with
+    the caret in an empty text field of the application.
+    """
+    window = Window.get_foreground()
+    environment = grammar.resolver.resolve(window.executable, window.title,
+                                           window.handle)
+    pacing = environment.rule.pacing
+    profile = Calibrator(pacing).calibrate()
+    print("Pacing %s: %s" % (pacing, profile.to_dict()))
 
 
 # Actions of commonly used text navigation and mousing commands. These can be
@@ -325,6 +377,12 @@ key_action_map = {
     # Dragon - remapped in Dragon-options
     "act off":      Key("csa-d"), 
     "act sleep":    Key("csa-f"),
+
+    # Pacing
+    "calibrate pacing":     Function(calibrate_pacing),
+
+    # Cancels the running and queued commands.
+    "stop":                 CancelAction(),
    
     # Symbols not working in the symbol_map, written as commands here
     "lake":             lbrace, # {
@@ -351,22 +409,25 @@ key_action_map = {
 command_action_map = utils.combine_maps(utils.text_map_to_action_map(symbol_map), key_action_map)
 #-------------------------------------------------------------------------------
 
-# Lists which will be populated later via RPC.
-context_word_list = List("context_word_list", [])
-prefix_list = List("prefix_list", prefixes)
-suffix_list = List("suffix_list", suffixes)
+# Lists which will be populated later via RPC. The context word list holds the
+# identifiers of the project configured below, see _identifier_index. The lists
+# live in _word_lists, so that they are kept across reloads of this module, and
+# hold the words configured here next to those of the index and of plugins.
+prefix_words.set("config", prefixes)
+suffix_words.set("config", suffixes)
 
 # Simple element map corresponding to keystroke action maps from earlier.
 keystroke_element_map = {
     "n": (IntegerRef(None, 1, 10), 1),
     "text": RuleWrap(None, Alternative([
         Dictation(),
-        DictListRef(None, char_dict_list),
+        dict_lists.ref(char_dict_list),
     ])),
-    "char": DictListRef(None, char_dict_list),
+    "char": dict_lists.ref(char_dict_list),
+    "identifier": ListRef(None, context_word_list),
     "custom_text": RuleWrap(None, Alternative([
         Dictation(),
-        DictListRef(None, char_dict_list),
+        dict_lists.ref(char_dict_list),
         ListRef(None, prefix_list),
         ListRef(None, suffix_list),
     ])),
@@ -392,6 +453,9 @@ global_terminal_action_map =  {
 
     "program <text>":   TextAction(prefix=Key("win/40"), preprocess=True),
 
+    # Identifiers are listed as "written\\spoken".
+    "identifier <identifier>":  Function(lambda identifier: Text(identifier.split("\\")[0]).execute()),
+
 }
 
 global_environment = Environment(name="Global",
@@ -410,14 +474,8 @@ class CommandWindow(ActionBase):
         self.clipboard = "cmd /K \"cd " + path  + "\""
 
     def _execute(self, data=None):
-        win32clipboard.OpenClipboard()
-        win32clipboard.EmptyClipboard()
-        try:
-            win32clipboard.SetClipboardData(win32clipboard.CF_UNICODETEXT, unicode(self.clipboard))
-        finally:
-            win32clipboard.CloseClipboard()
-            action = self.open_run + Key("c-v/5, enter/100") + self.action
-            action.execute()             
+        clipboard.paste(self.clipboard,
+                        self.open_run + Key("c-v/5, enter/100") + self.action)
 
 programming_action_map = {
 
@@ -495,7 +553,7 @@ web_container_map = {
     #"zulu": "z",
 }
 
-web_container_map_dict_list = DictList("web_container_map_dict_list", web_container_map)
+web_container_map_dict_list = dict_lists.get("web_container_map_dict_list", web_container_map)
 
 css_words_map = {
 #     "ace": "a",
@@ -526,7 +584,7 @@ css_words_map = {
 #     "zulu": "z",
 }
 
-css_words_map_dict_list = DictList("css_words_map_dict_list", css_words_map)
+css_words_map_dict_list = dict_lists.get("css_words_map_dict_list", css_words_map)
 
 web_action_map = {
    
@@ -669,7 +727,9 @@ c_sharp_terminal_action_map = {
 ### Chrome
 
 class RepeatAction(ActionBase): 
-   
+    # Only sends keys, see _keystroke_batching.
+    batchable = True
+
     def __init__(self, action):
         super(RepeatAction, self).__init__()
         self.action = action
@@ -692,14 +752,8 @@ class OpenWebsite(ActionBase):
         self.delay = delay
 
     def _execute(self, data=None):
-        win32clipboard.OpenClipboard()
-        win32clipboard.EmptyClipboard()
-        try:
-            win32clipboard.SetClipboardData(win32clipboard.CF_UNICODETEXT, unicode(self.url))
-        finally:
-            win32clipboard.CloseClipboard()
-            action = Key("c-t/5, c-v/5") + Key("enter/" + str(self.delay))
-            action.execute()
+        clipboard.paste(self.url,
+                        Key("c-t/5, c-v/5") + Key("enter/" + str(self.delay)))
 
 chrome_action_map = {
     # https://support.google.com/chrome/answer/157179?hl=en
@@ -777,9 +831,8 @@ chrome_terminal_action_map = {
 }
  
 chrome_element_map = {
-    "letters": utils.JoinedRepetition(
-          "", DictListRef(None, letters_map_dict_list), min=0, max=4),
-    "css_word": DictListRef(None, css_words_map_dict_list),
+    "letters": spelled_sequence(letters_map_dict_list, min=0, max=4),
+    "css_word": dict_lists.ref(css_words_map_dict_list),
 }
 
 chrome_environment = Environment(name="Chrome",
@@ -1070,18 +1123,16 @@ line_char_map = {
     "nine": "9",
 }
 
-line_char_dict_list  = DictList("line_char_dict_list", line_char_map)
+line_char_dict_list  = dict_lists.get("line_char_dict_list", line_char_map)
 
 
 
 studio_element_map = {
-    "num_seq": utils.JoinedRepetition(
-        "", DictListRef(None, line_char_dict_list), min=0, max=6), 
-    "letters": utils.JoinedRepetition(
-        "", DictListRef(None, letters_map_dict_list), min=0, max=4), 
+    "num_seq": spelled_sequence(line_char_dict_list, min=0, max=6), 
+    "letters": spelled_sequence(letters_map_dict_list, min=0, max=4), 
     "text2": RuleWrap(None, Alternative([
         Dictation(),
-        DictListRef(None, char_dict_list),
+        dict_lists.ref(char_dict_list),
     ])), 
 }
 
@@ -1100,12 +1151,10 @@ visual_studio_environment_admin = Environment(name="Visual_studio_admin",
                                  element_map=studio_element_map)
 
 web_storm_element_map = {
-    "web_container": DictListRef(None, web_container_map_dict_list),
-    "css_word": DictListRef(None, css_words_map_dict_list),
-    "num_seq": utils.JoinedRepetition(
-        "", DictListRef(None, line_char_dict_list), min=0, max=6), 
-    "letters": utils.JoinedRepetition(
-        "", DictListRef(None, letters_map_dict_list), min=0, max=4),
+    "web_container": dict_lists.ref(web_container_map_dict_list),
+    "css_word": dict_lists.ref(css_words_map_dict_list),
+    "num_seq": spelled_sequence(line_char_dict_list, min=0, max=6), 
+    "letters": spelled_sequence(letters_map_dict_list, min=0, max=4),
 }
 
 
@@ -1338,14 +1387,7 @@ class PasteEmoji(ActionBase):
         self.enter = Key("enter") if press_enter else Key("")
 
     def _execute(self, data=None):
-        win32clipboard.OpenClipboard()
-        win32clipboard.EmptyClipboard()
-        try:
-            win32clipboard.SetClipboardData(win32clipboard.CF_UNICODETEXT, unicode(" " + data["emoji"]))
-        finally:
-            win32clipboard.CloseClipboard()
-            action = Key("c-v/5") + self.enter
-            action.execute()
+        clipboard.paste(" " + data["emoji"], Key("c-v/5") + self.enter)
 
 emoji_map = {
     "smile": ":) ",
@@ -1361,7 +1403,7 @@ emoji_map = {
     "bang": ":boom: :boom: :boom:",
 }
 
-emoji_map_dict_list  = DictList("emoji_map_dict_list", emoji_map)
+emoji_map_dict_list  = dict_lists.get("emoji_map_dict_list", emoji_map)
 
 slack_action_map  = {
     # https://get.slack.help/hc/en-us/articles/201374536-Slack-keyboard-shortcuts
@@ -1389,10 +1431,8 @@ slack_terminal_map = {
 }
 
 slack_element_map = {
-    "letters": utils.JoinedRepetition(
-        "", DictListRef(None, letters_map_dict_list), min=0, max=4),
-    "emoji": utils.JoinedRepetition(
-        "", DictListRef(None, emoji_map_dict_list), min=0, max=8),
+    "letters": spelled_sequence(letters_map_dict_list, min=0, max=4),
+    "emoji": spelled_sequence(emoji_map_dict_list, min=0, max=8),
 }
 
 
@@ -1445,7 +1485,8 @@ cmd_action_map = {
 cmd = Environment(name="CommandWindow",
                      parent=global_environment,
                      context=AppContext(executable="cmd"),
-                     action_map=cmd_action_map)
+                     action_map=cmd_action_map,
+                     pacing="terminal")
 
 
 virtual_box_action_map = {
@@ -1469,7 +1510,8 @@ virtual_box_action_map = {
 virtual_box = Environment(name="VirtualBox",
                      parent=global_environment,
                      context=AppContext(title="- Oracle VM VirtualBox"),
-                     action_map=virtual_box_action_map)
+                     action_map=virtual_box_action_map,
+                     pacing="terminal")
 
 
 
@@ -1479,16 +1521,107 @@ virtual_box = Environment(name="VirtualBox",
 #-------------------------------------------------------------------------------
 # Populate and load the grammar.
 
-grammar = Grammar("repeat")   # Create this module's grammar.
-global_environment.install(grammar)
-grammar.load()
+# Set to True to print the reports of the grammar, caches and executor to the
+# messages window on load and unload.
+debug = False
+
+# The grammar enables only the rule of the foreground environment, so the rules
+# are installed without exclusive contexts. The grammar is kept across reloads
+# of this module, and only the rules of changed environments are replaced.
+# Complexity limits checked before the grammar is loaded again on a reload that
+# changed rules. If a rule exceeds them, the report is printed and the
+# previously loaded grammar stays in place.
+grammar_budget = GrammarBudget()
+
+def check_grammar(root):
+    passed, report = check_environments(root, grammar_budget)
+    if not passed:
+        print(report)
+    return passed
+
+interner = grammar_reloader.load(lambda: ResolverGrammar("repeat"),
+                                 global_environment,
+                                 rule_cache,
+                                 check_grammar)
+grammar = grammar_reloader.grammar
+if debug:
+    print(rule_cache.report())
+    print(interner.report())
+    print(dict_lists.report())
+    print(grammar_reloader.report())
+    print(_lazy_actions.stats())
+
+# Switch the active rules when the foreground window changes, instead of at the
+# start of the next utterance. benchmarks/activation_benchmark.py compares the
+# latency of both modes with the exclusive contexts used before.
+focus_activation = True
+
+activator = FocusActivator(grammar)
+if focus_activation:
+    activator.start()
+
+# The "go" and "swap" commands activate windows found in window_index, which
+# polls the foreground window at this interval.
+window_index.start(interval=0.1)
+
+# Project tree whose most frequent identifiers are put in the context word list,
+# or None. It is rescanned every minute, reading only the files that changed.
+identifier_index.root = None
+identifier_index.size = 500
+
+identifier_refresher = IdentifierRefresher(identifier_index, context_words)
+identifier_refresher.start()
+
+# Local port of the server that editor plugins call to update the context,
+# prefix and suffix word lists, e.g. with _word_list_client.py, or None to not
+# serve them. The server only listens on localhost, but does not authenticate
+# its callers, so any program on this machine can change the lists. Set it to
+# e.g. 8765, the default port of _word_list_client.py, to use plugins. Updates
+# are applied once no update came for debounce seconds.
+word_list_port = None
+
+word_list_updater = WordListUpdater([context_words, prefix_words,
+                                     suffix_words], debounce=0.3)
+word_list_server = WordListServer(word_list_updater, port=word_list_port)
+if word_list_port is not None:
+    word_list_server.start()
+
+# File to append the latency of each utterance to, for the report printed by
+# running _latency.py, or None to keep only the latest utterances in memory.
+latency_recorder.path = None
+
+# Terminals do not paste with ctrl+v, so long text is typed there. Elsewhere it
+# is pasted from _text_insertion.paste_threshold characters on.
+pacer.get("terminal").paste_threshold = 0
+
+# Number of formatted dictations to keep for FormatAction and TwoCamelAction.
+format_cache.size = 256
+
+# File to append the recognized utterances to, for replaying them with
+# benchmarks/utterance_replay.py, or None to not record them.
+utterance_recorder.path = None
 
 
 
 #-------------------------------------------------------------------------------
 # Unload function which will be called by NatLink.
 def unload():
-    global grammar
-    if grammar:
-        grammar.unload()
-        grammar = None
\ No newline at end of file
+    # The grammar object is kept by grammar_reloader, so that the next import
+    # of this module only has to replace the rules that changed.
+    activator.stop()
+    window_index.stop()
+    identifier_refresher.stop()
+    word_list_server.stop()
+    grammar.unload()
+    if debug:
+        print(grammar.stats.report())
+        print(executor.stats.report())
+        print(modifier_tracker.report())
+        print(peephole_stats.report())
+        print(format_cache.report())
+        print(insertion_stats.report())
+        print(clipboard.stats.report())
+        print(identifier_index.report())
+        print(word_list_updater.report())
+        print(window_index.report())
+        print(latency_recorder.report())
\ No newline at end of file
@@ -0,0 +1,87 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Registry of DictLists, shared by content and kept alive across reloads of
+the command modules.
+
+Every DictList becomes a list of its own in the loaded grammar, which Dragon
+has to compile and keep, so get() returns the list of another name if it has
+the same items, e.g. letters_dict_list for char_dict_list.
+
+The grammar is kept across reloads, see _incremental_reload, and dragonfly does
+not allow two lists with the same name in a grammar. get() therefore returns
+the list used for a name on an earlier import, and sets its items if the
+content changed, instead of building a new list. Only a list that no other name
+shares is changed; otherwise a list with a name of its own is built. The report
+compares the number of names requested with the number of lists they share.
+"""
+
+from dragonfly import (
+    DictList,
+    DictListRef,
+)
+
+
+class DictListRegistry(object):
+
+    def __init__(self):
+        # Requested name to the list it uses, possibly shared with other names.
+        self._by_name = {}
+        # Name of each list built to the list.
+        self._built = {}
+        # Id of each list to its shared reference.
+        self._refs = {}
+        self.updates = 0
+
+    def get(self, name, content):
+        """Returns a DictList with the items of the mapping content, shared with
+        the other names requested with the same items.
+        """
+        dict_list = self._by_name.get(name)
+        if dict_list is not None and dict(dict_list) == content:
+            return dict_list
+        for other in self._built.values():
+            if dict(other) == content:
+                self._by_name[name] = other
+                return other
+        if dict_list is not None and not self._shared(name, dict_list):
+            dict_list.set(content)
+            self.updates += 1
+            return dict_list
+        dict_list = DictList(self._unused_name(name), content)
+        self._built[dict_list.name] = dict_list
+        self._by_name[name] = dict_list
+        return dict_list
+
+    def _shared(self, name, dict_list):
+        return any(other is dict_list
+                   for (other_name, other) in self._by_name.items()
+                   if other_name != name)
+
+    def _unused_name(self, name):
+        unused = name
+        count = 1
+        while unused in self._built:
+            count += 1
+            unused = "%s_%d" % (name, count)
+        return unused
+
+    def ref(self, dict_list):
+        """Returns an unnamed DictListRef to dict_list, shared by the rules
+        that refer to it.
+        """
+        ref = self._refs.get(id(dict_list))
+        if ref is None or ref.list is not dict_list:
+            ref = DictListRef(None, dict_list)
+            self._refs[id(dict_list)] = ref
+        return ref
+
+    def report(self):
+        used = set(id(dict_list) for dict_list in self._by_name.values())
+        return ("DictList registry: %d lists requested, %d after sharing "
+                "identical content, %d updated on reload" % (
+                    len(self._by_name), len(used), self.updates))
+
+
+# Shared registry, kept alive across reloads of the command modules.
+dict_lists = DictListRegistry()
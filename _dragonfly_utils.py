@@ -4,6 +4,7 @@
 
 """Various utility functions for working with dragonfly."""
 
+import collections
 import json
 import os
 import os.path
@@ -30,13 +31,68 @@ from dragonfly import (
 # different names to be used in multiple rules, and we can easily create rules
 # on the fly without defining a new class.
 
+class LayeredMap(collections.Mapping):
+    """Read-through view of several maps, giving precedence to later maps. The
+    maps are referenced, not copied, so a map that extends a large parent map
+    only stores its own entries. Writes go to a layer of its own and never
+    change the underlying maps.
+    """
+
+    def __init__(self, *maps):
+        self._layers = []
+        for map in maps:
+            if isinstance(map, LayeredMap):
+                # Flatten, so that lookups do not get slower with each level of
+                # inheritance.
+                self._layers.extend(map._layers)
+            elif map:
+                self._layers.append(map)
+        self._own = None
+
+    def __getitem__(self, key):
+        for layer in reversed(self._layers):
+            if key in layer:
+                return layer[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if self._own is None:
+            self._own = {}
+            self._layers.append(self._own)
+        self._own[key] = value
+
+    def __contains__(self, key):
+        for layer in self._layers:
+            if key in layer:
+                return True
+        return False
+
+    def __iter__(self):
+        seen = set()
+        for layer in reversed(self._layers):
+            for key in layer:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return len(set().union(*self._layers))
+
+    def __nonzero__(self):
+        return any(self._layers)
+
+    def __repr__(self):
+        return "LayeredMap(%r)" % dict(self)
+
+    def layers(self):
+        return list(self._layers)
+
+
 def combine_maps(*maps):
-    """Merge the contents of multiple maps, giving precedence to later maps."""
-    result = {}
-    for map in maps:
-        if map:
-            result.update(map)
-    return result
+    """Merge the contents of multiple maps, giving precedence to later maps. The
+    result is a LayeredMap, so the maps are not copied.
+    """
+    return LayeredMap(*maps)
 
 
 def text_map_to_action_map(text_map):
@@ -117,4 +173,37 @@ def combine_contexts(context1, context2):
         return context2
     if not context2:
         return context1
-    return context1 & context2
\ No newline at end of file
+    return context1 & context2
+
+
+def either_context(context1, context2):
+    """Combine two contexts using "|", treating None as equivalent to a context that
+    matches everything.
+    """
+    if not context1 or not context2:
+        return None
+    return context1 | context2
+
+
+def wrap_keyboards(wrapper_class, outermost=False):
+    """Wraps the keyboard of Key and Text with wrapper_class(keyboard). Wrappers
+    have a keyboard attribute holding the keyboard they wrap. A wrapper of the
+    same class name from before a reload of its module is replaced. The
+    wrapper goes inside the other wrappers, or around them if outermost, so
+    that it gets the events before they do.
+    """
+    for action_class in (Key, Text):
+        wrappers = []
+        keyboard = action_class._keyboard
+        while hasattr(keyboard, "keyboard"):
+            if type(keyboard).__name__ != wrapper_class.__name__:
+                wrappers.append(keyboard)
+            keyboard = keyboard.keyboard
+        if not outermost:
+            keyboard = wrapper_class(keyboard)
+        for wrapper in reversed(wrappers):
+            wrapper.keyboard = keyboard
+            keyboard = wrapper
+        if outermost:
+            keyboard = wrapper_class(keyboard)
+        action_class._keyboard = keyboard
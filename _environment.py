@@ -2,12 +2,17 @@
 # (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
 # Licensed under the LGPL, see <http://www.gnu.org/licenses/>
 
+import sys
+
 from _dragonfly_utils import (
+    LayeredMap,
     combine_contexts,
     combine_maps,
     create_rule,
+    either_context,
 )
 from _repeat_rule_grammar import RepeatRule
+from _rule_cache import Fingerprinter
 
 from dragonfly import (
     RuleRef,
@@ -23,7 +28,10 @@ from dragonfly import (
 class Environment(object):
     """Environment where voice commands can be spoken. Combines grammar and context
     and adds hierarchy. When installed, will produce a top-level rule for each
-    environment.
+    environment. Environments that differ only in context share one rule.
+    pacing names the PacingProfile used between actions, see _pacing, and is
+    inherited from the parent if not given. Without one, the top-level rule
+    gets a profile of its own, named after the rule.
     """
 
     def __init__(self,
@@ -32,9 +40,15 @@ class Environment(object):
                  context=None,
                  action_map=None,
                  terminal_action_map=None,
-                 element_map=None):
+                 element_map=None,
+                 pacing=None):
         self.name = name
         self.children = []
+        # The context given for this environment alone, and the top-level rule
+        # it was installed as.
+        self.own_context = context
+        self.rule = None
+        self._keys = None
         if parent:
             parent.add_child(self)
             self.context = combine_contexts(parent.context, context)
@@ -42,34 +56,171 @@ class Environment(object):
             self.terminal_action_map = combine_maps(
                 parent.terminal_action_map, terminal_action_map)
             self.element_map = combine_maps(parent.element_map, element_map)
+            self.pacing = pacing or parent.pacing
         else:
             self.context = context
             self.action_map = action_map if action_map else {}
             self.terminal_action_map = terminal_action_map if terminal_action_map else {}
             self.element_map = element_map if element_map else {}
+            self.pacing = pacing
 
     def add_child(self, child):
         self.children.append(child)
 
-    def install(self, grammar):
-        exclusive_context = self.context
-        for child in self.children:
-            child.install(grammar)
-            exclusive_context = combine_contexts(exclusive_context, ~child.context)
+    def install(self, grammar, cache=None, exclusive_contexts=True):
+        """Adds a top-level rule for this environment and its children to the
+        grammar. If a RuleCache is given, rules are taken from it when their
+        content is unchanged. Returns the RuleInterner used, for reporting.
+
+        With exclusive_contexts=False, the rules get no context and it is up to
+        the grammar to enable only the rule of the foreground environment, see
+        _environment_resolver.
+        """
+        interner = RuleInterner(cache)
+        self._install(grammar, interner, [self], exclusive_contexts)
+        if cache is not None:
+            cache.hash_time += interner.fingerprinter.time
+        return interner
+
+    def _install(self, grammar, interner, group, exclusive_contexts):
+        # Environments in a group have the same content and no children, and
+        # share a single top-level rule.
+        name = "_".join(environment.name for environment in group)
+        if exclusive_contexts:
+            exclusive_context = _group_context(group)
+        else:
+            exclusive_context = None
+        for children in self._group_children(interner.fingerprinter):
+            children[0]._install(grammar, interner, children, exclusive_contexts)
+            if exclusive_contexts:
+                exclusive_context = combine_contexts(exclusive_context,
+                                                     ~_group_context(children))
+        pacing = self.pacing or name
+        keystroke_key, terminal_key = self._content_keys(interner.fingerprinter)
         if self.action_map:
-            element = RuleRef(rule=create_rule(self.name + "KeystrokeRule",
-                                                     self.action_map,
-                                                     self.element_map))
+            element = RuleRef(rule=interner.get(
+                name, self.name + "KeystrokeRule", keystroke_key,
+                lambda: create_rule(self.name + "KeystrokeRule",
+                                    self.action_map,
+                                    self.element_map),
+                len(group)))
         else:
             element = Empty()
         if self.terminal_action_map:
-            terminal_element = RuleRef(
-                rule=create_rule(self.name + "TerminalRule",
-                                       self.terminal_action_map,
-                                       self.element_map))
+            terminal_element = RuleRef(rule=interner.get(
+                name, self.name + "TerminalRule", terminal_key,
+                lambda: create_rule(self.name + "TerminalRule",
+                                    self.terminal_action_map,
+                                    self.element_map),
+                len(group)))
         else:
             terminal_element = Empty()
-        grammar.add_rule(RepeatRule(self.name + "RepeatRule",
-                                    element,
-                                    terminal_element,
-                                    exclusive_context))
+        repeat_key = (name, keystroke_key, terminal_key, exclusive_context,
+                      pacing)
+        rule = interner.get(
+            name, name + "RepeatRule", repeat_key,
+            lambda: RepeatRule(name + "RepeatRule",
+                               element,
+                               terminal_element,
+                               exclusive_context,
+                               pacing),
+            len(group))
+        grammar.add_rule(rule)
+        for environment in group:
+            environment.rule = rule
+
+    def _content_keys(self, fingerprinter):
+        """Returns fingerprints of the keystroke and terminal rule content."""
+        if self._keys is None:
+            self._keys = (
+                fingerprinter.fingerprint((self.action_map, self.element_map)),
+                fingerprinter.fingerprint((self.terminal_action_map,
+                                           self.element_map)))
+        return self._keys
+
+    def _group_children(self, fingerprinter):
+        """Groups the children that differ only in context, keeping the order in
+        which they were added.
+        """
+        groups = []
+        leaf_groups = {}
+        for child in self.children:
+            key = (child._content_keys(fingerprinter), child.pacing)
+            if child.children:
+                groups.append([child])
+            elif key in leaf_groups:
+                leaf_groups[key].append(child)
+            else:
+                leaf_groups[key] = [child]
+                groups.append(leaf_groups[key])
+        return groups
+
+
+def map_memory_report(root):
+    """Compares the memory used by the maps of the environment tree rooted at
+    root with the memory that flat copies of the same maps would use.
+    """
+    environments = []
+    pending = [root]
+    while pending:
+        environment = pending.pop()
+        environments.append(environment)
+        pending.extend(environment.children)
+    flat_size = 0
+    stored = {}
+    for environment in environments:
+        for map in (environment.action_map,
+                    environment.terminal_action_map,
+                    environment.element_map):
+            flat_size += sys.getsizeof(dict(map))
+            if isinstance(map, LayeredMap):
+                stored[id(map)] = sys.getsizeof(map) + sys.getsizeof(map.layers())
+                layers = map.layers()
+            else:
+                layers = [map]
+            for layer in layers:
+                stored[id(layer)] = sys.getsizeof(layer)
+    layered_size = sum(stored.values())
+    return "Maps of %d environments: %d kB layered, %d kB as flat copies" % (
+        len(environments), layered_size // 1024, flat_size // 1024)
+
+
+def _group_context(group):
+    context = group[0].context
+    for environment in group[1:]:
+        context = either_context(context, environment.context)
+    return context
+
+
+class RuleInterner(object):
+    """Builds each distinct rule of an installation once, so that environments
+    with the same content refer to the same rule.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        # Hashes the content of the environments, see _rule_cache.
+        self.fingerprinter = Fingerprinter()
+        self._rules = {}
+        self.requested = 0
+
+    def get(self, environment, name, key, build, count=1):
+        """Returns the rule for the given content key, building it if needed.
+        count is the number of rules an uninterned installation would create.
+        """
+        self.requested += count
+        rule = self._rules.get(key)
+        if rule is None:
+            if self.cache is None:
+                rule = build()
+            else:
+                rule = self.cache.get(environment, name, key, build,
+                                      self.fingerprinter.modules)
+            self._rules[key] = rule
+        return rule
+
+    def report(self):
+        return "Grammar: %d rules, %d without interning (%d%% smaller)" % (
+            len(self._rules),
+            self.requested,
+            100 - 100 * len(self._rules) // max(self.requested, 1))
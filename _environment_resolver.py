@@ -0,0 +1,223 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Finds the environment of the foreground window with one lookup per utterance.
+
+Installed with exclusive contexts, every top-level rule carries a context of
+the form "context & ~child1 & ~child2 ...", and dragonfly evaluates all of them
+at the start of each utterance. Instead, ResolverGrammar resolves the
+foreground window to a single environment and enables only its rule. The
+result is memoized per window, so the cost per utterance does not grow with the
+number of environments.
+
+FocusActivator goes one step further and switches the active rules when the
+foreground window changes, so that the work is done between utterances and
+Dragon only holds the rule of the current application, which includes the
+Global commands.
+"""
+
+import time
+
+from dragonfly import (
+    AppContext,
+    Grammar,
+    Window,
+)
+from dragonfly.timer import Timer
+
+
+class EnvironmentResolver(object):
+    """Maps the executable and title of a window to the environment it belongs
+    to. Among the children of an environment, the first one whose context
+    matches wins; if none matches, the environment itself is chosen.
+    """
+
+    # Number of windows to remember. Titles change with the open document, so
+    # the memo is cleared once it gets this big.
+    max_windows = 256
+
+    def __init__(self, root):
+        self.root = root
+        self._children = {}
+        self._index(root)
+        self._windows = {}
+
+    def _index(self, environment):
+        """Splits the children of each environment into executable and title
+        patterns, and contexts that have to be asked to match.
+        """
+        executables = []
+        titles = []
+        others = []
+        for position, child in enumerate(environment.children):
+            context = child.own_context
+            if _is_plain_app_context(context) and context._executable \
+                    and not context._title:
+                executables.append((position, context._executable, child))
+            elif _is_plain_app_context(context) and context._title \
+                    and not context._executable:
+                titles.append((position, context._title, child))
+            else:
+                others.append((position, context, child))
+            self._index(child)
+        self._children[environment] = (executables, titles, others)
+
+    def resolve(self, executable, title, handle=None):
+        """Returns the environment of the given window."""
+        window = (executable, title)
+        environment = self._windows.get(window)
+        if environment is None:
+            if len(self._windows) >= self.max_windows:
+                self._windows.clear()
+            environment = self._resolve(self.root,
+                                        executable.lower(),
+                                        title.lower(),
+                                        executable, title, handle)
+            self._windows[window] = environment
+        return environment
+
+    def _resolve(self, environment, executable, title,
+                 original_executable, original_title, handle):
+        executables, titles, others = self._children[environment]
+        matches = [(position, child)
+                   for (position, pattern, child) in executables
+                   if pattern in executable]
+        matches.extend((position, child)
+                       for (position, pattern, child) in titles
+                       if pattern in title)
+        matches.extend((position, child)
+                       for (position, context, child) in others
+                       if context is None
+                       or context.matches(original_executable,
+                                          original_title,
+                                          handle))
+        if not matches:
+            return environment
+        return self._resolve(min(matches)[1], executable, title,
+                             original_executable, original_title, handle)
+
+
+def _is_plain_app_context(context):
+    return type(context) is AppContext and not context._exclude
+
+
+class ResolverGrammar(Grammar):
+    """Grammar that enables only the rule of the foreground environment. The
+    environments must be installed with exclusive_contexts=False.
+    """
+
+    def __init__(self, name, **kwargs):
+        Grammar.__init__(self, name, **kwargs)
+        self.resolver = None
+        self.stats = ActivationStats()
+        self._environment_rules = []
+        self._active_rule = None
+
+    def set_environments(self, root):
+        """Indexes the installed environment tree rooted at root."""
+        self.resolver = EnvironmentResolver(root)
+        self._environment_rules = []
+        environments = [root]
+        while environments:
+            environment = environments.pop()
+            environments.extend(environment.children)
+            if environment.rule not in self._environment_rules:
+                self._environment_rules.append(environment.rule)
+        self._active_rule = None
+
+    def activate_environment(self, environment, immediately=False):
+        """Enables the rule of the given environment and disables the others.
+        Normally, dragonfly activates and deactivates the rules at the start of
+        the next utterance; with immediately=True, it is done right away.
+        """
+        if environment.rule is self._active_rule:
+            return
+        for rule in self._environment_rules:
+            if rule is environment.rule:
+                rule.enable()
+                if immediately and self.loaded and not rule.active:
+                    rule.activate()
+            else:
+                rule.disable()
+                if immediately and self.loaded and rule.active:
+                    rule.deactivate()
+        self._active_rule = environment.rule
+        self.stats.switches += 1
+
+    def process_begin(self, executable, title, handle):
+        if self.resolver:
+            self.activate_environment(
+                self.resolver.resolve(executable, title, handle))
+        Grammar.process_begin(self, executable, title, handle)
+        exported_rules = [rule for rule in self.rules if rule.exported]
+        self.stats.record_begin(
+            len([rule for rule in exported_rules if rule.active]),
+            len(exported_rules))
+
+
+class ActivationStats(object):
+    """Number of active rules at the start of each utterance and of environment
+    switches. The latency of the activation modes is compared end to end by
+    benchmarks/activation_benchmark.py.
+    """
+
+    def __init__(self):
+        self.utterances = 0
+        self.switches = 0
+        self.active_rules = 0
+        self.total_rules = 0
+
+    def record_begin(self, active_rules, total_rules):
+        self.utterances += 1
+        self.active_rules += active_rules
+        self.total_rules = total_rules
+
+    def report(self):
+        utterances = max(self.utterances, 1)
+        return ("Activation: %d utterances, %.1f of %d rules active, "
+                "%d environment switches" % (
+                    self.utterances,
+                    float(self.active_rules) / utterances,
+                    self.total_rules,
+                    self.switches))
+
+
+class FocusActivator(object):
+    """Polls the foreground window and activates the rule of its environment once
+    the window has stayed in front for the debounce time, so that alt-tabbing
+    through several windows only switches once.
+    """
+
+    def __init__(self, grammar, interval=0.1, debounce=0.3):
+        self.grammar = grammar
+        self.interval = interval
+        self.debounce = debounce
+        self._timer = None
+        self._window = None
+        self._changed_at = None
+
+    def start(self):
+        self._timer = Timer(self._poll, self.interval)
+
+    def stop(self):
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+
+    def _poll(self):
+        if not self.grammar.resolver:
+            return
+        window = Window.get_foreground()
+        key = (window.handle, window.title)
+        now = time.time()
+        if key != self._window:
+            self._window = key
+            self._changed_at = now
+        elif self._changed_at is not None \
+                and now - self._changed_at >= self.debounce:
+            self._changed_at = None
+            self.grammar.activate_environment(
+                self.grammar.resolver.resolve(window.executable,
+                                              window.title,
+                                              window.handle),
+                immediately=True)
@@ -0,0 +1,59 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Cache of formatted dictation for FormatAction and TwoCamelAction.
+
+The same identifiers are dictated over and over, and each time the dictation
+was split, formatted and parsed into a new Text action. FormatCache keeps the
+formatted text and its Text action for the latest dictations, keyed by the
+formatter, the preprocess flag and the dictation. Formatters must therefore
+depend on the words alone, and be shared by the actions of a format, like the
+module-level functions of _format_text_actions.
+"""
+
+import collections
+
+# Set to False to format every dictation again.
+enabled = True
+
+
+class FormatCache(object):
+    """Least recently used cache with a bounded number of entries."""
+
+    def __init__(self, size=256):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key, build):
+        """Returns the value cached for key, or the value build() returns."""
+        if not enabled or self.size <= 0:
+            return build()
+        try:
+            value = self._entries.pop(key)
+            self.hits += 1
+        except KeyError:
+            value = build()
+            self.misses += 1
+            while len(self._entries) >= self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        self._entries[key] = value
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def report(self):
+        lookups = self.hits + self.misses
+        return ("Format cache: %d hits, %d misses (%.0f%% hit rate), "
+                "%d evictions, %d of %d entries" % (
+                    self.hits, self.misses,
+                    100.0 * self.hits / lookups if lookups else 0,
+                    self.evictions, len(self._entries), self.size))
+
+
+# Shared cache, kept alive across reloads of the command modules.
+format_cache = FormatCache()
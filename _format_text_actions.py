@@ -3,13 +3,71 @@
 
 from dragonfly import (
     Key,
-    Text,
     ActionBase,
 )
 
+from _format_cache import format_cache
+from _text_insertion import (
+    TypeText,
+    insertion_action,
+)
 from _text_utils import split_dictation
 
+
+# The formatters are module-level functions, so that the format cache keyed by
+# them is shared by all actions of a format.
+def camel_case(words):
+    return words[0] + "".join(w.capitalize() for w in words[1:])
+
+
+def caps_case(words):
+    return "".join(w.capitalize() for w in words)
+
+
+def dash_case(words):
+    return "-".join(words)
+
+
+def score_case(words):
+    return "_".join(words)
+
+
+def upper_case(words):
+    return " ".join([word.upper() for word in words])
+
+
+def upper_score_case(words):
+    return "_".join([word.upper() for word in words])
+
+
+def word_case(words):
+    return "".join(words)
+
+
+def text_case(words):
+    return " ".join(words)
+
+
+def phrase_case(words):
+    return words[0].capitalize() + " " + " ".join(words[1:])
+
+
+def _format(formatter, dictation, preprocess=True):
+    """Returns the action inserting the formatted dictation, see
+    _text_insertion. The formatted text and its Text action come from the
+    format cache if possible.
+    """
+    dictation = str(dictation)
+    def build():
+        formatted = formatter(split_dictation(dictation, preprocess))
+        return formatted, TypeText(formatted)
+    formatted, text = format_cache.lookup((formatter, preprocess, dictation),
+                                          build)
+    return insertion_action(formatted, text)
+
+
 class FormatAction(ActionBase):
+
     def __init__(self,
                  formatter,
                  prefix=Key(""),
@@ -21,78 +79,73 @@ class FormatAction(ActionBase):
         self.suffix = suffix
         self.preprocess = preprocess
 
+    def build_action(self, data):
+        """Returns the action to execute for data, see _keystroke_batching."""
+        text = _format(self.formatter, data["text"], self.preprocess)
+        return self.prefix + text + self.suffix
+
     def _execute(self, data=None):
-        words = split_dictation(data["text"], self.preprocess)
-        formatted_words = self.formatter(words)
-        action = self.prefix + Text(formatted_words) + self.suffix
-        action.execute()
+        self.build_action(data).execute()
 
 # Format: someWords
 class CamelAction(FormatAction):
     def __init__(self, prefix=Key(""), suffix=Key("")):
-        formatter = lambda words: words[0] + "".join(w.capitalize() for w in words[1:])
-        super(CamelAction, self).__init__(formatter, prefix, suffix)
+        super(CamelAction, self).__init__(camel_case, prefix, suffix)
 
 # Format: SomeWords
 class CapsAction(FormatAction):
     def __init__(self, prefix=Key(""), suffix=Key("")):
-        formatter = lambda words: "".join(w.capitalize() for w in words)
-        super(CapsAction, self).__init__(formatter, prefix, suffix)
+        super(CapsAction, self).__init__(caps_case, prefix, suffix)
 
 # Format: some-words
 class DashAction(FormatAction):
     def __init__(self, prefix=Key(""), suffix=Key("")):
-        formatter = lambda words: "-".join(words)
-        super(DashAction, self).__init__(formatter, prefix, suffix)
+        super(DashAction, self).__init__(dash_case, prefix, suffix)
 
 # Format: some_words
 class ScoreAction(FormatAction):
     def __init__(self, prefix=Key(""), suffix=Key("")):
-        formatter = lambda words: "_".join(words)
-        super(ScoreAction, self).__init__(formatter, prefix, suffix)
+        super(ScoreAction, self).__init__(score_case, prefix, suffix)
 
 # Format: SOME WORDS
 class UpperAction(FormatAction):
     def __init__(self, prefix=Key(""), suffix=Key("")):
-        formatter = lambda words: " ".join([word.upper() for word in words])
-        super(UpperAction, self).__init__(formatter, prefix, suffix)
+        super(UpperAction, self).__init__(upper_case, prefix, suffix)
 
 # Format: SOME_WORDS
 class UpperScoreAction(FormatAction):
     def __init__(self, prefix=Key(""), suffix=Key("")):
-        formatter = lambda words: "_".join([word.upper() for word in words])
-        super(UpperScoreAction, self).__init__(formatter, prefix, suffix)
+        super(UpperScoreAction, self).__init__(upper_score_case, prefix,
+                                               suffix)
 
 # Format: somewords
 class WordAction(FormatAction):
     def __init__(self, prefix=Key(""), suffix=Key("")):
-        formatter = lambda words: "".join(words)
-        super(WordAction, self).__init__(formatter, prefix, suffix)
+        super(WordAction, self).__init__(word_case, prefix, suffix)
 
 # Format: some words
 class TextAction(FormatAction):
     def __init__(self, prefix=Key(""), suffix=Key(""), preprocess=False):
-        formatter = lambda words: " ".join(words)
-        super(TextAction, self).__init__(formatter, prefix, suffix, preprocess)
+        super(TextAction, self).__init__(text_case, prefix, suffix, preprocess)
 
 # Format: Some words
 class PhraseAction(FormatAction):
     def __init__(self, prefix=Key(""), suffix=Key("")):
-        formatter = lambda words: words[0].capitalize() + " " + " ".join(words[1:])
-        super(PhraseAction, self).__init__(formatter, prefix, suffix, False)
+        super(PhraseAction, self).__init__(phrase_case, prefix, suffix, False)
 
 
 class TwoCamelAction(ActionBase):
+
     def __init__(self, prefix=Key(""), middle=Key(""), suffix=Key("")):
         super(TwoCamelAction, self).__init__()
         self.prefix = prefix
         self.middle = middle
         self.suffix = suffix
 
+    def build_action(self, data):
+        text1 = _format(camel_case, data["text"])
+        text2 = _format(camel_case, data["text2"])
+        return self.prefix + text1 + self.middle + text2 + self.suffix
+
     def _execute(self, data=None):
-        words1 = split_dictation(data["text"])
-        words2 = split_dictation(data["text2"])
-        camel1 = words1[0] + "".join(w.capitalize() for w in words1[1:])
-        camel2 = words2[0] + "".join(w.capitalize() for w in words2[1:])
-        action = self.prefix + Text(camel1) + self.middle + Text(camel2) + self.suffix
-        action.execute()
+        self.build_action(data).execute()
@@ -0,0 +1,203 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Complexity report and budget check for the rules of an environment tree.
+
+Dragon gets slow to load and to recognize when a grammar grows too complex, and
+the RepeatRule nests repetitions of whole rules. This walks the element tree of
+every rule reachable from each installed environment and reports:
+- alternatives: the largest number of choices at a single point,
+- depth: the deepest nesting of elements, following rule references,
+- expansion: an estimate of the number of distinct word sequences, counting
+  each list entry and each dictation as a single word,
+- lists: the size of each referenced (Dict)List,
+- dictations: where Dictation elements occur, also in referenced rules, and
+  which of them may be repeated within one utterance.
+
+Budgets turn the report into a pass/fail check, which can run after the
+environments are installed and before the grammar is loaded.
+"""
+
+from dragonfly import (
+    Alternative,
+    Dictation,
+    ListRef,
+    Optional,
+    Repetition,
+    RuleRef,
+)
+
+from _incremental_reload import rule_dependencies
+
+
+class RuleStats(object):
+    """Complexity figures for a single rule."""
+
+    def __init__(self, name):
+        self.name = name
+        self.alternatives = 0
+        self.depth = 0
+        self.expansion = 0
+        self.lists = {}
+        self.dictations = []
+        self.repeated_dictations = []
+
+
+class _Analyzer(object):
+
+    def __init__(self):
+        self._rules = {}
+
+    def analyze(self, rule):
+        """Returns the RuleStats of rule. Referenced rules are analyzed once and
+        included in the depth and expansion of the referencing rule.
+        """
+        stats = self._rules.get(rule)
+        if stats is None:
+            stats = RuleStats(rule.name)
+            # Guard against recursive references while the rule is analyzed.
+            self._rules[rule] = stats
+            stats.depth, stats.expansion = self._walk(
+                rule.element, stats, [rule.name], False)
+        return stats
+
+    def _walk(self, element, stats, path, repeated):
+        """Returns depth and expansion of element, and collects the rest of the
+        figures in stats.
+        """
+        if isinstance(element, RuleRef):
+            referenced = self.analyze(element.rule)
+            stats.lists.update(referenced.lists)
+            stats.dictations.extend(referenced.dictations)
+            if repeated:
+                stats.repeated_dictations.extend(referenced.dictations)
+            else:
+                stats.repeated_dictations.extend(
+                    referenced.repeated_dictations)
+            return referenced.depth + 1, referenced.expansion
+        if isinstance(element, ListRef):
+            stats.lists[element.list.name] = len(element.list)
+            return 1, len(element.list)
+        if isinstance(element, Dictation):
+            location = " > ".join(path)
+            stats.dictations.append(location)
+            if repeated:
+                stats.repeated_dictations.append(location)
+            return 1, 1
+        spec = getattr(element, "_spec", None)
+        if spec:
+            path = path + ["'%s'" % spec]
+        repeated = repeated or isinstance(element, Repetition)
+        children = [self._walk(child, stats, path, repeated)
+                    for child in element.children]
+        depth = 1 + max([depth for (depth, _) in children] or [0])
+        expansions = [expansion for (_, expansion) in children]
+        if isinstance(element, Alternative):
+            stats.alternatives = max(stats.alternatives, len(children))
+            return depth, sum(expansions)
+        if isinstance(element, Optional):
+            return depth, 1 + sum(expansions)
+        # Sequences, including repetitions, literals and other leaves.
+        return depth, _product(expansions)
+
+
+def _product(numbers):
+    result = 1
+    for number in numbers:
+        result *= number
+    return result
+
+
+def analyze_environments(root):
+    """Returns a list of (environment name, [RuleStats]) for the installed
+    environment tree rooted at root. Each list starts with the top-level rule of
+    the environment, followed by the rules it references.
+    """
+    analyzer = _Analyzer()
+    result = []
+    environments = [root]
+    while environments:
+        environment = environments.pop(0)
+        environments.extend(environment.children)
+        rules = [environment.rule] + [
+            rule for rule in rule_dependencies([environment.rule])
+            if rule is not environment.rule]
+        result.append((environment.name,
+                       [analyzer.analyze(rule) for rule in rules]))
+    return result
+
+
+class GrammarBudget(object):
+    """Limits on the complexity of single rules. A limit of None is not
+    checked. Repeated dictations are Dictation elements that may be spoken
+    several times in one utterance, e.g. in a command of the RepeatRule
+    sequence. The RepeatRules of _commands.py expand to about 5e39, well
+    within the default expansion limit.
+    """
+
+    def __init__(self,
+                 max_alternatives=1000,
+                 max_depth=100,
+                 max_expansion=10 ** 50,
+                 max_list_size=1000,
+                 max_repeated_dictations=None):
+        self.max_alternatives = max_alternatives
+        self.max_depth = max_depth
+        self.max_expansion = max_expansion
+        self.max_list_size = max_list_size
+        self.max_repeated_dictations = max_repeated_dictations
+
+    def violations(self, stats):
+        """Returns a description of each limit exceeded by the RuleStats."""
+        result = []
+        checks = [
+            ("alternatives", stats.alternatives, self.max_alternatives),
+            ("depth", stats.depth, self.max_depth),
+            ("expansion", stats.expansion, self.max_expansion),
+            ("repeated dictations", len(stats.repeated_dictations),
+             self.max_repeated_dictations),
+        ]
+        checks.extend(("size of list %s" % name, size, self.max_list_size)
+                      for (name, size) in sorted(stats.lists.items()))
+        for (figure, value, limit) in checks:
+            if limit is not None and value > limit:
+                result.append("%s: %s %s exceeds %s" % (stats.name, figure,
+                                                        _format(value),
+                                                        _format(limit)))
+        return result
+
+
+def _format(number):
+    if number >= 10 ** 6:
+        return "%.1e" % number
+    return str(number)
+
+
+def check_environments(root, budget=None):
+    """Analyzes the environment tree rooted at root and checks every rule
+    against the budget. Returns whether all rules passed, and a report.
+    """
+    budget = budget or GrammarBudget()
+    lines = []
+    violations = []
+    for (environment, rules) in analyze_environments(root):
+        lines.append(environment)
+        for stats in rules:
+            lines.append("  %-36s alternatives %4d  depth %3d  expansion %8s  "
+                         "lists %d  dictations %d (%d repeated)" % (
+                             stats.name,
+                             stats.alternatives,
+                             stats.depth,
+                             _format(stats.expansion),
+                             len(stats.lists),
+                             len(stats.dictations),
+                             len(stats.repeated_dictations)))
+            for violation in budget.violations(stats):
+                if violation not in violations:
+                    violations.append(violation)
+    if violations:
+        lines.append("Grammar budget FAILED:")
+        lines.extend("  " + violation for violation in violations)
+    else:
+        lines.append("Grammar budget passed.")
+    return not violations, "\n".join(lines)
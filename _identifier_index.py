@@ -0,0 +1,211 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Index of the identifiers of a project, for the context word list.
+
+IdentifierIndex scans the C#, JavaScript/React, CSS and Python files under a
+project tree and counts their identifiers. It keeps the modification time and
+counts of every file, so a rescan only reads the files that changed, and
+subtracts the counts of files that were removed. IdentifierRefresher sets the
+most frequent identifiers as the index words of a list, see _word_lists, which
+only updates the list if its words changed.
+
+The items are written in Dragon's "written\\spoken" form, with the spoken form
+made of the parts of the identifier, e.g. "getUserName\\get user name". Only
+the most frequent identifier is kept of those with the same spoken form.
+
+Walking a project tree can take seconds, so IdentifierRefresher scans on a
+thread of its own and only pushes the result on the engine thread.
+"""
+
+import collections
+import os
+import re
+import threading
+import time
+
+from dragonfly.timer import Timer
+
+# Identifiers in source files, by extension. CSS only counts class and id
+# selectors.
+_identifier_pattern = re.compile(r"[A-Za-z_$][\w$]*")
+_selector_pattern = re.compile(r"[.#](-?[A-Za-z_][\w-]*)")
+patterns = {
+    ".cs": _identifier_pattern,
+    ".js": _identifier_pattern,
+    ".jsx": _identifier_pattern,
+    ".ts": _identifier_pattern,
+    ".tsx": _identifier_pattern,
+    ".py": _identifier_pattern,
+    ".css": _selector_pattern,
+    ".scss": _selector_pattern,
+    ".less": _selector_pattern,
+}
+
+# Directories of dependencies and build output, which are not scanned.
+ignored_directories = frozenset([
+    ".git", ".hg", ".svn", ".vs", ".idea", "node_modules", "bower_components",
+    "bin", "obj", "packages", "dist", "build", "__pycache__",
+])
+
+keywords = frozenset("""
+    abstract and as assert async await base bool break byte case catch char
+    checked class const continue decimal def default del delegate do double
+    elif else enum event except explicit export extends extern false final
+    finally fixed float for foreach from function get global goto if implicit
+    import in instanceof int interface internal is lambda let lock long
+    namespace new none nonlocal not null object operator or out override
+    params pass private protected public raise readonly ref require return
+    sbyte sealed self set short sizeof static string struct super switch this
+    throw true try typeof uint ulong unchecked unsafe ushort using var virtual
+    void volatile while with yield
+""".split())
+
+_part_pattern = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def spoken_form(identifier):
+    """Returns the words of an identifier, e.g. "get user name" for
+    getUserName, get_user_name or get-user-name.
+    """
+    return " ".join(part.lower() for part in _part_pattern.findall(identifier))
+
+
+class IdentifierIndex(object):
+
+    def __init__(self, root=None, size=500, minimum_length=3):
+        self.root = root
+        self.size = size
+        self.minimum_length = minimum_length
+        # Scans run on a thread of IdentifierRefresher.
+        self._lock = threading.Lock()
+        # Path to (modification time, identifier counts) of the indexed files.
+        self._files = {}
+        self.counts = collections.Counter()
+        self.scans = 0
+        self.files_read = 0
+        self.scan_time = 0.0
+
+    def scan(self):
+        """Indexes the files that changed since the last scan, and returns how
+        many did.
+        """
+        with self._lock:
+            return self._scan()
+
+    def _scan(self):
+        start = time.time()
+        seen = set()
+        changed = 0
+        if self.root:
+            for (directory, directories, files) in os.walk(self.root):
+                directories[:] = [name for name in directories
+                                  if name not in ignored_directories]
+                for name in files:
+                    pattern = patterns.get(os.path.splitext(name)[1].lower())
+                    if pattern is None:
+                        continue
+                    path = os.path.join(directory, name)
+                    seen.add(path)
+                    if self._index_file(path, pattern):
+                        changed += 1
+        for path in set(self._files) - seen:
+            self.counts.subtract(self._files.pop(path)[1])
+            changed += 1
+        # Drops the identifiers whose count went down to zero.
+        self.counts += collections.Counter()
+        self.scans += 1
+        self.scan_time += time.time() - start
+        return changed
+
+    def _index_file(self, path, pattern):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return False
+        entry = self._files.get(path)
+        if entry and entry[0] == mtime:
+            return False
+        try:
+            with open(path) as source:
+                text = source.read()
+        except (IOError, OSError, ValueError):
+            return False
+        counts = collections.Counter(
+            identifier for identifier in pattern.findall(text)
+            if len(identifier) >= self.minimum_length
+            and identifier.lower() not in keywords)
+        if entry:
+            self.counts.subtract(entry[1])
+        self.counts.update(counts)
+        self._files[path] = (mtime, counts)
+        self.files_read += 1
+        return True
+
+    def words(self):
+        """Returns the list items of the size most frequent identifiers, most
+        frequent first.
+        """
+        items = []
+        spoken = set()
+        with self._lock:
+            counts = self.counts.most_common()
+        for (identifier, count) in counts:
+            if len(items) >= self.size:
+                break
+            words = spoken_form(identifier)
+            if not words or words in spoken:
+                continue
+            spoken.add(words)
+            items.append(identifier if identifier == words
+                         else "%s\\%s" % (identifier, words))
+        return items
+
+    def report(self):
+        return ("Identifier index: %d files, %d identifiers; %d scans read %d "
+                "files in %.0f ms" % (len(self._files), len(self.counts),
+                                      self.scans, self.files_read,
+                                      self.scan_time * 1000))
+
+
+# Shared index, kept alive across reloads of the command modules.
+identifier_index = IdentifierIndex()
+
+
+class IdentifierRefresher(object):
+    """Rescans the index every interval seconds and sets its words as the index
+    words of word_list, a WordListSources. A timer polls every poll_interval
+    seconds on the engine thread. It starts the scans on a thread, the first
+    one on its first call, and sets the words once a scan has finished.
+    """
+
+    def __init__(self, index, word_list, interval=60, poll_interval=1):
+        self.index = index
+        self.word_list = word_list
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self._timer = None
+        self._thread = None
+        self._scanned_at = None
+
+    def start(self):
+        self._timer = Timer(self.poll, self.poll_interval)
+
+    def stop(self):
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+
+    def poll(self):
+        if self._thread is not None:
+            if self._thread.is_alive():
+                return
+            self._thread = None
+            self.word_list.set("index", self.index.words())
+        if self.index.root and (self._scanned_at is None or
+                                time.time() - self._scanned_at >= self.interval):
+            self._scanned_at = time.time()
+            self._thread = threading.Thread(target=self.index.scan,
+                                            name="IdentifierIndex")
+            self._thread.daemon = True
+            self._thread.start()
@@ -0,0 +1,138 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Keeps the environment grammar alive across reloads of _commands.py.
+
+On mic off/on, NatLink re-imports _commands.py, which used to build and load a
+new grammar from scratch. GrammarReloader instead keeps the grammar from the
+previous import. The new environment tree is installed through the rule cache,
+so unchanged environments yield the very same rule objects. The reloader then
+only swaps the rules that differ and leaves the others in place. Dragon still
+has to receive the grammar again, because NatLink loads a grammar as a whole.
+
+NatLink keeps this module loaded as long as the file does not change, so the
+grammar survives the reload. If _commands.py fails to import, the previous
+commands stay loaded.
+"""
+
+from dragonfly import (
+    ListRef,
+    RuleRef,
+)
+
+
+class _RuleCollector(object):
+    """Stands in for a grammar during installation and records the rules."""
+
+    def __init__(self):
+        self.rules = []
+
+    def add_rule(self, rule):
+        if rule not in self.rules:
+            self.rules.append(rule)
+
+
+def rule_dependencies(rules):
+    """Returns the given rules and all rules referenced from them."""
+    found = []
+    pending = list(rules)
+    while pending:
+        rule = pending.pop()
+        if rule in found:
+            continue
+        found.append(rule)
+        elements = [rule.element]
+        while elements:
+            element = elements.pop()
+            if isinstance(element, RuleRef):
+                pending.append(element.rule)
+            elements.extend(element.children)
+    return found
+
+
+def list_dependencies(rules):
+    """Returns the lists referenced from the given rules, not from the rules
+    they refer to.
+    """
+    found = []
+    for rule in rules:
+        elements = [rule.element]
+        while elements:
+            element = elements.pop()
+            if isinstance(element, ListRef) \
+                    and not [True for lst in found if lst is element.list]:
+                found.append(element.list)
+            elements.extend(element.children)
+    return found
+
+
+class GrammarReloader(object):
+    """Installs an environment tree into a grammar that is kept between imports,
+    replacing only the rules that changed since the previous import.
+    """
+
+    def __init__(self):
+        self.grammar = None
+        self.added = 0
+        self.removed = 0
+        self.kept = 0
+
+    def load(self, create_grammar, root, cache, check=None):
+        """Installs the environments rooted at root and (re)loads the grammar.
+        create_grammar is called on the first import only. If given, check is
+        called with root after installation and before loading, on reloads
+        that add rules; if it returns False, the previous grammar is loaded
+        again as it was, and its rules stay in the cache. On the first import,
+        there is no previous grammar to fall back to, so check is not called.
+        Returns the RuleInterner used for installation.
+        """
+        collector = _RuleCollector()
+        cache.begin()
+        interner = root.install(collector, cache, exclusive_contexts=False)
+        if self.grammar is None:
+            old_rules = []
+        else:
+            old_rules = [rule for rule in self.grammar.rules if rule.exported]
+        new_rules = collector.rules
+        changed = [rule for rule in new_rules if rule not in old_rules]
+        if check is not None and self.grammar is not None and changed \
+                and not check(root):
+            # The previous grammar was unloaded by unload() of the module.
+            if not self.grammar.loaded:
+                self.grammar.load()
+            return interner
+        cache.end()
+        if self.grammar is None:
+            self.grammar = create_grammar()
+        needed = rule_dependencies(new_rules)
+        if self.grammar.loaded:
+            self.grammar.unload()
+        for rule in rule_dependencies(old_rules):
+            if rule not in needed and rule in self.grammar.rules:
+                self.grammar.remove_rule(rule)
+                rule._grammar = None
+        for rule in new_rules:
+            if rule not in old_rules:
+                self.grammar.add_rule(rule)
+        # The lists are added again from the rules on load. Lists of removed
+        # rules, and lists replaced by a new object with the same name, would
+        # otherwise stay in the grammar.
+        needed_lists = list_dependencies(needed)
+        for lst in self.grammar.lists:
+            if not [True for other in needed_lists if other is lst]:
+                self.grammar.remove_list(lst)
+                lst._grammar = None
+        self.added = len(changed)
+        self.removed = len([rule for rule in old_rules if rule not in new_rules])
+        self.kept = len(new_rules) - self.added
+        self.grammar.set_environments(root)
+        self.grammar.load()
+        return interner
+
+    def report(self):
+        return "Reload: %d environment rules kept, %d added, " \
+               "%d removed" % (self.kept, self.added, self.removed)
+
+
+# Shared reloader, kept alive across reloads of the command modules.
+grammar_reloader = GrammarReloader()
@@ -0,0 +1,275 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Sends the keystrokes of a recognized utterance in as few bursts as possible.
+
+An utterance like "up 3 sword 2 crash tell foo" used to execute one Key or
+Text action after the other, each with its own send call, followed by a pause.
+compile_actions() instead flattens the actions of an utterance into a list of
+steps. Keystrokes of Key and Text actions, including those inside series and
+bound actions, are merged into a single keyboard event list, and pauses become
+delays of the preceding event. Other actions, such as Mouse and Function, may
+depend on the keys before them having arrived, so they are kept as separate
+steps between the event lists.
+
+Actions that only send keys through Key and Text may set the class attribute
+batchable = True. They are executed while compiling, with their keystrokes
+captured into the event list by CapturingKeyboard. It only captures the keys
+of the thread compiling, so keys other threads send meanwhile go out as usual. Actions that build the action they execute from
+their data, such as FormatAction, may define build_action(data) instead, which
+is compiled in their place.
+
+Long text of Text actions is pasted instead of typed, see _text_insertion.
+
+The compiled steps are passed through _keystroke_peephole, which merges runs
+of arrow keys into repeated keys.
+"""
+
+import threading
+import time
+
+from dragonfly import (
+    ActionSeries,
+    BoundAction,
+    Key,
+    Pause,
+    Text,
+)
+
+from _action_executor import executor
+from _dragonfly_utils import wrap_keyboards
+from _keystroke_peephole import optimize
+from _lazy_actions import LazyAction
+from _modifier_state import tracker
+from _pacing import (
+    action_type,
+    pacer,
+)
+from _text_insertion import (
+    PasteText,
+    should_paste,
+    stats as insertion_stats,
+)
+
+# Set to False to execute the actions of an utterance one by one.
+enabled = True
+
+# Longest delay in seconds within one burst. Cancellation is checked between
+# bursts.
+cancel_interval = 0.2
+
+
+# The list the events of each thread are captured into, if any.
+_capturing = threading.local()
+
+
+class CapturingKeyboard(object):
+    """Wraps the keyboard of Key and Text, collecting the events of a thread
+    that is capturing instead of sending them. It wraps the other wrappers, so
+    the events are captured as the actions give them.
+    """
+
+    def __init__(self, keyboard):
+        self.keyboard = keyboard
+
+    def send_keyboard_events(self, events):
+        captured = getattr(_capturing, "events", None)
+        if captured is None:
+            self.keyboard.send_keyboard_events(events)
+        else:
+            captured.extend(events)
+
+
+wrap_keyboards(CapturingKeyboard, outermost=True)
+
+
+class BatchStats(object):
+    """Number of actions executed, and the keyboard bursts and separate
+    actions they were compiled into.
+    """
+
+    def __init__(self):
+        self.utterances = 0
+        self.actions = 0
+        self.bursts = 0
+        self.separate = 0
+
+    def report(self):
+        return ("Keystroke batching: %d utterances, %d actions compiled into "
+                "%d keyboard bursts and %d separate actions" % (
+                    self.utterances, self.actions, self.bursts, self.separate))
+
+
+stats = BatchStats()
+
+
+def compile_actions(actions):
+    """Compiles a list of (action, delay, stage) triples into steps. A step is
+    either a list of keyboard events, ("action", action, data) for an action
+    that must be executed on its own, or ("pause", seconds).
+    """
+    steps = []
+    for (action, delay, stage) in actions:
+        _compile(action, None, steps)
+        _add_delay(steps, delay)
+    return steps
+
+
+def _compile(action, data, steps):
+    if isinstance(action, BoundAction):
+        _compile(action._action, action._data, steps)
+    elif isinstance(action, LazyAction):
+        _compile(action.action, data, steps)
+    elif isinstance(action, ActionSeries):
+        for child in action._actions:
+            _compile(child, data, steps)
+    elif isinstance(action, (Key, Text)):
+        if action._static:
+            spec = action._spec
+        else:
+            try:
+                spec = action._spec % (data or {})
+            except KeyError:
+                # Executing it reports the failure like before.
+                steps.append(("action", action, data))
+                return
+        if isinstance(action, Text):
+            if should_paste(spec):
+                steps.append(("action", PasteText(spec), None))
+                return
+            insertion_stats.record_typed(spec)
+        if action._static:
+            events = action._events
+        else:
+            events = action._parse_spec(spec)
+        _add_events(steps, pacer.scale_events(events))
+    elif isinstance(action, Pause):
+        if action._static:
+            interval = action._events
+        else:
+            interval = action._parse_spec(action._spec % (data or {}))
+        _add_delay(steps, interval)
+    elif hasattr(action, "build_action"):
+        _compile(action.build_action(data), None, steps)
+    elif getattr(action, "batchable", False):
+        _add_events(steps, pacer.scale_events(_capture(action, data)))
+    else:
+        steps.append(("action", action, data))
+
+
+def _capture(action, data):
+    previous = getattr(_capturing, "events", None)
+    events = _capturing.events = []
+    try:
+        action.execute(data)
+    finally:
+        _capturing.events = previous
+    return events
+
+
+def _add_events(steps, events):
+    if not events:
+        return
+    if steps and isinstance(steps[-1], list):
+        steps[-1].extend(events)
+    else:
+        steps.append(list(events))
+
+
+def _add_delay(steps, delay):
+    """Adds a delay to the last event, or as a pause step after an action."""
+    if delay <= 0:
+        return
+    if steps and isinstance(steps[-1], list):
+        key, down, timeout = steps[-1][-1]
+        steps[-1][-1] = (key, down, timeout + delay)
+    elif steps and steps[-1][0] == "pause":
+        steps[-1] = ("pause", steps[-1][1] + delay)
+    else:
+        steps.append(("pause", delay))
+
+
+def _raw_keyboard():
+    """Returns the keyboard of Key without the wrappers around it. The events
+    are scaled already, and cancellation and modifiers are handled by
+    run_steps.
+    """
+    keyboard = Key._keyboard
+    while hasattr(keyboard, "keyboard"):
+        keyboard = keyboard.keyboard
+    return keyboard
+
+
+def _bursts(events):
+    """Splits an event list after every cancel_interval seconds of delays, so
+    that a cancelled utterance stops soon.
+    """
+    burst = []
+    delay = 0.0
+    for event in events:
+        burst.append(event)
+        delay += event[2]
+        if delay >= cancel_interval:
+            yield burst
+            burst = []
+            delay = 0.0
+    if burst:
+        yield burst
+
+
+def run_steps(steps, trace=None):
+    """Executes compiled steps, sending each event list in as few calls as
+    cancel_interval allows. Each step is added as a span to the trace, if
+    given.
+    """
+    keyboard = _raw_keyboard()
+    start = time.time()
+    for step in steps:
+        if isinstance(step, list):
+            for burst in _bursts(step):
+                executor.checkpoint()
+                burst, delay = tracker.filter(burst)
+                if delay:
+                    pacer.sleep(delay)
+                if burst:
+                    keyboard.send_keyboard_events(burst)
+                    stats.bursts += 1
+            stage = "keys"
+        elif step[0] == "pause":
+            executor.checkpoint()
+            pacer.sleep(step[1])
+            stage = "pause"
+        else:
+            executor.checkpoint()
+            step[1].execute(step[2])
+            stats.separate += 1
+            stage = "action:" + action_type(step[1])
+        if trace:
+            start = trace.span(stage, start)
+
+
+def execute_actions(actions, trace=None):
+    """Executes a list of (action, delay, stage) triples, batched if enabled.
+    The stage names the span of the action in the trace, if given, when the
+    actions are executed one by one.
+    """
+    if not enabled:
+        start = time.time()
+        for (action, delay, stage) in actions:
+            executor.checkpoint()
+            action.execute()
+            if trace:
+                start = trace.span(stage or "action:" + action_type(action),
+                                   start)
+            if delay > 0:
+                pacer.sleep(delay)
+                if trace:
+                    start = trace.span("pause", start)
+        return
+    stats.utterances += 1
+    stats.actions += len(actions)
+    start = time.time()
+    steps = optimize(compile_actions(actions))
+    if trace:
+        trace.span("compile", start)
+    run_steps(steps, trace)
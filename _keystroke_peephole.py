@@ -0,0 +1,182 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Merges and cancels arrow keys in the keystrokes of an utterance.
+
+A chain like "left 5 right 2 up 3 down 3" sends every arrow key with its "/5"
+delay. optimize() runs over the steps compiled by _keystroke_batching and
+merges each run of the same arrow key into one repeated key, like
+Key("left:5"): the presses follow each other after repeat_delay, and only the
+delay after the last press is kept.
+
+With cancel_opposites, it also cancels each arrow key pressed right after the
+opposite one, so that the chain above sends three left keys. Moves that cancel
+out completely are dropped, along with their delays. Note that an arrow key at
+the edge of a document or a list does nothing, so cancelling it against the
+opposite key changes where the cursor ends up. This is why it is off by
+default.
+
+Only plain presses of the arrow keys are merged or cancelled. Anything else in
+between, such as other keys, separate actions and arrow keys pressed with
+shift or ctrl held, e.g. while selecting, is left as it is. The first arrow key
+of a run is always sent, since it may collapse a selection.
+"""
+
+from dragonfly import Key
+
+from _modifier_state import modifier_keys
+
+# Set to False to send the arrow keys as spoken.
+enabled = True
+
+# Set to True to cancel arrow keys pressed right after the opposite one.
+cancel_opposites = False
+
+# Delay in seconds between the presses of a merged run. Raise it for
+# applications that drop repeated keys.
+repeat_delay = 0.0
+
+opposite_names = {
+    "left": "right",
+    "right": "left",
+    "up": "down",
+    "down": "up",
+}
+
+
+class PeepholeStats(object):
+
+    def __init__(self):
+        self.events = 0
+        self.removed = 0
+        self.merged = 0
+        self.delay_removed = 0.0
+
+    def report(self):
+        return ("Peephole: %d of %d key events removed, %d merged into "
+                "repeated keys, saving %.0f ms" % (
+                    self.removed, self.events, self.merged,
+                    self.delay_removed * 1000))
+
+
+stats = PeepholeStats()
+
+# Keys in keyboard events, e.g. virtual key codes for dragonfly, found on first
+# use.
+_opposites = None
+_modifiers = None
+
+
+def _keys():
+    global _opposites, _modifiers
+    if _opposites is None:
+        key = lambda name: Key(name)._events[0][0]
+        _opposites = dict((key(name), key(opposite))
+                          for (name, opposite) in opposite_names.items())
+        _modifiers = set(modifier_keys())
+    return _opposites, _modifiers
+
+
+def optimize(steps):
+    """Returns the steps with the runs of arrow keys in their event lists
+    merged, and the cancelling ones removed if cancel_opposites is set.
+    """
+    if not enabled:
+        return steps
+    opposites, modifiers = _keys()
+    held = set()
+    optimized = []
+    for step in steps:
+        if isinstance(step, list):
+            stats.events += len(step)
+            events = step
+            if cancel_opposites:
+                events = _cancel(events, opposites, modifiers, set(held))
+            events = _merge(events, opposites, modifiers, held)
+            if events:
+                optimized.append(events)
+        else:
+            optimized.append(step)
+    return optimized
+
+
+def _presses(events, index, opposites, held):
+    """Returns whether events[index] is a plain press of an arrow key, released
+    by the next event.
+    """
+    key, down, timeout = events[index]
+    return (key in opposites and down and not held
+            and index + 1 < len(events)
+            and events[index + 1][:2] == (key, False))
+
+
+def _update_held(event, modifiers, held):
+    key, down, timeout = event
+    if key in modifiers:
+        if down:
+            held.add(key)
+        else:
+            held.discard(key)
+
+
+def _merge(events, opposites, modifiers, held):
+    """Sends each run of plain presses of the same arrow key after
+    repeat_delay, keeping the delay after the last release.
+    """
+    merged = list(events)
+    index = 0
+    while index < len(merged):
+        if not _presses(merged, index, opposites, held):
+            _update_held(merged[index], modifiers, held)
+            index += 1
+            continue
+        key = merged[index][0]
+        end = index + 2
+        while end < len(merged) and merged[end][0] == key \
+                and _presses(merged, end, opposites, held):
+            end += 2
+        # Every release of the run but the last.
+        for release in range(index + 1, end - 2, 2):
+            key, down, timeout = merged[release]
+            if timeout > repeat_delay:
+                stats.delay_removed += timeout - repeat_delay
+                merged[release] = (key, down, repeat_delay)
+        if end - index > 2:
+            stats.merged += end - index
+        index = end
+    return merged
+
+
+def _cancel(events, opposites, modifiers, held):
+    kept = []
+    # Index in kept of each plain arrow key press that may still be
+    # cancelled, most recent last, or None outside a run of arrow keys.
+    presses = None
+    index = 0
+    while index < len(events):
+        key, down, timeout = events[index]
+        if key in modifiers:
+            _update_held(events[index], modifiers, held)
+        elif _presses(events, index, opposites, held):
+            release_timeout = events[index + 1][2]
+            if presses is None:
+                presses = []
+                kept.append((key, down, timeout))
+                kept.append(events[index + 1])
+            elif presses and kept[presses[-1]][0] == opposites[key]:
+                start = presses.pop()
+                stats.removed += 4
+                stats.delay_removed += sum(event[2]
+                                           for event in kept[start:])
+                stats.delay_removed += timeout + release_timeout
+                del kept[start:]
+            else:
+                presses.append(len(kept))
+                kept.append((key, down, timeout))
+                kept.append(events[index + 1])
+            index += 2
+            continue
+        presses = None
+        kept.append((key, down, timeout))
+        index += 1
+    return kept
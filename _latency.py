@@ -0,0 +1,162 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Latency of recognized utterances, from recognition to the last key event.
+
+RepeatRule starts a trace when dragonfly delivers a recognition and adds a
+span for each stage:
+- extras: extracting the extras from the recognition,
+- queue: waiting for the executor, see _action_executor,
+- compile: compiling the actions into keystroke bursts, see
+  _keystroke_batching,
+- keys: sending a keystroke burst,
+- action:<type>: executing an action, e.g. action:Mouse,
+- pause: pausing between actions,
+- release and final: the release keys and the final command, when the
+  actions are executed one by one,
+- rejected: the executor queue was full, and the utterance was dropped.
+The finished traces are kept in a ring buffer and, if a path is set, appended
+to a JSON-lines file. Running this module prints the p50/p95/p99 latencies of
+such a file, per environment, per spoken command and per stage:
+    python _latency.py latency.jsonl
+The spoken commands are given by their specs, e.g. "up [<n>]", see
+command_specs(). An utterance counts for each command spoken in it.
+"""
+
+import collections
+import json
+import sys
+import time
+
+# Set to False to skip the instrumentation.
+enabled = True
+
+
+class Trace(object):
+    """Spans of one utterance, as (stage, milliseconds)."""
+
+    def __init__(self, environment, words, commands=()):
+        self.start = time.time()
+        self.environment = environment
+        self.words = words
+        self.commands = list(commands)
+        self.spans = []
+        self.total = None
+
+    def span(self, stage, start):
+        """Adds a span from start until now, and returns now."""
+        now = time.time()
+        self.spans.append((stage, (now - start) * 1000))
+        return now
+
+    def to_dict(self):
+        return {
+            "time": self.start,
+            "environment": self.environment,
+            "words": self.words,
+            "commands": self.commands,
+            "spans": self.spans,
+            "total": self.total,
+        }
+
+
+class LatencyRecorder(object):
+    """Ring buffer of the latest traces, optionally written to a file."""
+
+    def __init__(self, size=1000, path=None):
+        self.traces = collections.deque(maxlen=size)
+        self.path = path
+        self._file = None
+
+    def begin(self, environment, words, commands=()):
+        if not enabled:
+            return None
+        return Trace(environment, words, commands)
+
+    def finish(self, trace):
+        if trace is None:
+            return
+        trace.total = (time.time() - trace.start) * 1000
+        self.traces.append(trace)
+        if self.path:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps(trace.to_dict()) + "\n")
+            self._file.flush()
+
+    def report(self):
+        return report([trace.to_dict() for trace in list(self.traces)])
+
+
+# Shared recorder, kept alive across reloads of the command modules.
+recorder = LatencyRecorder()
+
+
+def command_specs(node, specs=None):
+    """Returns the specs of the commands matched below node of a recognition,
+    e.g. ["up [<n>]", "tell <text>"]. The elements within a command are not
+    searched.
+    """
+    if specs is None:
+        specs = []
+    for child in node.children:
+        spec = getattr(child.actor, "_spec", None)
+        if spec is not None:
+            specs.append(spec)
+        else:
+            command_specs(child, specs)
+    return specs
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def _table(title, groups):
+    lines = ["%-32s %6s %9s %9s %9s" % (title, "count", "p50 ms", "p95 ms",
+                                       "p99 ms")]
+    for name in sorted(groups):
+        values = groups[name]
+        lines.append("%-32s %6d %9.1f %9.1f %9.1f" % (
+            name[:32], len(values), percentile(values, 0.5),
+            percentile(values, 0.95), percentile(values, 0.99)))
+    return lines
+
+
+def report(traces):
+    """Returns the latency percentiles of the given trace dicts."""
+    if not traces:
+        return "Latency: no utterances recorded"
+    environments = collections.defaultdict(list)
+    commands = collections.defaultdict(list)
+    stages = collections.defaultdict(list)
+    for trace in traces:
+        environments[trace["environment"]].append(trace["total"])
+        # Traces written before the commands were recorded have the words.
+        spoken = trace.get("commands") or trace["words"][:1] or ["(unknown)"]
+        for command in set(spoken):
+            commands[command].append(trace["total"])
+        per_stage = collections.defaultdict(float)
+        for (stage, milliseconds) in trace["spans"]:
+            per_stage[stage] += milliseconds
+        for (stage, milliseconds) in per_stage.items():
+            stages[stage].append(milliseconds)
+    lines = _table("Environment", environments)
+    lines.append("")
+    lines.extend(_table("Command", commands))
+    lines.append("")
+    lines.extend(_table("Stage", stages))
+    return "\n".join(lines)
+
+
+def read_traces(path):
+    with open(path) as trace_file:
+        return [json.loads(line) for line in trace_file if line.strip()]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python _latency.py <latency.jsonl>")
+        sys.exit(2)
+    print(report(read_traces(sys.argv[1])))
@@ -0,0 +1,73 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Drop-in replacements for Key, Text and Mouse that defer building the action.
+
+dragonfly parses the spec of a static action when it is constructed, so
+importing _commands.py used to parse every spec of every environment. The
+factories below return a LazyAction instead, which keeps the arguments and
+builds the real action the first time it is executed. Actions that are never
+spoken are never parsed.
+"""
+
+import dragonfly
+
+from dragonfly import ActionBase
+
+# Set to False before importing the command modules to build all actions
+# eagerly, e.g. to compare import times.
+enabled = True
+
+
+class LazyAction(ActionBase):
+    """Action that builds the wrapped action on first execution and reuses it
+    after that.
+    """
+
+    created = 0
+    built = 0
+
+    def __init__(self, factory, *args, **kwargs):
+        ActionBase.__init__(self)
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs
+        self._action = None
+        LazyAction.created += 1
+
+    @property
+    def action(self):
+        """The wrapped action, built on first access."""
+        if self._action is None:
+            self._action = self._factory(*self._args, **self._kwargs)
+            LazyAction.built += 1
+        return self._action
+
+    def _execute(self, data=None):
+        return self.action.execute(data)
+
+    def __str__(self):
+        return "%s(%s)" % (self._factory.__name__,
+                           ", ".join([repr(arg) for arg in self._args]))
+
+
+def lazy(action_class):
+    """Returns a factory with the signature of action_class, which creates lazy
+    actions.
+    """
+    def factory(*args, **kwargs):
+        if not enabled:
+            return action_class(*args, **kwargs)
+        return LazyAction(action_class, *args, **kwargs)
+    factory.__name__ = action_class.__name__
+    return factory
+
+
+def stats():
+    return "Lazy actions: %d created, %d built" % (LazyAction.created,
+                                                 LazyAction.built)
+
+
+Key = lazy(dragonfly.Key)
+Text = lazy(dragonfly.Text)
+Mouse = lazy(dragonfly.Mouse)
@@ -0,0 +1,133 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Tracks the modifier keys held down, to skip releasing those that are up.
+
+_problematic_chars.release releases shift, ctrl and alt after every utterance,
+and around every character typed with an alt code or ctrl+alt, so typing one
+"{" took eight or more key events. While RepeatRule executes an utterance,
+the keys it sends through Key and Text, and the keystroke bursts of
+_keystroke_batching, pass through the ModifierTracker. It drops the release of
+a modifier it knows to be up, and moves the delay of the dropped event to the
+event before it.
+
+The tracker only knows the keys sent by the execution between its begin() and
+end(), on the thread that called begin(). A modifier is therefore unknown at
+the start of each utterance, and its first release is always sent. Keys sent
+by other grammars and threads pass through unchanged.
+"""
+
+import threading
+
+from dragonfly import Key
+
+from _dragonfly_utils import wrap_keyboards
+from _pacing import pacer
+
+# Set to False to send every modifier release.
+enabled = True
+
+modifier_names = ("shift", "ctrl", "alt", "win")
+
+
+def modifier_keys():
+    """Returns the keys of the modifiers in keyboard events, e.g. the virtual
+    key codes for dragonfly.
+    """
+    return [Key(name + ":up")._events[0][0] for name in modifier_names]
+
+
+class ModifierTracker(object):
+
+    def __init__(self):
+        self._modifiers = None
+        # Whether each modifier is down, if known, in the execution of each
+        # thread.
+        self._execution = threading.local()
+        self.sent = 0
+        self.dropped = 0
+
+    def begin(self):
+        """Starts tracking the keys sent by the calling thread, with the state
+        of the modifiers unknown.
+        """
+        self._execution.held = {}
+
+    def end(self):
+        """Stops tracking the keys sent by the calling thread."""
+        self._execution.held = None
+
+    def filter(self, events):
+        """Returns the events to send, without the releases of modifiers that
+        are up, and records the state of the modifiers. The delay of a dropped
+        leading event is returned as well. Outside an execution, the events are
+        returned unchanged.
+        """
+        held = getattr(self._execution, "held", None)
+        if held is None:
+            return events, 0.0
+        if self._modifiers is None:
+            self._modifiers = set(modifier_keys())
+        kept = []
+        delay = 0.0
+        for (key, down, timeout) in events:
+            if key in self._modifiers:
+                if enabled and not down and held.get(key) is False:
+                    self.dropped += 1
+                    if kept:
+                        previous_key, previous_down, previous_timeout = kept[-1]
+                        kept[-1] = (previous_key, previous_down,
+                                    previous_timeout + timeout)
+                    else:
+                        delay += timeout
+                    continue
+                held[key] = down
+            kept.append((key, down, timeout))
+        self.sent += len(kept)
+        return kept, delay
+
+    def report(self):
+        return ("Modifier tracking: %d key events sent, %d redundant releases "
+                "dropped" % (self.sent, self.dropped))
+
+
+# Shared tracker, kept alive across reloads of the command modules.
+tracker = ModifierTracker()
+
+
+def held_modifiers(events, modifiers=None):
+    """Returns the non-modifier events of a stream as (key, down, held
+    modifiers), to compare streams that differ only in redundant releases.
+    """
+    modifiers = set(modifiers or modifier_keys())
+    held = set()
+    result = []
+    for event in events:
+        key, down = event[:2]
+        if key in modifiers:
+            if down:
+                held.add(key)
+            else:
+                held.discard(key)
+        else:
+            result.append((key, down, frozenset(held)))
+    return result
+
+
+class ModifierKeyboard(object):
+    """Wraps the keyboard of Key and Text, filtering the events through the
+    tracker during an execution.
+    """
+
+    def __init__(self, keyboard):
+        self.keyboard = keyboard
+
+    def send_keyboard_events(self, events):
+        events, delay = tracker.filter(events)
+        if delay:
+            pacer.sleep(delay)
+        if events:
+            self.keyboard.send_keyboard_events(events)
+
+
+wrap_keyboards(ModifierKeyboard)
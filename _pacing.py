@@ -0,0 +1,254 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Delays between the actions of a recognized utterance.
+
+The RepeatRule used to pause 50 ms after every action of a sequence, and the
+Key specs carry hand-tuned delays such as "/5" and "/15". Both were tuned for
+the slowest application. A PacingProfile holds the delays for one environment
+instead:
+- after_action: pause after each action of a sequence,
+- after_type: pauses after specific action types, e.g. {"Text": 0.0},
+- key_delay_scale: factor for the delays between keys in Key and Text specs,
+  up to max_scaled_delay. Longer delays, such as "enter/100" or "win/40",
+  wait for the application to open a window or a menu and are kept,
+- paste_threshold: length from which text is pasted instead of typed, see
+  _text_insertion.
+Environments choose a profile by name, see Environment, and inherit the
+profile of their parent. Environments that choose none get a profile of their
+own.
+
+The profile applies to the thread executing the utterance, between begin() and
+end(). Keys that other grammars or threads send meanwhile are not scaled.
+
+Calibrator finds the smallest delays at which an application still receives
+every key. Calibrated profiles are saved next to this module and loaded on the
+next start.
+"""
+
+import json
+import os.path
+import threading
+import time
+
+from dragonfly import (
+    ActionSeries,
+    BoundAction,
+    Key,
+    Text,
+)
+
+from _clipboard import clipboard
+from _dragonfly_utils import wrap_keyboards
+from _lazy_actions import LazyAction
+
+default_profile_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "pacing_profiles.json")
+
+# Longest key delay in seconds that key_delay_scale applies to, "/5" in a spec.
+max_scaled_delay = 0.05
+
+
+class PacingProfile(object):
+    """Delays in seconds for one environment. The defaults reproduce the fixed
+    pause used before.
+    """
+
+    def __init__(self, after_action=0.05, after_type=None, key_delay_scale=1.0,
+                 paste_threshold=None):
+        self.after_action = after_action
+        self.after_type = dict(after_type or {})
+        self.key_delay_scale = key_delay_scale
+        # None for the default of _text_insertion, 0 to never paste.
+        self.paste_threshold = paste_threshold
+
+    def delay_after(self, action):
+        return self.after_type.get(action_type(action), self.after_action)
+
+    def to_dict(self):
+        return {
+            "after_action": self.after_action,
+            "after_type": self.after_type,
+            "key_delay_scale": self.key_delay_scale,
+            "paste_threshold": self.paste_threshold,
+        }
+
+
+def action_type(action):
+    """Returns the class name of an action, looking through the wrappers
+    around it. For a series, the last action counts, since the delay follows
+    it.
+    """
+    while True:
+        if isinstance(action, BoundAction):
+            action = action._action
+        elif isinstance(action, LazyAction):
+            return action._factory.__name__
+        elif isinstance(action, ActionSeries) and action._actions:
+            action = action._actions[-1]
+        else:
+            return action.__class__.__name__
+
+
+class PacedKeyboard(object):
+    """Wraps the keyboard of Key and Text, scaling the delays of the events
+    sent by a thread with an active profile.
+    """
+
+    def __init__(self, keyboard):
+        self.keyboard = keyboard
+
+    def send_keyboard_events(self, events):
+        self.keyboard.send_keyboard_events(pacer.scale_events(events))
+
+
+class Pacer(object):
+    """Keeps the profiles and applies the profile of the utterance being
+    executed.
+    """
+
+    def __init__(self, path=default_profile_path):
+        self.path = path
+        self.profiles = {"default": PacingProfile()}
+        # The profile of the utterance executed by each thread.
+        self._active = threading.local()
+        self.sleep = time.sleep
+        if path and os.path.exists(path):
+            try:
+                with open(path) as profile_file:
+                    for name, values in json.load(profile_file).items():
+                        self.profiles[name] = PacingProfile(**values)
+            except (IOError, ValueError, TypeError):
+                pass
+
+    def get(self, name):
+        """Returns the profile with the given name, creating it with default
+        delays if needed.
+        """
+        if name not in self.profiles:
+            self.profiles[name] = PacingProfile()
+        return self.profiles[name]
+
+    @property
+    def profile(self):
+        """The active profile of the calling thread, or None."""
+        return getattr(self._active, "profile", None)
+
+    def begin(self, name):
+        self._active.profile = self.get(name)
+
+    def end(self):
+        self._active.profile = None
+
+    def delay_after(self, action):
+        """Returns the pause in seconds after an action of a sequence."""
+        return self.profile.delay_after(action) if self.profile else 0.05
+
+    def pause_after(self, action):
+        delay = self.delay_after(action)
+        if delay > 0:
+            self.sleep(delay)
+
+    def scale_events(self, events):
+        """Scales the delays between keyboard events by the active profile,
+        keeping those longer than max_scaled_delay.
+        """
+        if self.profile is None or self.profile.key_delay_scale == 1.0:
+            return events
+        scale = self.profile.key_delay_scale
+        return [(key, down,
+                 timeout * scale if timeout <= max_scaled_delay else timeout)
+                for (key, down, timeout) in events]
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "w") as profile_file:
+                json.dump(dict((name, profile.to_dict())
+                               for (name, profile) in self.profiles.items()),
+                          profile_file, indent=2, sort_keys=True)
+        except IOError:
+            pass
+
+
+# Shared pacer, kept alive across reloads of the command modules.
+pacer = Pacer()
+
+wrap_keyboards(PacedKeyboard)
+
+
+class Calibrator(object):
+    """Finds the smallest delays of a profile at which the foreground
+    application receives every key. Run it with the caret in an empty text
+    field: it types a sample as a sequence of actions, selects and copies it,
+    and compares the clipboard with the sample. Each delay is halved, by
+    bisection, as long as all trials pass.
+    """
+
+    sample = "pacing 123"
+
+    def __init__(self, name, trials=3, steps=6, maximum_delay=0.1,
+                 read_back=None):
+        self.name = name
+        self.trials = trials
+        self.steps = steps
+        self.maximum_delay = maximum_delay
+        self.read_back = read_back or _copy_field
+
+    def calibrate(self):
+        """Calibrates the profile, saves it and returns it. The pauses after
+        specific action types are kept, but not used while calibrating.
+        """
+        profile = pacer.get(self.name)
+        after_type = profile.after_type
+        profile.after_type = {}
+        profile.key_delay_scale = 1.0
+        try:
+            profile.after_action = self._bisect(
+                lambda delay: setattr(profile, "after_action", delay),
+                self.maximum_delay)
+            profile.key_delay_scale = self._bisect(
+                lambda scale: setattr(profile, "key_delay_scale", scale),
+                1.0)
+        finally:
+            profile.after_type = after_type
+        pacer.save()
+        return profile
+
+    def _bisect(self, apply, maximum):
+        low, high = 0.0, maximum
+        apply(low)
+        if self._passes():
+            return low
+        for step in range(self.steps):
+            middle = (low + high) / 2
+            apply(middle)
+            if self._passes():
+                high = middle
+            else:
+                low = middle
+        apply(high)
+        return high
+
+    def _passes(self):
+        for trial in range(self.trials):
+            pacer.begin(self.name)
+            try:
+                for character in self.sample:
+                    action = Key("space") if character == " " else Text(character)
+                    action.execute()
+                    pacer.pause_after(action)
+            finally:
+                pacer.end()
+            if self.read_back() != self.sample:
+                return False
+        return True
+
+
+def _copy_field():
+    """Copies and clears the contents of the focused text field."""
+    Key("c-a/20, c-c/20").execute()
+    text = clipboard.get_text() or u""
+    Key("del/20").execute()
+    return text
@@ -2,15 +2,29 @@
 # (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
 # Licensed under the LGPL, see <http://www.gnu.org/licenses/>
 
+import time
+
 from _dragonfly_utils import ElementWrapper
 from _characters_and_numbers import character_rule
+from _action_executor import (
+    executor,
+    is_immediate,
+    sends_keys_only,
+)
+from _keystroke_batching import execute_actions
+from _latency import (
+    command_specs,
+    recorder,
+)
+from _modifier_state import tracker
+from _pacing import pacer
 from _problematic_chars import release
+from _utterance_recording import recorder as utterance_recorder
 from _window_switching import final_rule
 
 from dragonfly import (
     Alternative,
     CompoundRule,
-    Pause,
     Repetition,
     RuleRef,
 )
@@ -22,7 +36,8 @@ from dragonfly import (
 #  actions and the number of times to repeat them.
 class RepeatRule(CompoundRule):
 
-    def __init__(self, name, command, terminal_command, context):
+    def __init__(self, name, command, terminal_command, context,
+                 pacing="default"):
         # Here we define this rule's spoken-form and special elements. Note that
         # nested_repetitions is the only one that contains Repetitions, and it
         # is not itself repeated. This is for performance purposes.
@@ -46,6 +61,23 @@ class RepeatRule(CompoundRule):
 
         CompoundRule.__init__(self, name=name, spec=spec,
                               extras=extras, defaults=defaults, exported=True, context=context)
+        # Name of the PacingProfile with the delays between actions.
+        self.pacing = pacing
+        self.environment = name[:-len("RepeatRule")]
+        self._trace = None
+
+    def process_recognition(self, node):
+        # Start timing before dragonfly extracts the extras.
+        commands = []
+        if node:
+            for name in ("sequence", "nested_repetitions", "terminal_command",
+                         "final_command"):
+                child = node.get_child_by_name(name, shallow=True)
+                if child:
+                    command_specs(child, commands)
+        self._trace = recorder.begin(self.environment,
+                                     node.words() if node else [], commands)
+        CompoundRule.process_recognition(self, node)
 
     # This method gets called when this rule is recognized.
     # Arguments:
@@ -53,17 +85,60 @@ class RepeatRule(CompoundRule):
     #  - extras -- dict of the "extras" special elements:
     #     . extras["sequence"] gives the sequence of actions.
     def _process_recognition(self, node, extras):
+        trace, self._trace = self._trace, None
+        if trace:
+            trace.span("extras", trace.start)
+        if utterance_recorder.path:
+            utterance_recorder.record(self, node.words() if node else [],
+                                      extras)
         sequence = extras["sequence"]   # A sequence of actions.
         nested_repetitions = extras["nested_repetitions"]
         terminal_command = extras["terminal_command"]
         final_command = extras["final_command"]
+        # Actions such as "stop" run right away, the others are queued.
+        queued = []
         for action in sequence:
-            action.execute()
-            Pause("5").execute()
-        if nested_repetitions:
-            nested_repetitions.execute()
-        if terminal_command:
-            terminal_command.execute()
-        release.execute()
-        if final_command:
-            final_command.execute()
+            if is_immediate(action):
+                action.execute()
+            else:
+                queued.append(action)
+        commands = [
+            (nested_repetitions, None),
+            (terminal_command, None),
+            (release, "release"),
+            (final_command, "final"),
+        ]
+        actions = queued + [action for (action, stage) in commands if action]
+        if all(sends_keys_only(action) for action in actions):
+            execute = executor.submit
+        else:
+            # Functions, Mimic and the like may call into the engine, so they
+            # run on this thread.
+            execute = executor.run
+        submitted = time.time()
+        if not execute(self._execute, queued, commands, trace, submitted):
+            if trace:
+                trace.span("rejected", submitted)
+            recorder.finish(trace)
+
+    def _execute(self, sequence, commands, trace, submitted):
+        """Executes the recognized actions."""
+        if trace:
+            trace.span("queue", submitted)
+        pacer.begin(self.pacing)
+        # Modifiers may have been pressed since the last utterance.
+        tracker.begin()
+        try:
+            actions = [(action, pacer.delay_after(action), None)
+                       for action in sequence]
+            actions.extend((action, 0, stage)
+                           for (action, stage) in commands if action)
+            execute_actions(actions, trace)
+        finally:
+            pacer.end()
+            tracker.end()
+            recorder.finish(trace)
+
+
+# Release the modifier keys that a cancelled utterance may have left down.
+executor.cleanup = release.execute
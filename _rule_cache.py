@@ -0,0 +1,320 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Cache of compiled rules, keyed by a content hash of the maps they were built
+from.
+
+NatLink only re-imports the command modules that changed, so this module and
+its cache survive a mic off/on reload of _commands.py. Rules whose maps did not
+change are then taken from the cache instead of being compiled again, and the
+grammar keeps them, see _incremental_reload. The rule objects hold lambdas and
+engine state and cannot be written to disk, so the cache only lasts for the
+session: after a restart every rule is built again.
+
+The fingerprint of an object covers its attributes and the code of its class,
+so that editing a method of an action class rebuilds the rules that use it.
+Lists and DictLists only count by name: their items are set while the grammar
+is loaded and are not part of the rules. A Fingerprinter hashes each object
+once, so the layers that environments share, such as the global maps, are not
+hashed again for every environment. The report gives the time saved by the
+hits less the time spent hashing.
+"""
+
+import collections
+import hashlib
+import inspect
+import sys
+import time
+import types
+import weakref
+
+from dragonfly import (
+    DictList,
+    List,
+    RuleWrap,
+)
+
+from _dragonfly_utils import LayeredMap
+
+# Attributes that point back to the owner of an object or are derived from
+# other attributes, and say nothing more about its content.
+_ignored_attributes = frozenset(["_grammar", "_events"])
+
+_value_types = frozenset([type(None), bool, int, long, float, str, unicode])
+
+# Digest of the code of each class, see _class_digest().
+_class_digests = weakref.WeakKeyDictionary()
+
+
+class Fingerprinter(object):
+    """Computes fingerprints, hashing each object only once. The objects must
+    not change while it is used, so use one per installation. time is the time
+    spent hashing, and modules the modules of the functions hashed.
+    """
+
+    def __init__(self):
+        # Id of each object hashed to its digest, and the object, so that its
+        # id is not reused.
+        self._digests = {}
+        self.time = 0.0
+        self.modules = set()
+
+    def fingerprint(self, obj):
+        start = time.time()
+        digest = hashlib.sha1()
+        _update(digest, obj, self)
+        self.time += time.time() - start
+        return digest.hexdigest()
+
+
+    def add_module(self, function):
+        module = sys.modules.get(function.__module__)
+        if getattr(module, "__dict__", None) is function.func_globals:
+            self.modules.add(module)
+
+
+def fingerprint(obj):
+    """Returns a hash of the content of obj, e.g. an action map, element map or
+    context. Objects without a natural value are hashed by their class and
+    attributes, and functions by their code and the values of the globals they
+    refer to, so two maps built from the same source get the same fingerprint.
+    """
+    return Fingerprinter().fingerprint(obj)
+
+
+def _update(digest, obj, fingerprinter):
+    if type(obj) in _value_types:
+        digest.update("%s:%r;" % (type(obj).__name__, obj))
+    else:
+        digest.update(_digest(obj, fingerprinter))
+
+
+def _digest(obj, fingerprinter):
+    """Returns the digest of obj, computing it only once per Fingerprinter."""
+    if isinstance(obj, LayeredMap):
+        layers = [layer for layer in obj.layers() if layer]
+        if len(layers) == 1:
+            # A map that adds nothing to its parent has the parent's content.
+            return _digest(layers[0], fingerprinter)
+    digests = fingerprinter._digests
+    entry = digests.get(id(obj))
+    if entry is not None:
+        return entry[0]
+    # Marks a reference back to an object being hashed, e.g. from a rule to
+    # its element and back.
+    digests[id(obj)] = ("cycle;", obj)
+    digest = hashlib.sha1()
+    _hash(digest, obj, fingerprinter)
+    result = digest.hexdigest() + ";"
+    digests[id(obj)] = (result, obj)
+    return result
+
+
+def _hash(digest, obj, fingerprinter):
+    if isinstance(obj, LayeredMap):
+        # The layers are shared between maps, so each is hashed only once.
+        digest.update("layers{")
+        for layer in obj.layers():
+            _update(digest, layer, fingerprinter)
+        digest.update("}")
+    elif isinstance(obj, (List, DictList)):
+        digest.update("%s:%s;" % (type(obj).__name__, obj.name))
+    elif isinstance(obj, (type, types.ClassType)):
+        digest.update("class:%s;" % _class_digest(obj))
+    elif isinstance(obj, types.ModuleType):
+        digest.update("module:%s;" % obj.__name__)
+    elif isinstance(obj, types.CodeType):
+        _update_code(digest, obj)
+    elif isinstance(obj, types.FunctionType):
+        digest.update("function;")
+        _update_code(digest, obj.func_code)
+        _update(digest, obj.func_defaults, fingerprinter)
+        _update(digest, [cell.cell_contents for cell in obj.func_closure or ()],
+                fingerprinter)
+        fingerprinter.add_module(obj)
+        # A module-level value the function reads may change on reload.
+        _update(digest, _global_values(obj), fingerprinter)
+    elif isinstance(obj, types.MethodType):
+        digest.update("method;")
+        _update(digest, obj.im_func, fingerprinter)
+        _update(digest, obj.im_self, fingerprinter)
+    elif isinstance(obj, (types.BuiltinFunctionType, types.BuiltinMethodType)):
+        digest.update("builtin:%s;" % obj.__name__)
+    elif isinstance(obj, RuleWrap):
+        # The rule of a RuleWrap gets a new name every time one is created,
+        # so only its element counts.
+        digest.update("RuleWrap{")
+        attributes = dict(vars(obj))
+        rule = attributes.pop("_rule")
+        _update(digest, attributes, fingerprinter)
+        _update(digest, rule.element, fingerprinter)
+        digest.update("}")
+    else:
+        if type(obj) is dict:
+            digest.update("mapping{")
+        else:
+            digest.update("%s{" % _class_digest(type(obj)))
+        if isinstance(obj, collections.Mapping):
+            for key in sorted(obj.keys()):
+                _update(digest, key, fingerprinter)
+                _update(digest, obj[key], fingerprinter)
+        elif isinstance(obj, (list, tuple)):
+            for item in obj:
+                _update(digest, item, fingerprinter)
+        elif isinstance(obj, (set, frozenset)):
+            for item in sorted(obj):
+                _update(digest, item, fingerprinter)
+        attributes = getattr(obj, "__dict__", {})
+        for name in sorted(attributes):
+            if name not in _ignored_attributes:
+                _update(digest, name, fingerprinter)
+                _update(digest, attributes[name], fingerprinter)
+        digest.update("}")
+
+
+def _update_code(digest, code):
+    digest.update("code:%s;" % code.co_code)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _update_code(digest, const)
+        else:
+            digest.update("%r;" % (const,))
+    digest.update("names:%s;" % ",".join(code.co_names))
+
+
+def _class_digest(cls):
+    """Returns a digest of the name, methods and plain attributes of cls and
+    its bases. The classes of the command modules are created again on every
+    reload, and others are hashed once.
+    """
+    try:
+        return _class_digests[cls]
+    except (KeyError, TypeError):
+        pass
+    digest = hashlib.sha1()
+    for base in inspect.getmro(cls):
+        if base is object:
+            continue
+        digest.update("class:%s.%s{" % (base.__module__, base.__name__))
+        for (name, value) in sorted(vars(base).items()):
+            if isinstance(value, (staticmethod, classmethod)):
+                value = value.__get__(None, base)
+            if isinstance(value, property):
+                value = value.fget
+            if isinstance(value, types.MethodType):
+                value = value.im_func
+            if isinstance(value, types.FunctionType):
+                digest.update("%s:" % name)
+                _update_code(digest, value.func_code)
+            elif type(value) in _value_types:
+                digest.update("%s:%r;" % (name, value))
+        digest.update("}")
+    result = "%s.%s:%s" % (cls.__module__, cls.__name__, digest.hexdigest())
+    try:
+        _class_digests[cls] = result
+    except TypeError:
+        pass
+    return result
+
+
+def _global_values(function):
+    """Returns the names and values of the globals read by function and the
+    functions defined in it.
+    """
+    names = set()
+    codes = [function.func_code]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes.extend(const for const in code.co_consts
+                     if isinstance(const, types.CodeType))
+    return dict((name, function.func_globals[name]) for name in names
+                if name in function.func_globals)
+
+
+class RuleCache(object):
+    """Compiled rules keyed by a fingerprint of their content.
+
+    Call begin() before installing a grammar and end() afterwards. Rules that
+    were not requested in between are dropped, so the cache does not grow with
+    every edit of the command modules.
+    """
+
+    def __init__(self):
+        self._rules = {}
+        self._used = set()
+        self._build_times = {}
+        # Modules of the functions in each rule. Python 2 clears the globals of
+        # a module when it is freed, which would break the functions of a rule
+        # kept across a reload.
+        self._modules = {}
+        self.begin()
+
+    def begin(self):
+        self._used.clear()
+        self.hits = 0
+        self.misses = 0
+        # Time spent computing the fingerprints of the rule content.
+        self.hash_time = 0.0
+        self.time_saved = collections.defaultdict(float)
+        self.time_spent = collections.defaultdict(float)
+
+    def get(self, environment, name, content, build, modules=()):
+        """Returns the rule built from content, calling build only if no such rule
+        is cached. Hits and misses are accounted to the given environment name.
+        Rules are shared by content, so content must include the name where the
+        name matters. modules are kept alive as long as a rule built now is
+        cached.
+        """
+        start = time.time()
+        key = fingerprint(content)
+        self.hash_time += time.time() - start
+        self._used.add(key)
+        rule = self._rules.get(key)
+        if rule is not None:
+            self.hits += 1
+            self.time_saved[environment] += self._build_times.get(key, 0.0)
+            return rule
+        start = time.time()
+        rule = build()
+        elapsed = time.time() - start
+        self.misses += 1
+        self.time_spent[environment] += elapsed
+        self._rules[key] = rule
+        self._build_times[key] = elapsed
+        self._modules[key] = frozenset(modules)
+        return rule
+
+    def end(self):
+        """Drops the rules that were not used since begin()."""
+        for key in list(self._rules):
+            if key not in self._used:
+                del self._rules[key]
+        self._build_times = dict((key, self._build_times[key])
+                                 for key in self._used)
+        self._modules = dict((key, self._modules[key]) for key in self._used)
+
+    def release(self, grammar):
+        """Detaches the rules of an unloaded grammar, so that they can be added to
+        the grammar created on the next reload.
+        """
+        for rule in grammar.rules:
+            rule._grammar = None
+
+    def report(self):
+        saved = sum(self.time_saved.values())
+        lines = ["Rule cache: %d hits, %d misses; %.1f ms saved, %.1f ms "
+                 "hashing, %.1f ms net" % (
+                     self.hits, self.misses, saved * 1000,
+                     self.hash_time * 1000,
+                     (saved - self.hash_time) * 1000)]
+        for environment in sorted(set(self.time_saved) | set(self.time_spent)):
+            lines.append("  %s: %.1f ms saved, %.1f ms building" % (
+                environment,
+                self.time_saved[environment] * 1000,
+                self.time_spent[environment] * 1000))
+        return "\n".join(lines)
+
+
+# Shared cache, kept alive across reloads of the command modules.
+rule_cache = RuleCache()
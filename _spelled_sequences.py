@@ -0,0 +1,152 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Spelled sequences of letters, numbers and the like, decoded from dictation.
+
+A JoinedRepetition over a DictListRef compiles into one nested optional per
+repetition, so it makes the grammar larger the more characters it allows, and
+caps how many can be spelled at once. SpelledDictation instead captures the
+dictated words and decodes them in Python with a trie over the spoken forms of
+a map, e.g. letters_map. It matches runs of known words of any length, and
+rejects dictation that contains other words.
+
+spelled_sequence() returns a SpelledDictation if enabled, else the
+JoinedRepetition it replaces.
+"""
+
+from dragonfly import (
+    Alternative,
+    Dictation,
+    Empty,
+)
+
+import _dragonfly_utils as utils
+from _dict_lists import dict_lists
+
+enabled = True
+
+
+class SpelledTrie(object):
+    """Trie over the words of the spoken forms of a map, each leading to its
+    written form.
+    """
+
+    def __init__(self, mapping):
+        self._root = {}
+        for (spoken, written) in mapping.items():
+            node = self._root
+            for word in spoken.split():
+                node = node.setdefault(word, {})
+            node[None] = written
+
+    def _parse(self, words):
+        """Returns a map from each position up to which the words are spoken
+        forms, to the start and written form of the last of them.
+        """
+        parsed = {0: None}
+        for start in range(len(words)):
+            if start not in parsed:
+                continue
+            node = self._root
+            for end in range(start + 1, len(words) + 1):
+                node = node.get(words[end - 1])
+                if node is None:
+                    break
+                if None in node and end not in parsed:
+                    parsed[end] = (start, node[None])
+        return parsed
+
+    def ends(self, words):
+        """Returns the positions up to which the words are spoken forms,
+        longest first.
+        """
+        return sorted((end for end in self._parse(_normalize(words)) if end),
+                      reverse=True)
+
+    def spell(self, words, delimiter=""):
+        """Returns the written forms of the words joined with delimiter, or
+        None if they are not all spoken forms.
+        """
+        words = _normalize(words)
+        parsed = self._parse(words)
+        if len(words) not in parsed:
+            return None
+        written = []
+        end = len(words)
+        while end:
+            (end, value) = parsed[end]
+            written.append(value)
+        return delimiter.join(reversed(written))
+
+
+def _normalize(words):
+    """Returns the lowercase written forms of dictated words."""
+    return [word.split("\\")[0].lower() for word in words]
+
+
+# Tries by the content of their map, shared by the elements over the same map.
+_tries = {}
+
+
+def get_trie(mapping):
+    items = frozenset(mapping.items())
+    trie = _tries.get(items)
+    if trie is None:
+        trie = _tries[items] = SpelledTrie(mapping)
+    return trie
+
+
+class SpelledDictation(Dictation):
+    """Dictation of a sequence of spoken forms of mapping, with the written
+    forms joined with delimiter as value.
+    """
+
+    def __init__(self, mapping, delimiter="", name=None, default=None):
+        Dictation.__init__(self, name, default=default)
+        self.trie = get_trie(mapping)
+        self.delimiter = delimiter
+
+    def decode(self, state, position=None):
+        """Yields the states after each run of spoken forms at the start of
+        the dictated words, longest first. The stand-in engine in
+        benchmarks/standin_engine.py passes the words and the position instead
+        of a state.
+        """
+        if position is not None:
+            return self._decode_words(state, position)
+        return self._decode_state(state)
+
+    def _decode_state(self, state):
+        state.decode_attempt(self)
+        count = 0
+        while state.rule(count) == "dgndictation":
+            count += 1
+        words = [state.word(index) for index in range(count)]
+        for end in self.trie.ends(words):
+            state.next(end)
+            state.decode_success(self)
+            yield state
+            state.decode_retry(self)
+        state.decode_failure(self)
+
+    def _decode_words(self, words, position):
+        ends = set(position + end for end in self.trie.ends(words[position:]))
+        for (node, end) in Dictation.decode(self, words, position):
+            if end in ends:
+                yield node, end
+
+    def value(self, node):
+        return self.trie.spell(node.words(), self.delimiter)
+
+
+def spelled_sequence(dict_list, min=1, max=10, delimiter=""):
+    """Returns an element for a sequence of the spoken forms of dict_list, of
+    at least min of them. Unless enabled, at most max - 1 can be spoken.
+    """
+    if not enabled:
+        return utils.JoinedRepetition(delimiter, dict_lists.ref(dict_list),
+                                      min=min, max=max)
+    element = SpelledDictation(dict_list, delimiter)
+    if min == 0:
+        element = Alternative([element, Empty(value="")])
+    return element
@@ -0,0 +1,108 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Inserts long text through the clipboard instead of typing it.
+
+Text is typed one key press per character, each with its own delay, so a long
+phrase took hundreds of key events. From paste_threshold characters on, text of
+FormatAction, TwoCamelAction and, when keystroke batching is enabled, of plain
+Text actions is pasted with PasteText instead: it saves the clipboard, puts
+the text on it, presses ctrl+v and restores the previous contents, see
+_clipboard. Only text can be restored, so while the clipboard holds other
+data, e.g. an image, PasteText types the text instead.
+
+The threshold can be set per environment through the paste_threshold of its
+PacingProfile, see _pacing. Set it to 0 where ctrl+v does not paste, e.g. in
+terminals.
+"""
+
+from dragonfly import (
+    ActionBase,
+    Key,
+    Text,
+)
+
+from _clipboard import clipboard
+from _pacing import pacer
+
+# Set to False to type all text.
+enabled = True
+
+# Length from which text is pasted, unless the active PacingProfile sets one.
+paste_threshold = 80
+
+paste_key = Key("c-v")
+
+
+class InsertionStats(object):
+
+    def __init__(self):
+        self.typed = 0
+        self.typed_characters = 0
+        self.pasted = 0
+        self.pasted_characters = 0
+
+    def record_typed(self, text):
+        self.typed += 1
+        self.typed_characters += len(text)
+
+    def record_pasted(self, text):
+        self.pasted += 1
+        self.pasted_characters += len(text)
+
+    def report(self):
+        return ("Text insertion: %d texts typed (%d characters), %d pasted "
+                "(%d characters)" % (self.typed, self.typed_characters,
+                                     self.pasted, self.pasted_characters))
+
+
+stats = InsertionStats()
+
+
+def should_paste(text):
+    """Returns whether text is long enough to be pasted in the active
+    environment.
+    """
+    threshold = paste_threshold
+    if pacer.profile and pacer.profile.paste_threshold is not None:
+        threshold = pacer.profile.paste_threshold
+    return enabled and 0 < threshold <= len(text)
+
+
+def insertion_action(text, text_action=None):
+    """Returns the action inserting text: PasteText if it is long enough, or
+    else text_action, by default TypeText(text).
+    """
+    if should_paste(text):
+        return PasteText(text)
+    return text_action or TypeText(text)
+
+
+class TypeText(Text):
+    """Types text like Text, and counts it in the stats. When keystroke
+    batching is enabled, its keys are sent and counted by _keystroke_batching
+    instead.
+    """
+
+    def __init__(self, text):
+        Text.__init__(self, text, static=True)
+
+    def _execute_events(self, events):
+        stats.record_typed(self._spec)
+        return Text._execute_events(self, events)
+
+
+class PasteText(ActionBase):
+    """Pastes text through the clipboard and restores the clipboard after."""
+
+    def __init__(self, text):
+        ActionBase.__init__(self)
+        self.text = text
+        self._str = repr(text)
+
+    def _execute(self, data=None):
+        if clipboard.holds_other_data():
+            TypeText(self.text).execute()
+            return
+        clipboard.paste(self.text, paste_key, restore=True)
+        stats.record_pasted(self.text)
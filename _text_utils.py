@@ -7,45 +7,73 @@
 
 import re
 
+# Tokens of preprocessed dictation, in one pass: " a ", " the " and dashes
+# separate words like spaces do, runs of word characters are words, and every
+# other character is a punctuation mark.
+_token_pattern = re.compile(r" a | the |[- ]|(\w+)|(\W)")
+_punctuation_pattern = re.compile(r"\W")
+
+
 def split_dictation(dictation, strip=True):
     """Preprocess dictation to do a better job of word separation. Returns a list of
     words."""
+    return list(iter_dictation(dictation, strip))
 
-    clean_dictation = str(dictation)
 
+def iter_dictation(dictation, strip=True):
+    """Yields the words of split_dictation one by one, for long dictations.
+
+    Without strip, the words are the parts between spaces. With strip, the
+    dictation is made lowercase, apostrophes and a leading "a " or "the " are
+    removed, " a ", " the " and dashes separate words, and every other
+    punctuation mark is a word of its own.
+    """
+    clean_dictation = str(dictation)
     if strip:
-      # Make lowercase.
-      clean_dictation = clean_dictation.lower()
-      # Strip apostrophe and "the ".
-      clean_dictation = re.sub(r"'|^(a |the )", "", clean_dictation)
-      # Convert dashes and " a " into spaces.
-      clean_dictation = re.sub(r"-| a | the ", " ", clean_dictation)
-      # Surround all other punctuation marks with spaces.
-      clean_dictation = re.sub(r"(\W)", r" \1 ", clean_dictation)
-
-    # Convert the input to a list of words and punctuation marks.
-    raw_words = [word for word
-                 in clean_dictation.split(" ")
-                 if len(word) > 0]
+        tokens = _stripped_tokens(clean_dictation.lower())
+    else:
+        tokens = _spaced_tokens(clean_dictation)
 
     # Merge contiguous letters into a single word, and merge words separated by
     # punctuation marks into a single word. This way we can dictate something
     # like "score test case dot start now" and only have the underscores applied
     # at word boundaries, to produce "test_case.start_now".
-    words = []
+    word = None
     previous_letter = False
     previous_punctuation = False
-    punctuation_pattern = r"\W"
-    for word in raw_words:
-        current_punctuation = re.match(punctuation_pattern, word)
-        current_letter = len(word) == 1 and not re.match(punctuation_pattern, word)
-        if len(words) == 0:
-            words.append(word)
+    for (token, current_punctuation) in tokens:
+        current_letter = len(token) == 1 and not current_punctuation
+        if word is None:
+            word = token
+        elif current_punctuation or previous_punctuation \
+                or (current_letter and previous_letter):
+            word += token
         else:
-            if current_punctuation or previous_punctuation or (current_letter and previous_letter):
-                words.append(words.pop() + word)
-            else:
-                words.append(word)
+            yield word
+            word = token
         previous_letter = current_letter
         previous_punctuation = current_punctuation
-    return words
\ No newline at end of file
+    if word is not None:
+        yield word
+
+
+def _stripped_tokens(dictation):
+    """Yields the (token, is punctuation) pairs of lowercase dictation."""
+    # A leading apostrophe is removed instead of the article.
+    if dictation.startswith("a "):
+        dictation = dictation[2:]
+    elif dictation.startswith("the "):
+        dictation = dictation[4:]
+    for match in _token_pattern.finditer(dictation.replace("'", "")):
+        word, punctuation = match.groups()
+        if word:
+            yield word, False
+        elif punctuation:
+            yield punctuation, True
+
+
+def _spaced_tokens(dictation):
+    """Yields the (token, is punctuation) pairs of the parts between spaces."""
+    for token in dictation.split(" "):
+        if token:
+            yield token, bool(_punctuation_pattern.match(token))
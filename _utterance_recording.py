@@ -0,0 +1,65 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Records the utterances recognized by RepeatRule, for replaying them with
+benchmarks/utterance_replay.py.
+
+Each utterance is appended to a JSON-lines file as the environment, the rule
+name, the spoken words and a summary of the extras. The summary names the
+actions and the data bound to them, so that the replay can tell which parse of
+the words was recognized.
+"""
+
+import json
+
+from dragonfly import BoundAction
+
+
+def summarize(value):
+    """Returns a JSON-friendly summary of an extra. Keys starting with an
+    underscore, such as _node, are left out.
+    """
+    if isinstance(value, dict):
+        return dict((key, summarize(item)) for (key, item) in value.items()
+                    if not key.startswith("_"))
+    if isinstance(value, (list, tuple)):
+        return [summarize(item) for item in value]
+    if isinstance(value, BoundAction):
+        return {"action": summarize(value._action),
+                "data": summarize(value._data)}
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return "%s" % value
+
+
+class UtteranceRecorder(object):
+    """Appends the recognized utterances to a file, if a path is set."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.recorded = 0
+        self._file = None
+
+    def record(self, rule, words, extras):
+        if not self.path:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a")
+        utterance = {
+            "environment": getattr(rule, "environment", None),
+            "rule": rule.name,
+            "words": list(words),
+            "extras": summarize(extras),
+        }
+        self._file.write(json.dumps(utterance, sort_keys=True) + "\n")
+        self._file.flush()
+        self.recorded += 1
+
+
+# Shared recorder, kept alive across reloads of the command modules.
+recorder = UtteranceRecorder()
+
+
+def read_utterances(path):
+    with open(path) as utterance_file:
+        return [json.loads(line) for line in utterance_file if line.strip()]
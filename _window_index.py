@@ -0,0 +1,168 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Index of the top-level windows by executable and title, for switching to a
+window directly.
+
+Switching with win+N through the taskbar depends on the order of the pinned
+items, and waits a fixed time after each key. WindowIndex instead keeps the
+open windows, most recently focused first, and activates a window by its
+handle. It is built by enumerating the windows in z-order, which is the order
+they were last focused in. A timer then polls the foreground window and moves
+it to the front. The windows are only enumerated again when no window matches
+a lookup, or when the window found could not be activated, e.g. because it was
+closed.
+
+The windows are enumerated and activated through a platform. DragonflyPlatform
+uses dragonfly's Window, which is the stand-in Window of
+benchmarks/standin_engine.py on Linux.
+"""
+
+import ntpath
+import threading
+import time
+
+from dragonfly import Window
+from dragonfly.timer import Timer
+
+# Titles of windows that are part of the shell rather than applications.
+ignored_titles = frozenset(["Program Manager", "Start"])
+
+
+def executable_name(path):
+    """Returns the lowercase file name of an executable, without extension,
+    e.g. "chrome" for "C:\\Program Files\\Google\\Chrome\\chrome.exe".
+    """
+    return ntpath.splitext(ntpath.basename(path))[0].lower()
+
+
+class DragonflyPlatform(object):
+
+    def windows(self):
+        """Returns the visible top-level windows with a title, in z-order."""
+        return [window for window in Window.get_all_windows()
+                if window.is_visible and window.title
+                and window.title not in ignored_titles]
+
+    def foreground(self):
+        return Window.get_foreground()
+
+    def activate(self, window):
+        """Brings window to the front, and returns whether it is."""
+        if window.is_minimized:
+            window.restore()
+        window.set_foreground()
+        return Window.get_foreground().handle == window.handle
+
+
+class WindowIndex(object):
+
+    def __init__(self, platform=None):
+        self.platform = platform or DragonflyPlatform()
+        # The actions run on the executor thread, and the timer on the engine
+        # thread.
+        self._lock = threading.Lock()
+        # Handle to window, and to the name of its executable.
+        self._windows = {}
+        self._names = {}
+        # Handles, most recently focused first.
+        self._order = []
+        self._foreground = None
+        self._timer = None
+        self.refreshes = 0
+        self.refresh_time = 0.0
+        self.lookups = 0
+        self.activations = 0
+        self.failures = 0
+
+    def start(self, interval=0.1):
+        self.refresh()
+        self._timer = Timer(self.poll, interval)
+
+    def stop(self):
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+
+    def refresh(self):
+        """Enumerates the open windows."""
+        start = time.time()
+        windows = self.platform.windows()
+        with self._lock:
+            # Looking up the executable of a window is the slow part, so the
+            # names of known windows are kept.
+            self._names = dict(
+                (window.handle, self._names.get(window.handle)
+                 or executable_name(window.executable))
+                for window in windows)
+            self._windows = dict((window.handle, window) for window in windows)
+            self._order = [window.handle for window in windows]
+        self.refreshes += 1
+        self.refresh_time += time.time() - start
+
+    def poll(self):
+        """Moves the foreground window to the front, if it changed."""
+        window = self.platform.foreground()
+        if window.handle and window.handle != self._foreground:
+            self._foreground = window.handle
+            self.focused(window)
+
+    def focused(self, window):
+        """Moves window to the front, adding it if it is new."""
+        if not window.title or window.title in ignored_titles:
+            return
+        with self._lock:
+            if window.handle in self._windows:
+                self._order.remove(window.handle)
+            else:
+                self._windows[window.handle] = window
+                self._names[window.handle] = executable_name(window.executable)
+            self._order.insert(0, window.handle)
+
+    def _matches(self, executable, title):
+        executable = executable.lower() if executable else None
+        title = title.lower() if title else None
+        with self._lock:
+            return [self._windows[handle] for handle in self._order
+                    if (executable is None or executable in self._names[handle])
+                    and (title is None
+                         or title in self._windows[handle].title.lower())]
+
+    def find(self, executable=None, title=None, position=0):
+        """Returns the window at position among the windows whose executable
+        name and title contain executable and title, most recently focused
+        first, or None. The windows are enumerated again if there is none.
+        """
+        self.lookups += 1
+        windows = self._matches(executable, title)
+        if len(windows) <= position:
+            self.refresh()
+            windows = self._matches(executable, title)
+        return windows[position] if len(windows) > position else None
+
+    def activate(self, executable=None, title=None, position=0):
+        """Activates the window found by find(), and returns whether it could.
+        If the window cannot be activated, the windows are enumerated again
+        and the lookup is retried once.
+        """
+        for attempt in range(2):
+            window = self.find(executable, title, position)
+            if window is None:
+                return False
+            if self.platform.activate(window):
+                self.activations += 1
+                self.focused(window)
+                return True
+            self.failures += 1
+            self.refresh()
+        return False
+
+    def report(self):
+        return ("Window index: %d windows, %d refreshes in %.1f ms, %d lookups, "
+                "%d activations, %d failures" % (
+                    len(self._order), self.refreshes, self.refresh_time * 1000,
+                    self.lookups, self.activations, self.failures))
+
+
+# Shared index, kept alive across reloads of the command modules.
+window_index = WindowIndex()
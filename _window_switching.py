@@ -6,10 +6,44 @@ import platform
 import _dragonfly_utils as utils
 
 from dragonfly import (
+    ActionBase,
     Key,
     Mimic,
     IntegerRef,
 )
+
+from _window_index import window_index
+
+# Activate the windows directly through window_index. Set to False to switch
+# through the taskbar only.
+direct_activation = True
+
+
+class ActivateWindow(ActionBase):
+    """Activates the window at position among the windows of executable with
+    title in their title, most recently focused first. Executes fallback if
+    there is no such window, e.g. to start the application from the taskbar.
+    With position None, the position is taken from the extra n.
+    """
+
+    def __init__(self, executable=None, title=None, position=0,
+                 fallback=None):
+        super(ActivateWindow, self).__init__()
+        self.executable = executable
+        self.title = title
+        self.position = position
+        self.fallback = fallback
+
+    def _execute(self, data=None):
+        position = self.position
+        if position is None:
+            position = data["n"]
+        if direct_activation and window_index.activate(
+                self.executable, self.title, position):
+            return
+        if self.fallback:
+            self.fallback.execute(data)
+
 # Ordered list of pinned taskbar items. Sublists refer to windows within a specific application.
 windows = [
     "browse",
@@ -26,13 +60,35 @@ windows = [
 outlook_n = "6"
 slack_n = "7"
 
+# Executables of the taskbar items, for activating their windows directly.
+window_executables = {
+    "browse": "chrome",
+    "storm": "webstorm",
+    "code": "devenv",
+    "charm": "pycharm",
+    "source": "sourcetree",
+    "email": "outlook",
+    "slack": "slack",
+    "explore": "explorer",
+    "text": "sublime_text",
+}
+
+
+def activate_action(words, position, taskbar_action):
+    if words not in window_executables:
+        return taskbar_action
+    return ActivateWindow(window_executables[words], position=position,
+                          fallback=taskbar_action)
+
+
 windows_prefix = "go"
 windows_mapping = {}
 for i, window in enumerate(windows):
     if isinstance(window, str):
         window = [window]
     for j, words in enumerate(window):
-        windows_mapping[windows_prefix + " " + words] = Key("win:down, %d:%d/10, win:up" % (i + 1, j + 1))
+        windows_mapping[windows_prefix + " " + words] = activate_action(
+            words, 0, Key("win:down, %d:%d/10, win:up" % (i + 1, j + 1)))
 
 windows_prefix_second = "go to"
 windows_mapping_second = {}
@@ -40,15 +96,19 @@ for i, window in enumerate(windows):
     if isinstance(window, str):
         window = [window]
     for j, words in enumerate(window):
-        windows_mapping_second[windows_prefix_second + " " + words] = Key(
-            "win:down, %d:%d/10, %d:%d/10, win:up" % (i + 1, j + 1, i + 1, j + 1))
+        windows_mapping_second[windows_prefix_second + " " + words] = activate_action(
+            words, 1, Key("win:down, %d:%d/10, %d:%d/10, win:up"
+                          % (i + 1, j + 1, i + 1, j + 1)))
 
 
 # Work around security restrictions in Windows 8.
 if platform.release() == "8":
-    swap_action = Mimic("press", "alt", "tab")
+    swap_keys = Mimic("press", "alt", "tab")
 else:
-    swap_action = Key("alt:down, tab:%(n)d/25, alt:up")
+    swap_keys = Key("alt:down, tab:%(n)d/25, alt:up")
+
+# Swapping to the n-th most recently focused window, like alt+tab.
+swap_action = ActivateWindow(position=None, fallback=swap_keys)
 
 final_action_map = utils.combine_maps(windows_mapping, windows_mapping_second, {
     "swap [<n>]":   swap_action,
@@ -0,0 +1,46 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Client of the word list server in _word_list_server, for editor plugins.
+
+It only needs the Python standard library:
+    client = WordListClient()
+    client.replace_words("context_word_list", ["getUserName\\get user name"])
+    client.add_words("prefix_list", ["max"])
+"""
+
+try:
+    from xmlrpclib import ServerProxy
+except ImportError:
+    from xmlrpc.client import ServerProxy
+
+default_port = 8765
+
+
+class WordListClient(object):
+
+    def __init__(self, port=default_port):
+        self._proxy = ServerProxy("http://127.0.0.1:%d" % port,
+                                  allow_none=True)
+
+    def list_names(self):
+        return self._proxy.list_names()
+
+    def replace_words(self, name, words):
+        """Replaces the words this and other plugins gave a list, and returns
+        how many there will be. Words from other sources, such as the
+        identifier index, stay in the list.
+        """
+        return self._proxy.replace_words(name, list(words))
+
+    def add_words(self, name, words):
+        return self._proxy.add_words(name, list(words))
+
+    def remove_words(self, name, words):
+        return self._proxy.remove_words(name, list(words))
+
+    def get_words(self, name):
+        """Returns the words plugins gave a list, including updates not yet
+        applied.
+        """
+        return self._proxy.get_words(name)
@@ -0,0 +1,160 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Local XML-RPC server for editor plugins to update word lists.
+
+Plugins call the server, e.g. through _word_list_client, to replace, add or
+remove their words of a list such as context_word_list. The words of the
+other sources of the list, see _word_lists, are kept. Dragon recompiles a list
+on every List.set, so the server only records the new words. A timer on the
+engine thread sets each changed list once no update came for debounce seconds,
+or at the latest max_delay seconds after the first pending update. Rapid
+updates are thereby coalesced into one List.set.
+
+The server only listens on localhost.
+"""
+
+import socket
+import threading
+import time
+
+try:
+    from SimpleXMLRPCServer import SimpleXMLRPCServer
+except ImportError:
+    from xmlrpc.server import SimpleXMLRPCServer
+
+from dragonfly.timer import Timer
+
+default_port = 8765
+
+
+class WordListUpdater(object):
+    """Pending updates of the plugin words of named lists, applied by flush()
+    on the engine thread. lists holds the WordListSources of the lists.
+    """
+
+    def __init__(self, lists, debounce=0.3, max_delay=2.0):
+        self.lists = dict((word_list.name, word_list) for word_list in lists)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.requests = 0
+        self.updates = 0
+        self._lock = threading.Lock()
+        # List name to (new words, time of first update, time of last update).
+        self._pending = {}
+
+    def _update(self, name, change):
+        if name not in self.lists:
+            raise ValueError("Unknown list: %s" % name)
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            if name in self._pending:
+                words, first, last = self._pending[name]
+            else:
+                words, first = self.lists[name].get("plugins"), now
+            words = change(words)
+            self._pending[name] = (words, first, now)
+        return len(words)
+
+    def replace(self, name, words):
+        """Replaces the plugin words of a list, and returns how many there
+        will be.
+        """
+        return self._update(name, lambda old: _unique(words))
+
+    def add(self, name, words):
+        return self._update(name, lambda old: _unique(old + list(words)))
+
+    def remove(self, name, words):
+        removed = set(words)
+        return self._update(name, lambda old: [word for word in old
+                                               if word not in removed])
+
+    def get(self, name):
+        """Returns the plugin words of a list, including pending updates."""
+        with self._lock:
+            if name in self._pending:
+                return list(self._pending[name][0])
+        return self.lists[name].get("plugins")
+
+    def flush(self, force=False):
+        """Sets the lists whose updates are due, or all pending ones with
+        force.
+        """
+        now = time.time()
+        with self._lock:
+            due = [(name, words) for (name, (words, first, last))
+                   in self._pending.items()
+                   if force or now - last >= self.debounce
+                   or now - first >= self.max_delay]
+            for (name, words) in due:
+                del self._pending[name]
+        for (name, words) in due:
+            if self.lists[name].set("plugins", words):
+                self.updates += 1
+
+    def report(self):
+        return ("Word list server: %d requests, %d list updates" % (
+            self.requests, self.updates))
+
+
+def _unique(words):
+    seen = set()
+    return [word for word in words
+            if not (word in seen or seen.add(word))]
+
+
+class _XMLRPCServer(SimpleXMLRPCServer):
+
+    # Plugins of several editors may connect at once, and a refused connection
+    # is only retried after a second.
+    request_queue_size = 32
+
+
+class WordListServer(object):
+    """Serves the updater over XML-RPC on a thread of its own, and flushes it
+    on an engine timer.
+    """
+
+    def __init__(self, updater, port=default_port, interval=0.1):
+        self.updater = updater
+        self.port = port
+        self.interval = interval
+        self._server = None
+        self._thread = None
+        self._timer = None
+
+    def start(self):
+        """Starts serving, and returns whether the port could be bound."""
+        try:
+            self._server = _XMLRPCServer(("127.0.0.1", self.port),
+                                         logRequests=False, allow_none=True)
+        except socket.error as e:
+            print("Word list server could not listen on port %d: %s"
+                  % (self.port, e))
+            return False
+        # With port 0, the system picks a free port.
+        self.port = self._server.server_address[1]
+        for name in ("replace", "add", "remove", "get"):
+            self._server.register_function(getattr(self.updater, name),
+                                           name + "_words")
+        self._server.register_function(lambda: sorted(self.updater.lists),
+                                       "list_names")
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="WordListServer")
+        self._thread.daemon = True
+        self._thread.start()
+        self._timer = Timer(self.updater.flush, self.interval)
+        return True
+
+    def stop(self):
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+        self.updater.flush(force=True)
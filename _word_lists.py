@@ -0,0 +1,67 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Word lists of _commands.py that are kept alive across its reloads.
+
+GrammarReloader keeps the grammar and the unchanged rules of the previous
+import of _commands.py, see _incremental_reload, and the rules keep referring
+to the lists they were built with. The lists are therefore created here rather
+than in _commands.py, so that the rules of every import, the identifier index
+and the word list server all update the same List objects.
+
+The words of a list come from several sources: the configuration in
+_commands.py, the identifier index and editor plugins through the word list
+server. WordListSources keeps the words of each source and sets the list to
+their union, so that one source does not overwrite the words of another.
+"""
+
+from dragonfly import List
+
+# Sources of words, in the order their words appear in the lists.
+sources = ("config", "index", "plugins")
+
+
+class WordListSources(object):
+    """Sets word_list to the union of the words of its sources. Dragon
+    recompiles a list on every List.set, so the list is only set when the
+    union changed.
+    """
+
+    def __init__(self, word_list):
+        self.word_list = word_list
+        self._words = dict((source, []) for source in sources)
+
+    name = property(lambda self: self.word_list.name)
+
+    def get(self, source):
+        """Returns the words of a source."""
+        return list(self._words[source])
+
+    def set(self, source, words):
+        """Replaces the words of a source, and returns whether the list
+        changed.
+        """
+        self._words[source] = list(words)
+        union = []
+        seen = set()
+        for name in sources:
+            for word in self._words[name]:
+                if word not in seen:
+                    seen.add(word)
+                    union.append(word)
+        if union == list(self.word_list):
+            return False
+        self.word_list.set(union)
+        return True
+
+
+# Identifiers of the current project, see _identifier_index and
+# _word_list_server.
+context_word_list = List("context_word_list", [])
+context_words = WordListSources(context_word_list)
+
+# Words that can be dictated before and after formatted text.
+prefix_list = List("prefix_list", [])
+prefix_words = WordListSources(prefix_list)
+suffix_list = List("suffix_list", [])
+suffix_words = WordListSources(suffix_list)
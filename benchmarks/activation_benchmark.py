@@ -0,0 +1,157 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Compares the ways of activating the environment rules, end to end.
+
+Imports _commands.py against the stand-in engine in standin_engine in three
+modes:
+- exclusive contexts: the environment tree is installed into a plain Grammar
+  with exclusive contexts, as _commands.py did before _environment_resolver,
+  so every rule context is evaluated at the start of each utterance,
+- per utterance: ResolverGrammar resolves the foreground window at the start
+  of each utterance,
+- on focus change: FocusActivator also switches the rules between utterances.
+Then it switches between application windows and speaks an utterance in each.
+It reports the median time from the start of an utterance until its keys are
+sent, the rule activations and deactivations sent to the engine, and the time the
+focus timer spends between utterances. It checks that all modes send the same
+keys.
+
+Run it from the directory above this one:
+    python benchmarks/activation_benchmark.py
+"""
+
+import sys
+import time
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import standin_engine
+from standin_engine import Window
+from startup_benchmark import _purge_modules
+
+# Windows of the environments, and the utterance spoken in each.
+windows = [
+    ("C:\\Program Files\\Google\\Chrome\\chrome.exe",
+     "Inbox - Google Chrome", "up three left two"),
+    ("C:\\Program Files\\Microsoft Visual Studio\\devenv.exe",
+     "Solution - Microsoft Visual Studio", "race"),
+    ("C:\\Program Files\\JetBrains\\WebStorm\\bin\\WebStorm64.exe",
+     "project - WebStorm", "left four up one"),
+    ("C:\\Users\\me\\AppData\\Local\\slack\\slack.exe",
+     "Slack - team", "race"),
+    ("C:\\Windows\\explorer.exe", "Downloads", "up two"),
+    ("C:\\Windows\\System32\\cmd.exe", "Command Prompt", "left three"),
+    ("C:\\Program Files\\Microsoft Office\\OUTLOOK.EXE",
+     "Inbox - Outlook", "up one race"),
+    ("C:\\Program Files\\Sublime Text\\sublime_text.exe",
+     "notes.txt - Sublime Text", "left one"),
+]
+
+modes = ["exclusive contexts", "per utterance", "on focus change"]
+
+
+def _load_exclusive(reloader):
+    """Returns a replacement for reloader.load() that installs the environment
+    tree like _commands.py did before ResolverGrammar.
+    """
+    def load(create_grammar, root, cache, check=None):
+        grammar = standin_engine.Grammar("repeat")
+        interner = root.install(grammar)
+        grammar.load()
+        reloader.grammar = grammar
+        return interner
+    return load
+
+
+def load_commands(mode):
+    """Imports _commands.py fresh in the given mode, and returns it."""
+    _purge_modules()
+    standin_engine.reset()
+    import _incremental_reload
+    reloader = _incremental_reload.grammar_reloader
+    if mode == "exclusive contexts":
+        reloader.load = _load_exclusive(reloader)
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        import _commands
+    finally:
+        sys.stdout = stdout
+    _commands.word_list_server.stop()
+    if mode == "on focus change":
+        # Switch as soon as the window is polled twice.
+        _commands.activator.debounce = 0
+    else:
+        _commands.activator.stop()
+    return _commands
+
+
+def run(mode, rounds):
+    """Speaks the utterances in their windows, and returns the keys sent, the
+    median time per utterance, the activations per utterance, and the timer
+    time per window switch. The first round warms up and is not counted.
+    """
+    commands = load_commands(mode)
+    from _action_executor import executor
+    from _pacing import pacer
+    backend = standin_engine.backend
+    pacer.sleep = backend.sleep
+    engine = standin_engine.get_engine()
+    opened = [Window.open(executable, title, handle + 1)
+              for (handle, (executable, title, words))
+              in enumerate(windows)]
+    keys = []
+    times = []
+    timers = 0.0
+    activations = 0
+    try:
+        for round in range(rounds + 1):
+            for (window, (executable, title, words)) in zip(opened, windows):
+                window.set_foreground()
+                start = time.time()
+                engine.run_timers()
+                engine.run_timers()
+                timers += time.time() - start
+                backend.reset()
+                before = engine.activations
+                start = time.time()
+                engine.mimic(words)
+                executor.wait()
+                if round == 0:
+                    timers = 0.0
+                    continue
+                times.append(time.time() - start)
+                activations += engine.activations - before
+                keys.append(backend.typed())
+    finally:
+        executor.stop()
+    count = rounds * len(windows)
+    return (keys, sorted(times)[count // 2], float(activations) / count,
+            timers / count)
+
+
+def main():
+    standin_engine.install()
+    rounds = 50
+    print("%-20s %14s %14s %14s" % ("Mode", "utterance", "activations",
+                                     "focus timer"))
+    results = []
+    for mode in modes:
+        (keys, elapsed, activations, timers) = run(mode, rounds)
+        results.append(keys)
+        print("%-20s %11.2f ms %14.1f %11.2f ms" % (
+            mode, elapsed * 1000, activations, timers * 1000))
+    failures = 0
+    for (mode, keys) in zip(modes[1:], results[1:]):
+        if keys != results[0]:
+            print("%s sends different keys than %s" % (mode, modes[0]))
+            failures += 1
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
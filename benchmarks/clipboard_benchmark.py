@@ -0,0 +1,132 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Benchmarks the clipboard service in _clipboard without Windows.
+
+Measures get_text, set_text and paste, with and without restoring the previous
+text, against the in-memory backend. Then simulates another application
+holding the clipboard for a number of open attempts, and reports the retries
+and the simulated time waited. Finally it executes the actions of _commands.py
+that paste through the clipboard against the stand-in engine in
+standin_engine, and checks what they pasted and that they left it on the
+clipboard.
+
+Run it from the directory above this one:
+    python benchmarks/clipboard_benchmark.py
+"""
+
+import sys
+import timeit
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import standin_engine
+
+
+class _NoAction(object):
+
+    def execute(self, data=None):
+        pass
+
+
+class _Clock(object):
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def sleep(self, seconds):
+        self.elapsed += seconds
+
+
+def _time(function, number=20000):
+    """Returns the best time per call in microseconds."""
+    return min(timeit.repeat(function, repeat=5, number=number)) * 1e6 / number
+
+
+def measure_operations():
+    from _clipboard import ClipboardService, MemoryBackend
+    service = ClipboardService(MemoryBackend(u"previous"))
+    service.sleep = _Clock().sleep
+    action = _NoAction()
+    print("%-32s %8.2f us" % ("get_text", _time(service.get_text)))
+    print("%-32s %8.2f us" % ("set_text",
+                              _time(lambda: service.set_text(u"text"))))
+    print("%-32s %8.2f us" % ("paste", _time(
+        lambda: service.paste(u"text", action, restore=False))))
+    print("%-32s %8.2f us" % ("paste and restore", _time(
+        lambda: service.paste(u"text", action, restore=True))))
+
+
+def measure_contention():
+    from _clipboard import ClipboardError, ClipboardService, MemoryBackend
+    print("")
+    print("%-32s %8s %12s %8s" % ("Busy open attempts", "retries", "waited",
+                                  "result"))
+    for busy in [0, 1, 2, 4, 6, 8]:
+        backend = MemoryBackend()
+        backend.busy = busy
+        service = ClipboardService(backend)
+        clock = _Clock()
+        service.sleep = clock.sleep
+        try:
+            service.set_text(u"text")
+            result = "set"
+        except ClipboardError:
+            result = "failed"
+        print("%-32d %8d %9.0f ms %8s" % (busy, service.stats.retries,
+                                          clock.elapsed * 1000, result))
+
+
+def check_actions():
+    """Returns the number of actions that did not paste the expected text or
+    did not leave it on the clipboard.
+    """
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        import _commands
+    finally:
+        sys.stdout = stdout
+    from _action_executor import executor
+    from _clipboard import clipboard
+    backend = standin_engine.backend
+    clipboard.sleep = backend.sleep
+    actions = [
+        ("ToDir", _commands.ToDir("C:\\Users"), {}, u"C:\\Users"),
+        ("ToDir, run explorer", _commands.ToDir("C:\\Users", True), {},
+         u"explorer.exe C:\\Users"),
+        ("CommandWindow", _commands.CommandWindow("C:\\"), {},
+         u"cmd /K \"cd C:\\\""),
+        ("OpenWebsite", _commands.OpenWebsite("https://example.com"), {},
+         u"https://example.com"),
+        ("PasteEmoji", _commands.PasteEmoji(), {"emoji": ":) "}, u" :) "),
+    ]
+    print("")
+    failures = 0
+    for (name, action, data, expected) in actions:
+        backend.reset()
+        backend.clipboard = u"previous"
+        action.execute(data)
+        ok = backend.pasted == [expected] and backend.clipboard == expected
+        print("%-32s %s" % (name, "ok" if ok else "FAILED: pasted %r, left %r"
+                            % (backend.pasted, backend.clipboard)))
+        if not ok:
+            failures += 1
+    print(clipboard.stats.report())
+    executor.stop()
+    return failures
+
+
+def main():
+    # The shared service uses win32clipboard, if it can be imported.
+    standin_engine.install()
+    measure_operations()
+    measure_contention()
+    return check_actions()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Compares split_dictation in _text_utils with the implementation it replaced.
+
+The previous implementation is kept below as the reference. For every
+dictation of the corpus, and for random dictations built from the characters
+that the preprocessing treats specially, this checks that both return the same
+words, with and without strip. It then reports the time per dictation of both,
+and of iterating over the words of iter_dictation.
+
+Run it from the directory above this one, optionally with a file of
+dictations, one per line:
+    python benchmarks/dictation_benchmark.py [dictations.txt]
+"""
+
+import os.path
+import random
+import re
+import sys
+import timeit
+
+# The command modules are in the directory above this one.
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _text_utils import (
+    iter_dictation,
+    split_dictation,
+)
+
+# Dictations as Dragon delivers them to FormatAction and TextAction.
+corpus = [
+    "test case",
+    "the test case",
+    "a quick fix",
+    "score test case dot start now",
+    "get user name",
+    "is empty",
+    "max value",
+    "I'd like a cup of tea",
+    "don't stop",
+    "self dot assert equal",
+    "read-only file",
+    "end-to-end test",
+    "HTTP request handler",
+    "parse URL",
+    "x y z",
+    "a b c d",
+    "foo (bar)",
+    "user's name",
+    "set the value of the field",
+    "create a new instance",
+    "the the the",
+    "a a a",
+    "number 42",
+    "version 2.7.18",
+    "path/to/file.txt",
+    "email me at example@example.com",
+    "hello, world!",
+    "snake_case_name",
+    "CamelCaseName",
+    "  extra   spaces  ",
+    "tab\tseparated",
+    "why not?",
+    "it costs $5",
+    "100% done",
+    "one-liner",
+    "the 'quoted' word",
+    "list of a few items",
+    "J. R. R. Tolkien",
+    "e.g. this",
+    "let me know what you think about the new design of the release pipeline",
+]
+
+
+def split_dictation_reference(dictation, strip=True):
+    """The implementation of split_dictation before the single pass tokenizer,
+    kept to check that the output did not change.
+    """
+
+    clean_dictation = str(dictation)
+
+    if strip:
+      # Make lowercase.
+      clean_dictation = clean_dictation.lower()
+      # Strip apostrophe and "the ".
+      clean_dictation = re.sub(r"'|^(a |the )", "", clean_dictation)
+      # Convert dashes and " a " into spaces.
+      clean_dictation = re.sub(r"-| a | the ", " ", clean_dictation)
+      # Surround all other punctuation marks with spaces.
+      clean_dictation = re.sub(r"(\W)", r" \1 ", clean_dictation)
+
+    # Convert the input to a list of words and punctuation marks.
+    raw_words = [word for word
+                 in clean_dictation.split(" ")
+                 if len(word) > 0]
+
+    words = []
+    previous_letter = False
+    previous_punctuation = False
+    punctuation_pattern = r"\W"
+    for word in raw_words:
+        current_punctuation = re.match(punctuation_pattern, word)
+        current_letter = len(word) == 1 and not re.match(punctuation_pattern, word)
+        if len(words) == 0:
+            words.append(word)
+        else:
+            if current_punctuation or previous_punctuation or (current_letter and previous_letter):
+                words.append(words.pop() + word)
+            else:
+                words.append(word)
+        previous_letter = current_letter
+        previous_punctuation = current_punctuation
+    return words
+
+
+def random_dictations(count, seed=0):
+    """Returns dictations of the words and characters that the preprocessing
+    treats specially.
+    """
+    parts = ["a", "the", "A", "The", "x", "word", "42", "_", " ", "  ", "-",
+             "'", ".", ",", "(", ")", "\t", "!", "ab'c", "a-b", "the-a"]
+    generator = random.Random(seed)
+    return ["".join(generator.choice(parts) + generator.choice(["", " "])
+                    for _ in range(generator.randint(0, 8)))
+            for _ in range(count)]
+
+
+def check(dictations):
+    """Returns the dictations for which the tokenizers differ, and prints
+    them.
+    """
+    different = []
+    for dictation in dictations:
+        for strip in (True, False):
+            expected = split_dictation_reference(dictation, strip)
+            if split_dictation(dictation, strip) != expected \
+                    or list(iter_dictation(dictation, strip)) != expected:
+                different.append(dictation)
+                print("Different words for %r, strip=%s: %r instead of %r" % (
+                    dictation, strip, split_dictation(dictation, strip),
+                    expected))
+    return different
+
+
+def _time(function, dictations, repeat=5):
+    """Returns the best time per dictation in microseconds."""
+    def run():
+        for dictation in dictations:
+            function(dictation)
+    number = max(1, 20000 // max(len(dictations), 1))
+    best = min(timeit.repeat(run, repeat=repeat, number=number))
+    return best * 1e6 / (number * len(dictations))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    dictations = list(corpus)
+    if argv:
+        with open(argv[0]) as dictation_file:
+            dictations = [line.rstrip("\n") for line in dictation_file
+                          if line.strip()]
+    different = check(dictations + random_dictations(5000))
+    print("%d dictations checked, %d different" % (len(dictations) + 5000,
+                                                   len(different)))
+    reference = _time(split_dictation_reference, dictations)
+    single_pass = _time(split_dictation, dictations)
+    streaming = _time(lambda dictation: [word for word
+                                         in iter_dictation(dictation)],
+                      dictations)
+    print("%-24s %8.2f us per dictation" % ("reference", reference))
+    print("%-24s %8.2f us per dictation (%.1fx)" % (
+        "split_dictation", single_pass, reference / single_pass))
+    print("%-24s %8.2f us per dictation (%.1fx)" % (
+        "iter_dictation", streaming, reference / streaming))
+    return len(different)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Compares the ways of executing recognized utterances.
+
+Runs utterances of the Global environment through RepeatRule against the
+stand-in engine in standin_engine, once with the actions executed one by one
+and once with keystroke batching, see _keystroke_batching. For each utterance
+it checks that both send the same keys, and reports the number of send calls
+and the simulated time spent in pauses. It then reports the key events and
+time saved by the peephole optimizer in _keystroke_peephole, merging runs of
+arrow keys, and also cancelling opposite ones. Finally it checks that an
+utterance run on the engine thread does not block recognition while a long
+macro runs ahead of it, so that "stop" still cancels both, and that keys sent
+by another thread while an action is captured are sent, not captured. It
+also checks that a pacing profile only scales the short delays between keys,
+and that calibrating keeps its pauses after specific action types.
+
+Run it from the directory above this one:
+    python benchmarks/execution_benchmark.py
+"""
+
+import sys
+import time
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import standin_engine
+
+# Utterances as lists of (command spec, extras) spoken in one go. The last entry
+# may be a terminal command.
+utterances = [
+    [("up [<n>]", {"n": 3}), ("sword [<n>]", {"n": 2}), ("crash [<n>]", {"n": 1}),
+     ("tell <text>", {"text": "foo"})],
+    [("mark line", {}), ("chop [<n>]", {"n": 1})],
+    [("race", {}), ("tick [<n>]", {"n": 2}), ("scream <text>", {"text": "hello world"})],
+    [("fish", {}), ("left [<n>]", {"n": 4})],
+    [("left [<n>]", {"n": 5}), ("right [<n>]", {"n": 2}), ("up [<n>]", {"n": 3}),
+     ("down [<n>]", {"n": 3})],
+    [("mark right [<n>]", {"n": 2}), ("left [<n>]", {"n": 1}),
+     ("right [<n>]", {"n": 1}), ("crash [<n>]", {"n": 1})],
+    [("down [<n>]", {"n": 2}), ("down [<n>]", {"n": 1}), ("left [<n>]", {"n": 1})],
+]
+
+
+def _import_commands():
+    standin_engine.install()
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        import _commands
+    finally:
+        sys.stdout = stdout
+    return _commands
+
+
+def utterance_extras(commands, utterance):
+    """Returns the extras RepeatRule receives for the given utterance of the
+    Global environment.
+    """
+    environment = commands.global_environment
+    sequence = []
+    terminal_command = None
+    for (spec, data) in utterance:
+        if spec in environment.action_map:
+            sequence.append(environment.action_map[spec].copy_bind(data))
+        else:
+            terminal_command = \
+                environment.terminal_action_map[spec].copy_bind(data)
+    return {
+        "sequence": sequence,
+        "nested_repetitions": None,
+        "terminal_command": terminal_command,
+        "final_command": None,
+    }
+
+
+def run(rule, extras):
+    """Executes the extras with rule and returns what the backend recorded."""
+    from _action_executor import executor
+    from _pacing import pacer
+    backend = standin_engine.backend
+    backend.reset()
+    sleep = pacer.sleep
+    pacer.sleep = backend.sleep
+    try:
+        rule._process_recognition(None, extras)
+        executor.wait()
+    finally:
+        pacer.sleep = sleep
+    return list(backend.key_events), backend.sends, backend.elapsed
+
+
+def check_deferred():
+    """Queues a long macro and then an utterance that must run on the engine
+    thread, and returns the number of failures: recognition is blocked, the
+    utterance runs on another thread or out of order, or "stop" does not drop
+    it.
+    """
+    import threading
+    from _action_executor import executor
+    failures = 0
+    ran = []
+    macro = threading.Event()
+    executor.submit(macro.wait)
+    start = time.time()
+    executor.run(lambda: ran.append(threading.current_thread()))
+    blocked = time.time() - start
+    if ran or blocked > 0.1:
+        print("engine utterance: FAILED, recognition blocked for %.0f ms"
+              % (blocked * 1000))
+        failures += 1
+    macro.set()
+    executor.wait()
+    if ran != [threading.current_thread()]:
+        print("engine utterance: FAILED, not run on the engine thread")
+        failures += 1
+    del ran[:]
+    macro.clear()
+    executor.submit(macro.wait)
+    executor.run(lambda: ran.append(threading.current_thread()))
+    # Speaking "stop" while the macro runs.
+    executor.cancel()
+    macro.set()
+    executor.wait()
+    if ran:
+        print("stop: FAILED, the engine utterance still ran")
+        failures += 1
+    print("engine utterance behind a macro: %s" % (
+        "FAILED" if failures else "ok"))
+    return failures
+
+
+def check_capture():
+    """Compiles a batchable action while another thread sends keys, and
+    returns 1 if keys of one end up with the other, else 0.
+    """
+    import threading
+    from dragonfly import ActionBase, Key
+    import _keystroke_batching
+    backend = standin_engine.backend
+    backend.reset()
+    sending = threading.Event()
+    sent = threading.Event()
+
+    class Captured(ActionBase):
+        batchable = True
+
+        def _execute(self, data=None):
+            Key("a").execute()
+            sending.set()
+            sent.wait()
+            Key("b").execute()
+
+    def send():
+        sending.wait()
+        Key("x").execute()
+        sent.set()
+
+    thread = threading.Thread(target=send)
+    thread.start()
+    steps = _keystroke_batching.compile_actions([(Captured(), 0, None)])
+    thread.join()
+    captured = [event[0] for step in steps for event in step if event[1]]
+    failed = backend.typed() != ["x"] or len(captured) != 2
+    print("capture next to another thread: %s" % (
+        "FAILED" if failed else "ok"))
+    return 1 if failed else 0
+
+
+def check_pacing():
+    """Returns the number of failures: a key delay scale of 0 removes a wait
+    for the application, keeps a delay between keys, or calibration drops
+    after_type.
+    """
+    from dragonfly import Key
+    from _pacing import Calibrator, pacer
+    profile = pacer.get("check")
+    profile.key_delay_scale = 0.0
+    profile.after_type = {"Text": 0.0}
+    failures = 0
+    pacer.begin("check")
+    try:
+        delays = [timeout for (key, down, timeout)
+                  in pacer.scale_events(Key("end/5, enter/100")._events)]
+    finally:
+        pacer.end()
+    if delays[1] != 0.0 or delays[-1] != 1.0:
+        print("pacing: FAILED, delays %r" % delays)
+        failures += 1
+    path, pacer.path = pacer.path, None
+    try:
+        Calibrator("check", read_back=lambda: Calibrator.sample).calibrate()
+    finally:
+        pacer.path = path
+    if profile.after_type != {"Text": 0.0}:
+        print("calibration: FAILED, after_type is %r" % profile.after_type)
+        failures += 1
+    del pacer.profiles["check"]
+    print("pacing of key delays and calibration: %s" % (
+        "FAILED" if failures else "ok"))
+    return failures
+
+
+def _words(utterance):
+    return " ".join(spec.split(" [")[0].split(" <")[0]
+                    for (spec, data) in utterance)
+
+
+def main():
+    commands = _import_commands()
+    import _keystroke_batching
+    import _keystroke_peephole
+    rule = commands.global_environment.rule
+    failures = 0
+    _keystroke_peephole.enabled = False
+    print("%-60s %14s %14s" % ("Utterance", "sequential", "batched"))
+    for utterance in utterances:
+        extras = utterance_extras(commands, utterance)
+        _keystroke_batching.enabled = False
+        events, sends, elapsed = run(rule, extras)
+        _keystroke_batching.enabled = True
+        batched_events, batched_sends, batched_elapsed = run(rule, extras)
+        print("%-60s %3d sends %3.0f ms %3d sends %3.0f ms%s" % (
+            _words(utterance), sends, elapsed * 1000, batched_sends, batched_elapsed * 1000,
+            "" if events == batched_events else "  DIFFERENT KEYS"))
+        if events != batched_events:
+            failures += 1
+    print(_keystroke_batching.stats.report())
+    print("")
+    print("%-60s %14s %14s %14s" % ("Utterance", "batched", "merged",
+                                     "cancelled"))
+    for utterance in utterances:
+        extras = utterance_extras(commands, utterance)
+        results = []
+        for (enabled, cancel) in [(False, False), (True, False), (True, True)]:
+            _keystroke_peephole.enabled = enabled
+            _keystroke_peephole.cancel_opposites = cancel
+            events, sends, elapsed = run(rule, extras)
+            results.append("%3d keys %3.0f ms" % (len(events), elapsed * 1000))
+        print("%-60s %s" % (_words(utterance), " ".join(results)))
+    _keystroke_peephole.cancel_opposites = False
+    print(_keystroke_peephole.stats.report())
+    print("")
+    failures += check_deferred()
+    failures += check_capture()
+    failures += check_pacing()
+    from _action_executor import executor
+    executor.stop()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Compares typing text with pasting it through the clipboard.
+
+Inserts texts of increasing length with a Text action and with a TextAction,
+through _keystroke_batching against the stand-in engine in standin_engine,
+once typed and once pasted, see _text_insertion. For each it reports the key
+events, send calls and simulated time, and checks that the text arrived,
+that the previous clipboard contents were restored and that each insertion was
+counted once. Finally it checks that text is typed rather than pasted while the
+clipboard holds an image, which would not be restored.
+
+Run it from the directory above this one:
+    python benchmarks/paste_benchmark.py
+"""
+
+import sys
+
+import standin_engine
+
+lengths = [10, 40, 80, 200, 500]
+
+sample = "the quick brown fox jumps over the lazy dog "
+
+previous_clipboard = u"previous clipboard"
+
+# Clipboard format of a bitmap.
+CF_BITMAP = 2
+
+
+def insert(action, data, paste, other_data=None):
+    """Inserts with the given action, typed or pasted, and returns the backend
+    with what it recorded. other_data is put on the clipboard as a bitmap.
+    """
+    import _text_insertion
+    from _clipboard import clipboard
+    from _keystroke_batching import execute_actions
+    from _pacing import pacer
+    backend = standin_engine.backend
+    backend.reset()
+    backend.clipboard = previous_clipboard
+    if other_data is not None:
+        backend.clipboard_other[CF_BITMAP] = other_data
+    _text_insertion.enabled = paste
+    sleeps = pacer.sleep, clipboard.sleep
+    pacer.sleep = clipboard.sleep = backend.sleep
+    pacer.begin("default")
+    try:
+        execute_actions([(action.copy_bind(data), 0, None)])
+    finally:
+        pacer.end()
+        pacer.sleep, clipboard.sleep = sleeps
+    return backend
+
+
+def main():
+    standin_engine.install()
+    from dragonfly import Text
+    from _format_text_actions import TextAction
+    import _text_insertion
+    failures = 0
+    print("%-24s %25s %25s" % ("Insertion", "typed", "pasted"))
+    for length in lengths:
+        text = (sample * (length // len(sample) + 1))[:length]
+        # TextAction joins the words with single spaces.
+        for (name, action, data, expected) in [
+                ("Text", Text(text), {}, text),
+                ("TextAction", TextAction(), {"text": text},
+                 " ".join(text.split()))]:
+            stats = _text_insertion.stats
+            counted = stats.typed + stats.pasted
+            typed = insert(action, data, False)
+            typed_result = ("".join(typed.typed()), typed.key_events[:],
+                            typed.sends, typed.elapsed)
+            pasted = insert(action, data, True)
+            counted = stats.typed + stats.pasted - counted
+            if len(expected) < _text_insertion.paste_threshold:
+                pasted_ok = pasted.key_events == typed_result[1]
+            else:
+                pasted_ok = pasted.pasted == [expected] \
+                    and pasted.clipboard == previous_clipboard
+            ok = pasted_ok and typed_result[0] == expected and counted == 2
+            print("%-24s %4d keys %2d sends %5.0f ms %4d keys %2d sends %5.0f ms%s"
+                  % ("%s, %d chars" % (name, length),
+                     len(typed_result[1]), typed_result[2],
+                     typed_result[3] * 1000, len(pasted.key_events),
+                     pasted.sends, pasted.elapsed * 1000,
+                     "" if ok else "  FAILED"))
+            if not ok:
+                failures += 1
+    text = sample * 4
+    backend = insert(Text(text), {}, True, other_data="image")
+    ok = "".join(backend.typed()) == text and backend.pasted == [] \
+        and backend.clipboard_other == {CF_BITMAP: "image"}
+    print("%-24s %s" % ("Image on the clipboard", "typed" if ok else "FAILED"))
+    if not ok:
+        failures += 1
+    print(_text_insertion.stats.report())
+    _text_insertion.enabled = True
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Benchmark of the spelled sequences in _spelled_sequences.
+
+Imports _commands.py against the stand-in engine in standin_engine, once with
+the JoinedRepetition elements and once with SpelledDictation, and reports the
+size of the grammar, compiled like standin_engine compiles it, and the import
+time of each. Then checks that
+both decode the same values from random spelled sequences, that
+SpelledDictation rejects unknown words, and measures the decoding time per
+sequence length.
+
+Run it from the directory above this one:
+    python benchmarks/spelled_benchmark.py
+"""
+
+import random
+import sys
+import time
+import timeit
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import standin_engine
+from startup_benchmark import _purge_modules
+
+
+def load_commands(enabled):
+    """Imports _commands.py fresh, and returns it with the import time."""
+    _purge_modules()
+    standin_engine.reset()
+    import _spelled_sequences
+    _spelled_sequences.enabled = enabled
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        start = time.time()
+        import _commands
+        elapsed = time.time() - start
+    finally:
+        sys.stdout = stdout
+    _commands.word_list_server.stop()
+    _commands.executor.stop()
+    return _commands, elapsed
+
+
+def grammar_size(grammar):
+    """Returns the number of words, rules, lists and definition entries of the
+    grammar, including the rules it refers to.
+    """
+    dependencies = []
+    for rule in grammar.rules:
+        if rule not in dependencies:
+            dependencies.append(rule)
+        rule.dependencies(dependencies)
+    rules = [rule for rule in dependencies if hasattr(rule, "element")]
+    compiler = standin_engine._GrammarCompiler()
+    compiler.words = {}
+    entries = sum(len(compiler._compile(rule.element)) for rule in rules)
+    return (len(compiler.words), len(rules), len(dependencies) - len(rules),
+            entries)
+
+
+def _decode(rule, words):
+    """Returns the spelled value of the first parse of words, or None."""
+    for node in rule.decode(words):
+        extras = standin_engine._get_extras(rule, node)
+        return extras.get("numerals", extras.get("letters"))
+    return None
+
+
+def random_sequences(maps, count, lengths, seed=0):
+    generator = random.Random(seed)
+    sequences = []
+    for index in range(count):
+        (command, mapping) = generator.choice(maps)
+        keys = sorted(mapping)
+        words = [command]
+        for _ in range(generator.choice(lengths)):
+            words.extend(generator.choice(keys).split())
+        sequences.append(words)
+    return sequences
+
+
+def measure(rule, sequences, lengths, maps):
+    """Returns the values decoded from sequences, and the decoding time per
+    length, or None for lengths that do not match.
+    """
+    values = [_decode(rule, words) for words in sequences]
+    times = []
+    for length in lengths:
+        words = random_sequences(maps, 1, [length], seed=length)[0]
+        if _decode(rule, words) is None:
+            times.append(None)
+            continue
+        number = max(1, 2000 // length)
+        seconds = min(timeit.repeat(lambda: _decode(rule, words), repeat=3,
+                                    number=number))
+        times.append(seconds / number)
+    return values, times
+
+
+def main():
+    standin_engine.install()
+    unknown = [["print", "ace", "banana"], ["sign", "one", "ace"]]
+    lengths = [1, 4, 9, 40, 200]
+    sequences = None
+
+    names = ["JoinedRepetition", "SpelledDictation"]
+    print("%-24s %8s %8s %8s %12s %10s" % ("Elements", "words", "rules",
+                                            "lists", "definition", "import"))
+    results = []
+    for (name, enabled) in zip(names, [False, True]):
+        (commands, elapsed) = load_commands(enabled)
+        print("%-24s %8d %8d %8d %12d %7.0f ms" % (
+            (name,) + grammar_size(commands.grammar) + (elapsed * 1000,)))
+        # The rules are measured before the next import replaces the modules.
+        characters = sys.modules["_characters_and_numbers"]
+        rule = characters.character_rule
+        if sequences is None:
+            maps = [("sign", characters.numbers_map),
+                    ("print", characters.letters_map)]
+            # JoinedRepetition takes at most max - 1 = 9 words.
+            sequences = random_sequences(maps, 500, range(1, 10))
+        results.append(measure(rule, sequences + unknown, lengths, maps[1:]))
+
+    failures = 0
+    for (index, words) in enumerate(sequences):
+        values = [values[index] for (values, times) in results]
+        if values[0] != values[1]:
+            print("Different values for %s: %r" % (" ".join(words), values))
+            failures += 1
+    for (index, words) in enumerate(unknown):
+        if results[1][0][len(sequences) + index] is not None:
+            print("Accepted unknown words: %s" % " ".join(words))
+            failures += 1
+    print("")
+    print("%d differences between the elements on %d sequences" % (
+        failures, len(sequences)))
+
+    print("")
+    print("%-24s %16s %16s" % (("Sequence length",) + tuple(names)))
+    for (index, length) in enumerate(lengths):
+        times = [times[index] for (values, times) in results]
+        print("%-24d %16s %16s" % ((length,) + tuple(
+            "no match" if seconds is None else "%.1f us" % (seconds * 1e6)
+            for seconds in times)))
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1414 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Stand-in for dragonfly, NatLink and win32clipboard.
+
+This lets the command modules be imported, installed and benchmarked without
+Dragon or Windows, e.g. on Linux. install() registers this module as
+"dragonfly" and a clipboard stand-in as "win32clipboard". It covers the parts
+of the dragonfly API that the command modules use. Key, Text and Mouse parse
+their specs like dragonfly does. The events they would send to Windows are
+recorded in the shared Backend instead, and pauses advance a simulated clock
+instead of sleeping.
+
+The scripts in this directory import it first. Importing it puts the directory
+above, where the command modules are, on sys.path, and has no other side
+effects.
+"""
+
+import copy
+import inspect
+import os.path
+import sys
+import types
+
+# Directory of the command modules.
+directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if directory not in sys.path:
+    sys.path.insert(1, directory)
+
+
+#---------------------------------------------------------------------------
+# Recording backend.
+
+class Backend(object):
+    """Records the input events and clipboard contents of the stand-in
+    actions, and keeps a simulated clock that pauses advance. Pressing ctrl+v
+    records the clipboard contents as pasted.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.key_events = []
+        self.mouse_events = []
+        self.sends = 0
+        self.elapsed = 0.0
+        self.clipboard = None
+        # Clipboard data other than text, by format.
+        self.clipboard_other = {}
+        self.clipboard_open = False
+        self.pasted = []
+        self.held = set()
+
+    def sleep(self, seconds):
+        self.elapsed += seconds
+
+    def typed(self):
+        """Returns the names of the keys pressed, in order."""
+        return [key for (key, down) in self.key_events if down]
+
+
+backend = Backend()
+
+
+class Keyboard(object):
+    """Sends keyboard events, which are (key, down, timeout) tuples, to the
+    backend. Each call counts as one send operation.
+    """
+
+    def send_keyboard_events(self, events):
+        backend.sends += 1
+        for (key, down, timeout) in events:
+            backend.key_events.append((key, down))
+            if down:
+                if key == "v" and "ctrl" in backend.held:
+                    backend.pasted.append(backend.clipboard)
+                backend.held.add(key)
+            else:
+                backend.held.discard(key)
+            if timeout:
+                backend.sleep(timeout)
+
+
+#---------------------------------------------------------------------------
+# Actions.
+
+class ActionError(Exception):
+    pass
+
+
+class ActionBase(object):
+
+    def __init__(self):
+        self._str = ""
+
+    def __str__(self):
+        return "%s(%s)" % (self.__class__.__name__, self._str)
+
+    def __add__(self, other):
+        return ActionSeries(self, other)
+
+    def __mul__(self, factor):
+        return ActionRepetition(self, factor)
+
+    def copy(self):
+        return copy.copy(self)
+
+    def copy_bind(self, data):
+        return BoundAction(self, data)
+
+    def execute(self, data=None):
+        try:
+            if self._execute(data) is False:
+                raise ActionError(str(self))
+        except ActionError:
+            return False
+        return True
+
+    def _execute(self, data=None):
+        pass
+
+
+class ActionSeries(ActionBase):
+
+    def __init__(self, *actions):
+        ActionBase.__init__(self)
+        self._actions = list(actions)
+        self._str = ", ".join(str(action) for action in actions)
+
+    def __add__(self, other):
+        return ActionSeries(*(self._actions + [other]))
+
+    def _execute(self, data=None):
+        for action in self._actions:
+            action.execute(data)
+
+
+class ActionRepetition(ActionBase):
+
+    def __init__(self, action, factor):
+        ActionBase.__init__(self)
+        self._action = action
+        self._factor = factor
+
+    def _execute(self, data=None):
+        if isinstance(self._factor, int):
+            repeat = self._factor
+        else:
+            repeat = self._factor.factor(data)
+        for index in range(repeat):
+            self._action.execute(data)
+
+
+class BoundAction(ActionBase):
+
+    def __init__(self, action, data):
+        ActionBase.__init__(self)
+        self._action = action
+        self._data = data
+        self._str = str(action)
+
+    def _execute(self, data=None):
+        return self._action.execute(self._data)
+
+
+class Repeat(object):
+    """Repeat factor for multiplying actions, e.g. Key("a") * Repeat(extra="n")."""
+
+    def __init__(self, count=None, extra=None):
+        self._count = count or 0
+        self._extra = extra
+
+    def factor(self, data):
+        count = self._count
+        if self._extra:
+            count += (data or {}).get(self._extra, 0)
+        return count
+
+
+class DynStrActionBase(ActionBase):
+    """Action with a spec string. Specs without format directives are parsed
+    on construction, the others on each execution.
+    """
+
+    def __init__(self, spec=None, static=False):
+        ActionBase.__init__(self)
+        self._spec = spec
+        self._str = repr(spec)
+        self._static = static or "%" not in spec
+        if self._static:
+            self._events = self._parse_spec(spec)
+
+    def _execute(self, data=None):
+        if self._static:
+            events = self._events
+        else:
+            try:
+                spec = self._spec % (data or {})
+            except KeyError:
+                return False
+            events = self._parse_spec(spec)
+        return self._execute_events(events)
+
+
+_modifier_names = {
+    "a": "alt",
+    "c": "ctrl",
+    "s": "shift",
+    "w": "win",
+}
+
+_key_aliases = {
+    "control": "ctrl",
+    "backspace": "backspace",
+    "delete": "del",
+    "pageup": "pgup",
+    "pagedown": "pgdown",
+}
+
+
+class Key(DynStrActionBase):
+    """Parses key specs like dragonfly: "[modifiers-]key[/inner][:repeat][/outer]"
+    or "key:direction[/outer]", with pauses in hundredths of a second.
+    """
+
+    _keyboard = Keyboard()
+
+    def _parse_spec(self, spec):
+        events = []
+        for part in spec.split(","):
+            part = part.strip()
+            if part:
+                events.extend(self._parse_single(part))
+        return events
+
+    def _parse_single(self, part):
+        modifiers = []
+        if "-" in part[1:]:
+            prefix, rest = part.split("-", 1)
+            if prefix and all(letter in _modifier_names for letter in prefix):
+                modifiers = [_modifier_names[letter] for letter in prefix]
+                part = rest
+        inner_pause = 0.0
+        outer_pause = 0.0
+        repeat = 1
+        direction = None
+        if "/" in part:
+            part, pauses = part.split("/", 1)
+            if ":" in pauses:
+                inner, rest = pauses.split(":", 1)
+                inner_pause = float(inner) / 100
+                if "/" in rest:
+                    rest, outer = rest.split("/", 1)
+                    outer_pause = float(outer) / 100
+                part = part + ":" + rest
+            else:
+                outer_pause = float(pauses) / 100
+        if ":" in part:
+            part, modifier = part.split(":", 1)
+            if modifier in ("down", "up"):
+                direction = modifier == "down"
+            else:
+                repeat = int(modifier)
+        if not part:
+            raise ActionError("Invalid key spec: %r" % part)
+        key = _key_aliases.get(part, part)
+        if direction is not None:
+            return [(key, direction, outer_pause)]
+        if repeat == 0:
+            return []
+        events = [(modifier, True, 0.0) for modifier in modifiers]
+        for index in range(repeat):
+            events.append((key, True, 0.0))
+            if index == repeat - 1:
+                events.append((key, False, outer_pause))
+            else:
+                events.append((key, False, inner_pause))
+        events.extend((modifier, False, 0.0) for modifier in reversed(modifiers))
+        return events
+
+    def _execute_events(self, events):
+        self._keyboard.send_keyboard_events(events)
+
+
+class Text(DynStrActionBase):
+    """Types the characters of its spec, pausing after each one."""
+
+    _keyboard = Keyboard()
+    _pause_default = 0.02
+
+    def __init__(self, spec=None, static=False, pause=_pause_default):
+        self._pause = pause
+        DynStrActionBase.__init__(self, spec, static)
+
+    def _parse_spec(self, spec):
+        events = []
+        for character in spec:
+            events.append((character, True, 0.0))
+            events.append((character, False, self._pause))
+        return events
+
+    def _execute_events(self, events):
+        self._keyboard.send_keyboard_events(events)
+
+
+class Mouse(DynStrActionBase):
+    """Records mouse moves and clicks, e.g. "[400, 1000]/50, left:2"."""
+
+    def _parse_spec(self, spec):
+        parts = []
+        depth = 0
+        current = ""
+        for character in spec:
+            if character in "[(":
+                depth += 1
+            elif character in "])":
+                depth -= 1
+            if character == "," and depth == 0:
+                parts.append(current.strip())
+                current = ""
+            else:
+                current += character
+        parts.append(current.strip())
+        events = []
+        for part in parts:
+            pause = 0.0
+            if "/" in part:
+                part, pause = part.rsplit("/", 1)
+                pause = float(pause) / 100
+            events.append((part.strip(), pause))
+        return events
+
+    def _execute_events(self, events):
+        for (event, pause) in events:
+            backend.mouse_events.append(event)
+            backend.sleep(pause)
+
+
+class Pause(DynStrActionBase):
+    """Pauses for the given number of hundredths of a second."""
+
+    def _parse_spec(self, spec):
+        return float(spec) / 100
+
+    def _execute_events(self, interval):
+        backend.sleep(interval)
+
+
+class Function(ActionBase):
+    """Calls a function with the extras that match its argument names."""
+
+    def __init__(self, function, **defaults):
+        ActionBase.__init__(self)
+        self._function = function
+        self._defaults = defaults
+        self._str = function.__name__
+        argspec = inspect.getargspec(function)
+        self._filter_keywords = argspec.keywords is None
+        self._arguments = set(argspec.args)
+
+    def _execute(self, data=None):
+        arguments = dict(self._defaults)
+        arguments.update(data or {})
+        if self._filter_keywords:
+            arguments = dict((name, value)
+                             for (name, value) in arguments.items()
+                             if name in self._arguments)
+        self._function(**arguments)
+
+
+class Mimic(ActionBase):
+    """Makes the engine recognize the given words."""
+
+    def __init__(self, *words, **kwargs):
+        ActionBase.__init__(self)
+        self._words = words
+        self._extra = kwargs.get("extra")
+        self._str = " ".join(words)
+
+    def _execute(self, data=None):
+        words = self._words
+        if self._extra:
+            words = tuple((data or {})[self._extra].split())
+        get_engine().mimic(words)
+
+
+#---------------------------------------------------------------------------
+# Contexts.
+
+class Context(object):
+
+    def matches(self, executable, title, handle):
+        return True
+
+    def __and__(self, other):
+        return LogicAndContext(self, other)
+
+    def __or__(self, other):
+        return LogicOrContext(self, other)
+
+    def __invert__(self):
+        return LogicNotContext(self)
+
+
+class LogicAndContext(Context):
+
+    def __init__(self, *children):
+        self._children = children
+
+    def matches(self, executable, title, handle):
+        return all(child.matches(executable, title, handle)
+                   for child in self._children)
+
+
+class LogicOrContext(Context):
+
+    def __init__(self, *children):
+        self._children = children
+
+    def matches(self, executable, title, handle):
+        return any(child.matches(executable, title, handle)
+                   for child in self._children)
+
+
+class LogicNotContext(Context):
+
+    def __init__(self, child):
+        self._child = child
+
+    def matches(self, executable, title, handle):
+        return not self._child.matches(executable, title, handle)
+
+
+class AppContext(Context):
+    """Matches windows by a substring of their executable and/or title."""
+
+    def __init__(self, executable=None, title=None, exclude=False):
+        self._executable = executable.lower() if executable else None
+        self._title = title.lower() if title else None
+        self._exclude = bool(exclude)
+
+    def matches(self, executable, title, handle):
+        if self._executable:
+            found = self._executable in executable.lower()
+            if self._exclude == found:
+                return False
+        if self._title:
+            found = self._title in title.lower()
+            if self._exclude == found:
+                return False
+        return True
+
+
+#---------------------------------------------------------------------------
+# Lists.
+
+class List(list):
+
+    def __init__(self, name, *args):
+        list.__init__(self, *args)
+        self._name = name
+        self.updates = 0
+
+    name = property(lambda self: self._name)
+
+    def set(self, other):
+        self[:] = other
+        self.updates += 1
+
+
+class DictList(dict):
+
+    def __init__(self, name, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._name = name
+        self.updates = 0
+
+    name = property(lambda self: self._name)
+
+    def set(self, other):
+        self.clear()
+        self.update(other)
+        self.updates += 1
+
+
+#---------------------------------------------------------------------------
+# Elements. Each element decodes a list of words by yielding every way it can
+# match them from a given position, as (node, end position) pairs, so that the
+# enclosing elements can backtrack.
+
+class Node(object):
+    """Part of a recognition matched by an element or a rule."""
+
+    def __init__(self, element, words, start, end, children=()):
+        self.element = element
+        self.start = start
+        self.end = end
+        self.children = list(children)
+        self._words = words
+
+    name = property(lambda self: self.element.name)
+    actor = property(lambda self: self.element)
+
+    def words(self):
+        return list(self._words[self.start:self.end])
+
+    def value(self):
+        return self.element.value(self)
+
+    def get_child_by_name(self, name, shallow=False):
+        """Returns the first descendant matched by an element of the given
+        name. With shallow, other named elements are not searched.
+        """
+        for child in self.children:
+            if child.name:
+                if child.name == name:
+                    return child
+                if shallow:
+                    continue
+            match = child.get_child_by_name(name, shallow)
+            if match:
+                return match
+        return None
+
+
+class DictationContainer(object):
+
+    def __init__(self, words):
+        self.words = words
+
+    def format(self):
+        return " ".join(self.words)
+
+    def __str__(self):
+        return self.format()
+
+
+class ElementBase(object):
+
+    def __init__(self, name=None, default=None):
+        self._name = name
+        self._default = default
+
+    name = property(lambda self: self._name)
+    default = property(lambda self: self._default)
+    children = property(lambda self: ())
+
+    def dependencies(self, memo=None):
+        """Returns the rules and lists referenced by this element."""
+        memo = [] if memo is None else memo
+        for child in self.children:
+            child.dependencies(memo)
+        return memo
+
+    def decode(self, words, position):
+        return iter(())
+
+    def value(self, node):
+        return None
+
+
+class Sequence(ElementBase):
+
+    def __init__(self, children=(), name=None, default=None):
+        ElementBase.__init__(self, name, default)
+        self._children = tuple(children)
+
+    children = property(lambda self: self._children)
+
+    def decode(self, words, position):
+        for (nodes, end) in _decode_all(self._children, words, position):
+            yield Node(self, words, position, end, nodes), end
+
+    def value(self, node):
+        return [child.value() for child in node.children]
+
+
+def _decode_all(elements, words, position):
+    if not elements:
+        yield [], position
+        return
+    for (node, middle) in elements[0].decode(words, position):
+        for (nodes, end) in _decode_all(elements[1:], words, middle):
+            yield [node] + nodes, end
+
+
+class Optional(ElementBase):
+
+    def __init__(self, child, name=None, default=None):
+        ElementBase.__init__(self, name, default)
+        self._child = child
+
+    children = property(lambda self: (self._child,))
+
+    def decode(self, words, position):
+        for (node, end) in self._child.decode(words, position):
+            yield Node(self, words, position, end, [node]), end
+        yield Node(self, words, position, position), position
+
+    def value(self, node):
+        if node.children:
+            return node.children[0].value()
+        return None
+
+
+class Alternative(ElementBase):
+
+    def __init__(self, children=(), name=None, default=None):
+        ElementBase.__init__(self, name, default)
+        self._children = tuple(children)
+
+    children = property(lambda self: self._children)
+
+    def decode(self, words, position):
+        for child in self._children:
+            for (node, end) in child.decode(words, position):
+                yield Node(self, words, position, end, [node]), end
+
+    def value(self, node):
+        return node.children[0].value()
+
+
+class Repetition(Sequence):
+    """Child repeated at least min and fewer than max times."""
+
+    def __init__(self, child=None, min=1, max=None, name=None, default=None):
+        if max is None:
+            max = min + 16
+        optional = None
+        for index in range(max - min - 1):
+            if optional is None:
+                optional = Optional(child)
+            else:
+                optional = Optional(Sequence([child, optional]))
+        children = [child] * min
+        if optional is not None:
+            children.append(optional)
+        Sequence.__init__(self, children, name, default)
+        self._child = child
+        self._min = min
+        self._max = max
+
+    def decode(self, words, position):
+        # The nodes of a repetition are the repeated children, most first.
+        for (nodes, end) in self._repeat(words, position, 0):
+            yield Node(self, words, position, end, nodes), end
+
+    def _repeat(self, words, position, count):
+        if count < self._max - 1:
+            for (node, middle) in self._child.decode(words, position):
+                if middle == position:
+                    continue
+                for (nodes, end) in self._repeat(words, middle, count + 1):
+                    yield [node] + nodes, end
+        if count >= self._min:
+            yield [], position
+
+
+class Literal(ElementBase):
+
+    def __init__(self, text, name=None, value=None, default=None):
+        ElementBase.__init__(self, name, default)
+        self._words = tuple(text.split())
+        self._value = value
+
+    words = property(lambda self: self._words)
+
+    def decode(self, words, position):
+        end = position + len(self._words)
+        if [word.lower() for word in words[position:end]] == \
+                [word.lower() for word in self._words]:
+            yield Node(self, words, position, end), end
+
+    def value(self, node):
+        if self._value is not None:
+            return self._value
+        return " ".join(node.words())
+
+
+class Empty(ElementBase):
+
+    def __init__(self, name=None, value=True, default=None):
+        ElementBase.__init__(self, name, default)
+        self._value = value
+
+    def decode(self, words, position):
+        yield Node(self, words, position, position), position
+
+    def value(self, node):
+        return self._value
+
+
+class Dictation(ElementBase):
+
+    def __init__(self, name=None, format=True, default=None):
+        ElementBase.__init__(self, name, default)
+        self._format = format
+
+    def decode(self, words, position):
+        # Longest dictation first.
+        for end in range(len(words), position, -1):
+            yield Node(self, words, position, end), end
+
+    def value(self, node):
+        return DictationContainer(node.words())
+
+
+class RuleRef(ElementBase):
+
+    def __init__(self, rule, name=None, default=None):
+        ElementBase.__init__(self, name, default)
+        self._rule = rule
+
+    rule = property(lambda self: self._rule)
+
+    def dependencies(self, memo=None):
+        memo = [] if memo is None else memo
+        if self._rule not in memo:
+            memo.append(self._rule)
+            self._rule.element.dependencies(memo)
+        return memo
+
+    def decode(self, words, position):
+        for (node, end) in self._rule.element.decode(words, position):
+            rule_node = Node(self._rule, words, position, end, [node])
+            yield Node(self, words, position, end, [rule_node]), end
+
+    def value(self, node):
+        return node.children[0].value()
+
+
+class RuleWrap(RuleRef):
+    """Wraps an element in a private rule of its own."""
+
+    _next_id = 0
+
+    def __init__(self, name, element, default=None):
+        rule = Rule("_RuleWrap%02d" % RuleWrap._next_id, element)
+        RuleWrap._next_id += 1
+        RuleRef.__init__(self, rule, name, default)
+
+
+class ListRef(ElementBase):
+
+    def __init__(self, name, list, key=None, default=None):
+        ElementBase.__init__(self, name, default)
+        self._list = list
+
+    list = property(lambda self: self._list)
+
+    def dependencies(self, memo=None):
+        memo = [] if memo is None else memo
+        if not [True for item in memo if item is self._list]:
+            memo.append(self._list)
+        return memo
+
+    def decode(self, words, position):
+        for item in self._list:
+            item_words = _spoken_words(item)
+            end = position + len(item_words)
+            if [word.lower() for word in words[position:end]] == \
+                    [word.lower() for word in item_words]:
+                yield Node(self, words, position, end), end
+
+    def value(self, node):
+        # Items with a written form, "written\\spoken", are returned whole.
+        spoken = [word.lower() for word in node.words()]
+        for item in self._list:
+            if "\\" in item and \
+                    [word.lower() for word in _spoken_words(item)] == spoken:
+                return item
+        return " ".join(node.words())
+
+
+def _spoken_words(item):
+    return item.split("\\")[-1].split()
+
+
+class DictListRef(ListRef):
+
+    def value(self, node):
+        spoken = " ".join(node.words()).lower()
+        for (key, value) in self._list.items():
+            if key.lower() == spoken:
+                return value
+
+
+_number_words = ("zero one two three four five six seven eight nine ten eleven "
+                 "twelve thirteen fourteen fifteen sixteen seventeen eighteen "
+                 "nineteen twenty").split()
+
+
+class IntegerRef(Alternative):
+    """Spoken integers from min up to, but not including, max."""
+
+    def __init__(self, name, min, max, default=None):
+        Alternative.__init__(
+            self,
+            [Literal(_number_words[number], value=number)
+             for number in range(min, max)],
+            name, default)
+
+
+class Compound(Alternative):
+    """Element built from a spec such as "up [<n>]" or "status|one". References
+    are resolved against the given named elements.
+    """
+
+    def __init__(self, spec, extras=None, actions=None, name=None, value=None,
+                 value_func=None, elements=None, default=None):
+        self._spec = spec
+        self._value = value
+        references = dict((element.name, element) for element in extras or ())
+        if isinstance(elements, dict):
+            references.update(elements)
+        else:
+            references.update((element.name, element)
+                              for element in elements or ())
+        parser = _SpecParser(spec, references)
+        Alternative.__init__(self, [parser.parse()], name, default)
+
+    def value(self, node):
+        if self._value is not None:
+            return self._value
+        return node.children[0].value()
+
+
+class _SpecParser(object):
+
+    def __init__(self, spec, references):
+        self._tokens = []
+        word = ""
+        for character in spec:
+            if character in "[]()|<>" or character.isspace():
+                if word:
+                    self._tokens.append(word)
+                    word = ""
+                if not character.isspace():
+                    self._tokens.append(character)
+            else:
+                word += character
+        if word:
+            self._tokens.append(word)
+        self._position = 0
+        self._references = references
+        self._spec = spec
+
+    def parse(self):
+        element = self._alternative()
+        if self._position != len(self._tokens):
+            raise SyntaxError("Invalid spec: %r" % self._spec)
+        return element
+
+    def _peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return None
+
+    def _next(self):
+        token = self._peek()
+        self._position += 1
+        return token
+
+    def _alternative(self):
+        choices = [self._sequence()]
+        while self._peek() == "|":
+            self._next()
+            choices.append(self._sequence())
+        if len(choices) == 1:
+            return choices[0]
+        return Alternative(choices)
+
+    def _sequence(self):
+        items = []
+        while self._peek() not in (None, "|", "]", ")"):
+            token = self._next()
+            if token == "[":
+                items.append(Optional(self._alternative()))
+                self._expect("]")
+            elif token == "(":
+                items.append(self._alternative())
+                self._expect(")")
+            elif token == "<":
+                name = self._next()
+                self._expect(">")
+                if name not in self._references:
+                    raise KeyError("Unknown reference <%s> in spec %r"
+                                   % (name, self._spec))
+                items.append(self._references[name])
+            else:
+                items.append(Literal(token))
+        if len(items) == 1:
+            return items[0]
+        return Sequence(items)
+
+    def _expect(self, token):
+        if self._next() != token:
+            raise SyntaxError("Expected %r in spec: %r" % (token, self._spec))
+
+
+#---------------------------------------------------------------------------
+# Rules and grammars.
+
+class Rule(object):
+
+    def __init__(self, name=None, element=None, context=None, imported=False,
+                 exported=False):
+        self._name = name
+        self._element = element
+        self._context = context
+        self._imported = imported
+        self._exported = exported
+        self._grammar = None
+        self._enabled = True
+        self._active = False
+
+    name = property(lambda self: self._name)
+    element = property(lambda self: self._element)
+    context = property(lambda self: self._context)
+    exported = property(lambda self: self._exported)
+    imported = property(lambda self: self._imported)
+    active = property(lambda self: self._active)
+    enabled = property(lambda self: self._enabled)
+
+    def _get_grammar(self):
+        return self._grammar
+
+    def _set_grammar(self, grammar):
+        if self._grammar is None:
+            self._grammar = grammar
+        elif grammar is not self._grammar:
+            raise TypeError("The grammar object of rule %s cannot be changed"
+                            " after it has been set." % self._name)
+
+    grammar = property(_get_grammar, _set_grammar)
+
+    def dependencies(self, memo=None):
+        return self._element.dependencies(memo)
+
+    def enable(self):
+        self._enabled = True
+
+    def disable(self):
+        self._enabled = False
+
+    def activate(self):
+        if not self._active:
+            self._grammar.activate_rule(self)
+            self._active = True
+
+    def deactivate(self):
+        if self._active:
+            self._grammar.deactivate_rule(self)
+            self._active = False
+
+    def process_begin(self, executable, title, handle):
+        if not self._enabled:
+            self.deactivate()
+        elif not self._context \
+                or self._context.matches(executable, title, handle):
+            self.activate()
+        else:
+            self.deactivate()
+
+    def decode(self, words):
+        """Yields the nodes of the ways this rule matches all of the words."""
+        words = list(words)
+        for (node, end) in self._element.decode(words, 0):
+            if end == len(words):
+                yield Node(self, words, 0, end, [node])
+
+    def value(self, node):
+        return node.children[0].value()
+
+    def process_recognition(self, node):
+        pass
+
+
+class CompoundRule(Rule):
+
+    spec = None
+    extras = ()
+    defaults = {}
+    exported = True
+    context = None
+
+    def __init__(self, name=None, spec=None, extras=None, defaults=None,
+                 exported=None, context=None):
+        name = name or self.__class__.__name__
+        spec = spec or self.spec
+        extras = self.extras if extras is None else extras
+        defaults = self.defaults if defaults is None else defaults
+        exported = self.exported if exported is None else exported
+        context = self.context if context is None else context
+        self._extras = dict((element.name, element) for element in extras)
+        self._defaults = dict(defaults)
+        self._spec = spec
+        Rule.__init__(self, name, Compound(spec, elements=self._extras),
+                      context=context, exported=exported)
+
+    def process_recognition(self, node):
+        self._process_recognition(node, _get_extras(self, node))
+
+    def _process_recognition(self, node, extras):
+        pass
+
+
+class MappingRule(Rule):
+
+    mapping = {}
+    extras = ()
+    defaults = {}
+    exported = True
+    context = None
+
+    def __init__(self, name=None, mapping=None, extras=None, defaults=None,
+                 exported=None, context=None):
+        name = name or self.__class__.__name__
+        mapping = self.mapping if mapping is None else mapping
+        extras = self.extras if extras is None else extras
+        defaults = self.defaults if defaults is None else defaults
+        exported = self.exported if exported is None else exported
+        context = self.context if context is None else context
+        self._mapping = mapping
+        self._extras = dict((element.name, element) for element in extras)
+        self._defaults = dict(defaults)
+        children = [Compound(spec, elements=self._extras, value=value)
+                    for (spec, value) in mapping.iteritems()]
+        Rule.__init__(self, name, Alternative(children), context=context,
+                      exported=exported)
+
+    def value(self, node):
+        compound = node.children[0].children[0]
+        return compound.value().copy_bind(_get_extras(self, node, compound))
+
+    def process_recognition(self, node):
+        self.value(node).execute()
+
+
+def _get_extras(rule, node, parent=None):
+    """Returns the extras of a recognition of a CompoundRule or MappingRule.
+    The values of the named elements under parent, the root node by default,
+    override the defaults.
+    """
+    extras = {"_grammar": rule.grammar, "_rule": rule, "_node": node}
+    extras.update(rule._defaults)
+    for (name, element) in rule._extras.items():
+        extra_node = (parent or node).get_child_by_name(name, shallow=True)
+        if extra_node:
+            extras[name] = extra_node.value()
+        elif element.default is not None:
+            extras[name] = element.default
+    return extras
+
+
+class Grammar(object):
+
+    def __init__(self, name, description=None, context=None, engine=None):
+        self._name = name
+        self._description = description
+        self._context = context
+        self._engine = engine or get_engine()
+        self._rules = []
+        self._lists = []
+        self._loaded = False
+        self._enabled = True
+
+    name = property(lambda self: self._name)
+    rules = property(lambda self: list(self._rules))
+    lists = property(lambda self: list(self._lists))
+    loaded = property(lambda self: self._loaded)
+    enabled = property(lambda self: self._enabled)
+
+    def add_rule(self, rule):
+        if self._loaded:
+            raise GrammarError("Cannot add rule while loaded.")
+        if rule in self._rules:
+            return
+        if [True for other in self._rules if other.name == rule.name]:
+            raise GrammarError("Two rules with the same name '%s' not allowed."
+                               % rule.name)
+        self._rules.append(rule)
+        rule.grammar = self
+
+    def remove_rule(self, rule):
+        if self._loaded:
+            raise GrammarError("Cannot remove rule while loaded.")
+        if rule in self._rules:
+            self._rules.remove(rule)
+
+    def add_list(self, lst):
+        if self._loaded:
+            raise GrammarError("Cannot add list while loaded.")
+        # Lists compare by content, so an empty list would equal any other.
+        if [True for other in self._lists if other is lst]:
+            return
+        if [True for other in self._lists if other.name == lst.name]:
+            raise GrammarError("Two lists with the same name '%s' not allowed."
+                               % lst.name)
+        self._lists.append(lst)
+
+    def remove_list(self, lst):
+        if self._loaded:
+            raise GrammarError("Cannot remove list while loaded.")
+        self._lists = [other for other in self._lists if other is not lst]
+
+    def add_dependency(self, dependency):
+        if isinstance(dependency, Rule):
+            if not dependency.exported and dependency not in self._rules:
+                self.add_rule(dependency)
+        else:
+            self.add_list(dependency)
+
+    def load(self):
+        if self._loaded:
+            return
+        for rule in list(self._rules):
+            for dependency in rule.dependencies():
+                self.add_dependency(dependency)
+        self._engine.load_grammar(self)
+        self._loaded = True
+
+    def unload(self):
+        if not self._loaded:
+            return
+        self._engine.unload_grammar(self)
+        for rule in self._rules:
+            rule._active = False
+        self._loaded = False
+
+    def enable(self):
+        self._enabled = True
+
+    def disable(self):
+        self._enabled = False
+
+    def activate_rule(self, rule):
+        self._engine.activations += 1
+
+    def deactivate_rule(self, rule):
+        self._engine.activations += 1
+
+    def process_begin(self, executable, title, handle):
+        if not self._enabled:
+            return
+        for rule in self._rules:
+            if rule.exported:
+                rule.process_begin(executable, title, handle)
+
+
+class GrammarError(Exception):
+    pass
+
+
+#---------------------------------------------------------------------------
+# Engine, timers and windows.
+
+class Timer(object):
+    """Stand-in for dragonfly.timer.Timer. It starts when created, and is
+    called by run_timers() of the engine instead of at its interval.
+    """
+
+    def __init__(self, function, interval):
+        self.function = function
+        self.interval = interval
+        self._engine = get_engine()
+        self.start()
+
+    def start(self):
+        if self not in self._engine.timers:
+            self._engine.timers.append(self)
+
+    def stop(self):
+        if self in self._engine.timers:
+            self._engine.timers.remove(self)
+
+    def call(self):
+        self.function()
+
+
+class StandinEngine(object):
+    """Compiles loaded grammars into word and rule tables, roughly like the
+    NatLink engine compiles them into a grammar binary.
+    """
+
+    name = "standin"
+
+    def __init__(self):
+        self.grammars = []
+        self.timers = []
+        self.compiled = {}
+        self.activations = 0
+
+    def load_grammar(self, grammar):
+        self.compiled[grammar] = _GrammarCompiler().compile(grammar)
+        self.grammars.append(grammar)
+
+    def unload_grammar(self, grammar):
+        self.compiled.pop(grammar, None)
+        if grammar in self.grammars:
+            self.grammars.remove(grammar)
+
+    def run_timers(self):
+        for timer in list(self.timers):
+            timer.call()
+
+    def speak(self, text):
+        pass
+
+    def mimic(self, words):
+        """Recognizes the words with the first active exported rule that
+        matches them, after notifying the grammars of the foreground window.
+        """
+        if hasattr(words, "split"):
+            words = words.split()
+        window = Window.get_foreground()
+        for grammar in list(self.grammars):
+            grammar.process_begin(window.executable, window.title,
+                                  window.handle)
+        for grammar in list(self.grammars):
+            for rule in grammar.rules:
+                if not (rule.exported and rule.active):
+                    continue
+                for node in rule.decode(words):
+                    rule.process_recognition(node)
+                    return
+        raise MimicFailure("No matching rule for %r." % " ".join(words))
+
+
+class MimicFailure(Exception):
+    pass
+
+
+class _GrammarCompiler(object):
+    """Flattens the rules of a grammar into definitions over words, rule
+    references and list references.
+    """
+
+    def compile(self, grammar):
+        self.words = {}
+        definitions = {}
+        for rule in grammar.rules:
+            definitions[rule.name] = self._compile(rule.element)
+        return self.words, definitions
+
+    def _compile(self, element):
+        if isinstance(element, Literal):
+            return [("word", self.words.setdefault(word, len(self.words)))
+                    for word in element.words]
+        if isinstance(element, RuleRef):
+            return [("rule", element.rule.name)]
+        if isinstance(element, ListRef):
+            return [("list", element.list.name)]
+        if isinstance(element, Dictation):
+            return [("dictation",)]
+        result = [("start", element.__class__.__name__)]
+        for child in element.children:
+            result.extend(self._compile(child))
+        result.append(("end",))
+        return result
+
+
+_engine = StandinEngine()
+
+
+def get_engine():
+    return _engine
+
+
+def reset():
+    """Forgets all recorded events, loaded grammars and timers."""
+    backend.reset()
+    _engine.__init__()
+    Window.foreground = None
+    Window.windows = []
+    Window.activations = 0
+
+
+class Window(object):
+    """Top-level window. The open windows are kept in windows, in z-order, and
+    set_foreground() moves a window to the front.
+    """
+
+    foreground = None
+    windows = []
+    activations = 0
+
+    def __init__(self, executable="", title="", handle=0):
+        self.executable = executable
+        self.title = title
+        self.handle = handle
+        self.is_visible = True
+        self.is_minimized = False
+
+    @classmethod
+    def get_foreground(cls):
+        return cls.foreground or Window()
+
+    @classmethod
+    def get_all_windows(cls):
+        return list(cls.windows)
+
+    @classmethod
+    def open(cls, executable, title, handle):
+        """Opens a window in front of the others, and returns it."""
+        window = Window(executable, title, handle)
+        cls.windows.insert(0, window)
+        cls.foreground = window
+        return window
+
+    def close(self):
+        if self in Window.windows:
+            Window.windows.remove(self)
+        if Window.foreground is self:
+            Window.foreground = Window.windows[0] if Window.windows else None
+
+    def restore(self):
+        self.is_minimized = False
+
+    def set_foreground(self):
+        Window.activations += 1
+        if self not in Window.windows or self.is_minimized:
+            return
+        Window.windows.remove(self)
+        Window.windows.insert(0, self)
+        Window.foreground = self
+
+
+class Config(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def load(self):
+        pass
+
+
+def setup_log():
+    pass
+
+
+#---------------------------------------------------------------------------
+# win32clipboard stand-in.
+
+class _Clipboard(types.ModuleType):
+
+    CF_TEXT = 1
+    CF_OEMTEXT = 7
+    CF_UNICODETEXT = 13
+    CF_LOCALE = 16
+
+    class error(Exception):
+        pass
+
+    def OpenClipboard(self, handle=None):
+        if backend.clipboard_open:
+            raise self.error("Clipboard is locked.")
+        backend.clipboard_open = True
+
+    def CloseClipboard(self):
+        backend.clipboard_open = False
+
+    def EmptyClipboard(self):
+        backend.clipboard = None
+        backend.clipboard_other = {}
+
+    def SetClipboardData(self, format, data):
+        if format in (self.CF_TEXT, self.CF_UNICODETEXT):
+            backend.clipboard = data
+        else:
+            backend.clipboard_other[format] = data
+
+    def EnumClipboardFormats(self, format=0):
+        formats = sorted(backend.clipboard_other)
+        if backend.clipboard is not None:
+            formats.insert(0, self.CF_UNICODETEXT)
+        if format == 0:
+            return formats[0] if formats else 0
+        index = formats.index(format) + 1
+        return formats[index] if index < len(formats) else 0
+
+    def GetClipboardData(self, format=CF_UNICODETEXT):
+        if backend.clipboard is None:
+            raise TypeError("Specified clipboard format is not available.")
+        return backend.clipboard
+
+    def IsClipboardFormatAvailable(self, format):
+        return backend.clipboard is not None
+
+
+class _PackageResources(types.ModuleType):
+    """Accepts the requirement on dragonfly, which is not installed."""
+
+    def require(self, *requirements):
+        return []
+
+
+def install():
+    """Registers this module as dragonfly, and stand-ins for win32clipboard and
+    pkg_resources, so that the command modules can be imported.
+    """
+    module = sys.modules[__name__]
+    log = types.ModuleType("dragonfly.log")
+    log.setup_log = setup_log
+    module.log = log
+    timer = types.ModuleType("dragonfly.timer")
+    timer.Timer = Timer
+    module.timer = timer
+    sys.modules["dragonfly"] = module
+    sys.modules["dragonfly.log"] = log
+    sys.modules["dragonfly.timer"] = timer
+    sys.modules["win32clipboard"] = _Clipboard("win32clipboard")
+    sys.modules["pkg_resources"] = _PackageResources("pkg_resources")
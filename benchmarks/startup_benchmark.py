@@ -0,0 +1,277 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Benchmark for the stages of loading the command modules.
+
+Runs against the stand-in engine in standin_engine, so it needs neither Dragon
+nor Windows. For each stage it reports the wall time and the number of objects
+allocated, counted as objects tracked by the garbage collector:
+- import: importing _commands.py, which includes all stages below,
+- environment: building an Environment,
+- install: installing the environment tree,
+- check: the grammar budget check, which only runs on reloads that change
+  rules, so it is measured after loading the synthetic trees,
+- load: grammar.load().
+The command modules are measured once with lazy actions, see _lazy_actions, and
+once with eagerly built actions. Synthetic environment trees with a given
+number of commands show how the stages grow with the command set.
+
+Run it from the directory above this one, e.g.:
+    python benchmarks/startup_benchmark.py --runs 5 --synthetic 1000,5000,20000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import standin_engine
+
+directory = standin_engine.directory
+
+
+class StageRecorder(object):
+    """Records the wall time and allocated objects of nested stages. The time
+    spent counting objects is subtracted from the enclosing stages. The garbage
+    collector is disabled while stages run, so that the counts do not drop when
+    it happens to collect.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self._stack = []
+        self._overhead = 0.0
+
+    def start(self, name):
+        if not self._stack:
+            gc.collect()
+            gc.disable()
+        before = time.time()
+        objects = len(gc.get_objects())
+        start = time.time()
+        self._overhead += start - before
+        self._stack.append((name, start, objects, self._overhead))
+
+    def stop(self):
+        end = time.time()
+        objects = len(gc.get_objects())
+        name, start, start_objects, start_overhead = self._stack.pop()
+        elapsed = end - start - (self._overhead - start_overhead)
+        self.stages.append((len(self._stack), name, elapsed,
+                            objects - start_objects))
+        self._overhead += time.time() - end
+        if not self._stack:
+            gc.enable()
+
+    def wrap(self, owner, attribute, name):
+        """Records every call of owner.attribute as a stage. name is called with
+        the arguments of each call and returns the name of the stage.
+        """
+        function = vars(owner)[attribute]
+        recorder = self
+
+        def wrapper(*args, **kwargs):
+            recorder.start(name(*args, **kwargs))
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.stop()
+        setattr(owner, attribute, wrapper)
+        return function
+
+
+def _purge_modules():
+    """Removes the command modules from sys.modules, so that the next import
+    runs them again.
+    """
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if path and os.path.dirname(os.path.abspath(path)) == directory:
+            del sys.modules[name]
+
+
+def _prepare(recorder, lazy):
+    """Imports the helper modules fresh and hooks the stages into them."""
+    _purge_modules()
+    standin_engine.reset()
+    import _environment
+    import _grammar_analysis
+    import _lazy_actions
+    _lazy_actions.enabled = lazy
+    recorder.wrap(_environment.Environment, "__init__",
+                  lambda self, name, *args, **kwargs: "environment " + name)
+    recorder.wrap(_environment.Environment, "install",
+                  lambda *args, **kwargs: "install")
+    recorder.wrap(_grammar_analysis, "check_environments",
+                  lambda *args, **kwargs: "check")
+    return _environment
+
+
+def measure_commands(lazy=True):
+    """Imports _commands.py and returns the recorded stages."""
+    recorder = StageRecorder()
+    _prepare(recorder, lazy)
+    original_load = recorder.wrap(standin_engine.Grammar, "load",
+                                  lambda *args: "load")
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        recorder.start("import _commands")
+        import _commands
+        recorder.stop()
+    finally:
+        sys.stdout = stdout
+        standin_engine.Grammar.load = original_load
+    return recorder.stages
+
+
+def synthetic_environments(module, commands, environments):
+    """Builds a tree of a Global environment with the given number of child
+    environments, and about the given number of commands spread evenly across
+    them. Commands mix Key and Text actions, with and without extras, like the
+    command modules do.
+    """
+    from dragonfly import AppContext, Dictation, IntegerRef
+    from _lazy_actions import Key, Text
+    element_map = {
+        "n": (IntegerRef(None, 1, 10), 1),
+        "text": Dictation(),
+    }
+    per_environment = max(commands // (environments + 1), 1)
+    counter = [0]
+
+    def action_map():
+        result = {}
+        for index in range(per_environment):
+            number = counter[0]
+            counter[0] += 1
+            kind = number % 4
+            if kind == 0:
+                result["key %d [<n>]" % number] = Key("c-%d:%%(n)d" % (number % 10))
+            elif kind == 1:
+                result["shortcut %d" % number] = Key("cs-f%d" % (number % 12 + 1))
+            elif kind == 2:
+                result["snippet %d" % number] = Text("snippet_%d()" % number)
+            else:
+                result["insert %d <text>" % number] = Text("%%(text)s_%d" % number)
+        return result
+
+    root = module.Environment(name="Global",
+                              action_map=action_map(),
+                              terminal_action_map={"say <text>": Text("%(text)s")},
+                              element_map=element_map)
+    for index in range(environments):
+        module.Environment(name="App%d" % index,
+                           parent=root,
+                           context=AppContext(executable="app%d" % index),
+                           action_map=action_map())
+    return root
+
+
+def measure_synthetic(commands, environments, lazy=True):
+    """Builds and loads a synthetic environment tree like _commands.py does,
+    and returns the recorded stages.
+    """
+    recorder = StageRecorder()
+    module = _prepare(recorder, lazy)
+    from _environment_resolver import ResolverGrammar
+    from _grammar_analysis import check_environments
+    from _incremental_reload import GrammarReloader
+    from _rule_cache import RuleCache
+    original_load = recorder.wrap(standin_engine.Grammar, "load",
+                                  lambda *args: "load")
+    try:
+        recorder.start("synthetic %d commands" % commands)
+        root = synthetic_environments(module, commands, environments)
+        GrammarReloader().load(lambda: ResolverGrammar("synthetic"),
+                               root,
+                               RuleCache())
+        check_environments(root)
+        recorder.stop()
+    finally:
+        standin_engine.Grammar.load = original_load
+    return recorder.stages
+
+
+def _combine(runs, group_environments):
+    """Returns (depth, name, median time, objects, count) for each stage name in
+    order of first appearance. Objects are taken from the last run.
+    """
+    order = []
+    times = {}
+    objects = {}
+    counts = {}
+    for stages in runs:
+        totals = {}
+        for (depth, name, elapsed, allocated) in stages:
+            if group_environments and name.startswith("environment "):
+                name = "environments"
+            key = (depth, name)
+            if key not in times:
+                order.append(key)
+                times[key] = []
+            previous = totals.get(key, (0.0, 0, 0))
+            totals[key] = (previous[0] + elapsed,
+                           previous[1] + allocated,
+                           previous[2] + 1)
+        for key, (elapsed, allocated, count) in totals.items():
+            times[key].append(elapsed)
+            objects[key] = allocated
+            counts[key] = count
+    # Stages are recorded when they end, so the enclosing stage comes last.
+    order.sort(key=lambda key: key[0])
+    result = []
+    for key in order:
+        elapsed = sorted(times[key])[len(times[key]) // 2]
+        result.append((key[0], key[1], elapsed, objects[key], counts[key]))
+    return result
+
+
+def report(title, runs, group_environments=False):
+    lines = [title]
+    for (depth, name, elapsed, allocated, count) in _combine(runs,
+                                                            group_environments):
+        if count > 1:
+            name = "%s (%d)" % (name, count)
+        lines.append("  %-44s %9.1f ms %+10d objects" % (
+            "  " * depth + name, elapsed * 1000, allocated))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=3,
+                        help="number of runs per measurement, the median "
+                             "time is reported")
+    parser.add_argument("--synthetic", default="1000,5000,20000",
+                        help="comma-separated command counts of synthetic "
+                             "trees, or empty to skip them")
+    parser.add_argument("--environments", type=int, default=50,
+                        help="number of child environments in synthetic trees")
+    args = parser.parse_args()
+
+    standin_engine.install()
+    for lazy in (True, False):
+        runs = [measure_commands(lazy) for run in range(args.runs)]
+        print(report("_commands.py, %s actions:"
+                     % ("lazy" if lazy else "eager"), runs))
+        import _environment
+        import _commands
+        print("  " + _environment.map_memory_report(_commands.global_environment))
+    for commands in [int(count) for count in args.synthetic.split(",")
+                     if count]:
+        runs = [measure_synthetic(commands, args.environments)
+                for run in range(args.runs)]
+        print(report("Synthetic tree, %d commands in %d environments:"
+                     % (commands, args.environments + 1), runs,
+                     group_environments=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Replays recorded utterances without Dragon or Windows.
+
+Set utterance_recorder.path in _commands.py to record the utterances
+recognized by RepeatRule, see _utterance_recording. This script imports the
+command modules against the stand-in engine in standin_engine, decodes the
+recorded words with the recorded rule, and executes the parse whose extras
+match the recorded ones. The keys sent for each utterance are captured by the
+stand-in backend.
+
+Run it from the directory above this one, without a corpus to replay the
+sample utterances below:
+    python benchmarks/utterance_replay.py [corpus.jsonl] [--save keys.jsonl]
+        [--check keys.jsonl] [--runs N] [--modifiers]
+--save writes the keys of each utterance, and --check compares them to such a
+file, e.g. before and after an optimization. The throughput of decoding and
+executing is reported per run. --modifiers replays the corpus once more with
+every modifier release sent, see _modifier_state, and reports the key events
+saved.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import standin_engine
+
+# Utterances of the Global environment, replayed without a corpus.
+sample_utterances = [
+    "up three sword two crash tell foo",
+    "mark line chop",
+    "race tick two scream hello world",
+    "fish left four",
+    "mark west slay two paste",
+    "down five east copy",
+    "lake rake lake rake",
+    "shout ace bed chair",
+]
+
+
+def _import_commands():
+    standin_engine.install()
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        import _commands
+    finally:
+        sys.stdout = stdout
+    return _commands
+
+
+def sample_corpus(commands):
+    rule = commands.global_environment.rule
+    return [{"environment": rule.environment, "rule": rule.name,
+             "words": words.split(), "extras": None}
+            for words in sample_utterances]
+
+
+def decode(rule, utterance):
+    """Returns the node and extras of the parse of the utterance whose extras
+    match the recorded ones, and True. If none does, returns those of the first
+    parse and False. Returns None if the rule does not match the words.
+    """
+    from _utterance_recording import summarize
+    first = None
+    for node in rule.decode(utterance["words"]):
+        extras = standin_engine._get_extras(rule, node)
+        if utterance["extras"] is None \
+                or summarize(extras) == utterance["extras"]:
+            return node, extras, True
+        if first is None:
+            first = node, extras, False
+    return first
+
+
+class Replay(object):
+    """Result of replaying a corpus once."""
+
+    def __init__(self):
+        self.keys = []
+        self.failures = []
+        self.unmatched = 0
+        self.decode_time = 0.0
+        self.execute_time = 0.0
+
+    def report(self):
+        count = len(self.keys)
+        total = self.decode_time + self.execute_time
+        return ("%d utterances, %d failed, %d without matching extras: "
+                "decode %.1f ms, execute %.1f ms, %.0f utterances/s" % (
+                    count, len(self.failures), self.unmatched,
+                    self.decode_time * 1000, self.execute_time * 1000,
+                    count / total if total else 0))
+
+
+def replay(commands, corpus):
+    """Replays the corpus and returns the Replay."""
+    import _action_executor
+    from _pacing import pacer
+    backend = standin_engine.backend
+    rules = dict((rule.name, rule) for rule in commands.grammar.rules)
+    result = Replay()
+    enabled, sleep = _action_executor.enabled, pacer.sleep
+    _action_executor.enabled = False
+    pacer.sleep = backend.sleep
+    try:
+        for utterance in corpus:
+            backend.reset()
+            start = time.time()
+            rule = rules.get(utterance["rule"])
+            parse = decode(rule, utterance) if rule else None
+            decoded = time.time()
+            result.decode_time += decoded - start
+            if parse is None:
+                result.failures.append(utterance)
+                result.keys.append(None)
+                continue
+            node, extras, matched = parse
+            if not matched:
+                result.unmatched += 1
+            rule._process_recognition(node, extras)
+            result.execute_time += time.time() - decoded
+            result.keys.append([[key, down] for (key, down)
+                                in backend.key_events])
+    finally:
+        _action_executor.enabled, pacer.sleep = enabled, sleep
+    return result
+
+
+def compare_modifiers(commands, corpus, result):
+    """Replays the corpus with every modifier release sent, and returns the
+    number of utterances whose keys differ from result other than in redundant
+    releases.
+    """
+    import _modifier_state
+    _modifier_state.enabled = False
+    try:
+        unfiltered = replay(commands, corpus)
+    finally:
+        _modifier_state.enabled = True
+    count = lambda keys_list: sum(len(keys or ()) for keys in keys_list)
+    saved = count(unfiltered.keys) - count(result.keys)
+    print("Modifier tracking: %d of %d key events saved" % (
+        saved, count(unfiltered.keys)))
+    different = 0
+    held_modifiers = _modifier_state.held_modifiers
+    for (utterance, keys, unfiltered_keys) in zip(corpus, result.keys,
+                                                  unfiltered.keys):
+        if held_modifiers(keys or ()) != held_modifiers(unfiltered_keys or ()):
+            different += 1
+            print("Different keys: %s" % " ".join(utterance["words"]))
+    return different
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("corpus", nargs="?",
+                        help="utterances recorded by _utterance_recording")
+    parser.add_argument("--save", help="write the keys of each utterance")
+    parser.add_argument("--check", help="compare the keys to a saved file")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--modifiers", action="store_true",
+                        help="report the key events saved by modifier tracking")
+    args = parser.parse_args(argv)
+    commands = _import_commands()
+    if args.corpus:
+        from _utterance_recording import read_utterances
+        corpus = read_utterances(args.corpus)
+    else:
+        corpus = sample_corpus(commands)
+    for run in range(args.runs):
+        result = replay(commands, corpus)
+        print("Run %d: %s" % (run + 1, result.report()))
+    for utterance in result.failures:
+        print("No parse: %s %s" % (utterance["rule"],
+                                   " ".join(utterance["words"])))
+    failures = len(result.failures)
+    if args.modifiers:
+        failures += compare_modifiers(commands, corpus, result)
+    if args.save:
+        with open(args.save, "w") as keys_file:
+            for (utterance, keys) in zip(corpus, result.keys):
+                keys_file.write(json.dumps({"words": utterance["words"],
+                                            "keys": keys}) + "\n")
+    if args.check:
+        with open(args.check) as keys_file:
+            expected = [json.loads(line)["keys"] for line in keys_file
+                        if line.strip()]
+        different = 0
+        for (utterance, keys, expected_keys) in zip(corpus, result.keys,
+                                                    expected):
+            if keys != expected_keys:
+                different += 1
+                print("Different keys: %s" % " ".join(utterance["words"]))
+        if len(expected) != len(corpus):
+            print("Expected %d utterances, replayed %d" % (len(expected),
+                                                           len(corpus)))
+            different += 1
+        print("%d of %d utterances send different keys" % (different,
+                                                           len(corpus)))
+        failures += different
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Checks and benchmarks the window index in _window_index without Windows.
+
+Opens stand-in windows of standin_engine and speaks the "go" and "swap"
+commands of _window_switching through _commands.py. Checks that they activate
+the expected window by handle, without sending keys, and fall back to the
+taskbar keys when the application has no window. Then measures refreshing the
+index, lookups and activations with a growing number of open windows, next to
+the time the taskbar keys wait.
+
+Run it from the directory above this one:
+    python benchmarks/window_benchmark.py
+"""
+
+import sys
+import timeit
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import standin_engine
+from standin_engine import Window
+
+_windows = [
+    ("C:\\Program Files\\Google\\Chrome\\chrome.exe", "Inbox - Google Chrome"),
+    ("C:\\Users\\me\\AppData\\Local\\slack\\slack.exe", "Slack - team"),
+    ("C:\\Windows\\explorer.exe", "Program Manager"),
+    ("C:\\Program Files\\Google\\Chrome\\chrome.exe", "Docs - Google Chrome"),
+    ("C:\\Program Files\\Microsoft Office\\OUTLOOK.EXE", "Inbox - Outlook"),
+    ("C:\\Windows\\explorer.exe", "Downloads"),
+]
+
+
+def open_windows(windows, first_handle=1):
+    """Opens the (executable, title) windows, with the first in front."""
+    for (index, (executable, title)) in reversed(list(enumerate(windows))):
+        Window.open(executable, title, first_handle + index)
+
+
+def check_commands():
+    """Returns the number of commands that did not activate the expected
+    window or send the expected keys.
+    """
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        import _commands
+    finally:
+        sys.stdout = stdout
+    from _action_executor import executor
+    from _pacing import pacer
+    from _window_index import window_index
+    backend = standin_engine.backend
+    pacer.sleep = backend.sleep
+    engine = standin_engine.get_engine()
+    open_windows(_windows)
+    window_index.refresh()
+
+    # Words, title of the foreground window after them, and keys typed.
+    commands = [
+        ("go browse", "Inbox - Google Chrome", []),
+        ("go slack", "Slack - team", []),
+        ("swap", "Inbox - Google Chrome", []),
+        ("go to browse", "Docs - Google Chrome", []),
+        ("swap two", "Slack - team", []),
+        ("go explore", "Downloads", []),
+        ("go email", "Inbox - Outlook", []),
+        ("go storm", "Inbox - Outlook", ["win", "2"]),
+    ]
+    failures = 0
+    try:
+        for (words, title, keys) in commands:
+            backend.reset()
+            engine.mimic(words)
+            executor.wait()
+            # The foreground window is polled on the engine thread.
+            engine.run_timers()
+            foreground = Window.get_foreground().title
+            typed = backend.typed()
+            ok = foreground == title and typed == keys
+            print("%-16s %s" % (words, "ok" if ok else
+                                "FAILED: %r in front, typed %r"
+                                % (foreground, typed)))
+            if not ok:
+                failures += 1
+
+        # The closed window is found in the index, fails to activate, and the
+        # index is refreshed.
+        for window in Window.get_all_windows():
+            if window.title == "Docs - Google Chrome":
+                window.close()
+        refreshes = window_index.refreshes
+        engine.mimic("go browse")
+        executor.wait()
+        ok = Window.get_foreground().title == "Inbox - Google Chrome" \
+            and window_index.refreshes > refreshes
+        print("%-16s %s" % ("closed window", "ok" if ok else "FAILED"))
+        if not ok:
+            failures += 1
+    finally:
+        _commands.word_list_server.stop()
+        executor.stop()
+    print(window_index.report())
+    return failures
+
+
+def _time(function, number):
+    """Returns the best time per call in microseconds."""
+    return min(timeit.repeat(function, repeat=3, number=number)) * 1e6 / number
+
+
+def measure(counts=(10, 100, 1000)):
+    from _window_index import WindowIndex
+    print("")
+    print("%-10s %12s %12s %12s %12s" % ("Windows", "refresh", "poll",
+                                          "lookup", "activate"))
+    for count in counts:
+        standin_engine.reset()
+        open_windows([("C:\\Apps\\app%d.exe" % (index % 50),
+                       "Window %d" % index) for index in range(count)])
+        index = WindowIndex()
+        index.refresh()
+        windows = Window.get_all_windows()
+        number = max(10, 20000 // count)
+
+        def poll():
+            Window.foreground = windows[-1]
+            index.poll()
+            Window.foreground = windows[0]
+            index.poll()
+
+        print("%-10d %9.1f us %9.1f us %9.1f us %9.1f us" % (
+            count,
+            _time(index.refresh, number),
+            _time(poll, number) / 2,
+            _time(lambda: index.find("app49", position=0), number),
+            _time(lambda: index.activate("app7", "window 7"), number)))
+    print("The taskbar keys wait 100 ms for \"go\" and 200 ms for \"go to\".")
+
+
+def main():
+    standin_engine.install()
+    failures = check_commands()
+    measure()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+# (c) Copyright 2016 by Andreas Hagen Ulltveit-Moe
+# Licensed under the LGPL, see <http://www.gnu.org/licenses/>
+
+"""Load test of the word list server in _word_list_server, against the
+stand-in engine in standin_engine.
+
+Several clients add and remove words concurrently while the engine timers run,
+and the test checks that the lists end up with the expected words and counts
+how many List.set calls the requests were coalesced into. A single client then
+replaces a list once per simulated keystroke, like an editor plugin pushing
+the identifiers around the cursor, and the test checks that plugin words do
+not replace those of the identifier index. Finally it pushes an identifier to
+the context word list of _commands.py and checks that it can be dictated, also
+after unloading and importing _commands.py again.
+
+Run it from the directory above this one:
+    python benchmarks/word_list_load_test.py
+"""
+
+import sys
+import threading
+import time
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import standin_engine
+
+clients = 8
+requests_per_client = 100
+
+
+def _serve(lists, debounce, max_delay):
+    from _word_list_server import WordListServer, WordListUpdater
+    from _word_lists import WordListSources
+    updater = WordListUpdater([WordListSources(word_list)
+                               for word_list in lists],
+                              debounce=debounce, max_delay=max_delay)
+    server = WordListServer(updater, port=0)
+    server.start()
+    return server
+
+
+def _run_timers_until(done, interval=0.01):
+    engine = standin_engine.get_engine()
+    while not done():
+        engine.run_timers()
+        time.sleep(interval)
+
+
+def _client_words(client, request):
+    return ["client%d word%d" % (client, request)]
+
+
+def check_concurrent():
+    """Returns 1 if the lists do not hold the words the clients left, else
+    0.
+    """
+    from _word_list_client import WordListClient
+    lists = [standin_engine.List("list%d" % index, [])
+             for index in range(2)]
+    server = _serve(lists, debounce=0.05, max_delay=0.5)
+    latencies = []
+
+    def run(client):
+        proxy = WordListClient(server.port)
+        name = lists[client % len(lists)].name
+        for request in range(requests_per_client):
+            start = time.time()
+            proxy.add_words(name, _client_words(client, request))
+            # Every fifth request removes the word added before it.
+            if request % 5 == 4:
+                proxy.remove_words(name, _client_words(client, request - 1))
+            latencies.append(time.time() - start)
+
+    threads = [threading.Thread(target=run, args=(client,))
+               for client in range(clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    _run_timers_until(lambda: not any(thread.is_alive()
+                                      for thread in threads))
+    elapsed = time.time() - start
+    server.stop()
+
+    failures = 0
+    for (index, word_list) in enumerate(lists):
+        expected = set()
+        for client in range(index, clients, len(lists)):
+            for request in range(requests_per_client):
+                if request % 5 != 3:
+                    expected.update(_client_words(client, request))
+        if set(word_list) != expected or len(word_list) != len(expected):
+            print("%s: FAILED, %d words instead of %d" % (
+                word_list.name, len(word_list), len(expected)))
+            failures = 1
+    requests = server.updater.requests
+    print("%d clients sent %d requests in %.0f ms, %.0f requests/s" % (
+        clients, requests, elapsed * 1000, requests / elapsed))
+    print("Request latency %.2f ms average, %.2f ms max" % (
+        sum(latencies) * 1000 / len(latencies), max(latencies) * 1000))
+    print("%d List.set calls for %d requests" % (
+        sum(word_list.updates for word_list in lists), requests))
+    return failures
+
+
+def check_keystrokes(keystrokes=200, interval=0.005):
+    """Replaces a list once per keystroke, and returns 1 if the list does not
+    end up with the last words, else 0.
+    """
+    from _word_list_client import WordListClient
+    word_list = standin_engine.List("context_word_list", [])
+    server = _serve([word_list], debounce=0.3, max_delay=2.0)
+    proxy = WordListClient(server.port)
+    engine = standin_engine.get_engine()
+    start = time.time()
+    for keystroke in range(keystrokes):
+        proxy.replace_words(word_list.name,
+                            ["identifier%d" % index
+                             for index in range(keystroke, keystroke + 50)])
+        engine.run_timers()
+        time.sleep(interval)
+    elapsed = time.time() - start
+    time.sleep(server.updater.debounce)
+    engine.run_timers()
+    server.stop()
+    print("")
+    print("%d replacements over %.0f ms gave %d List.set calls" % (
+        keystrokes, elapsed * 1000, word_list.updates))
+    expected = ["identifier%d" % index
+                for index in range(keystrokes - 1, keystrokes + 49)]
+    if list(word_list) != expected:
+        print("FAILED: the list does not hold the last replacement")
+        return 1
+    return 0
+
+
+def check_sources():
+    """Returns 1 if a list does not hold both the words of the identifier
+    index and those of plugins, else 0.
+    """
+    from _word_list_client import WordListClient
+    word_list = standin_engine.List("context_word_list", [])
+    server = _serve([word_list], debounce=0, max_delay=0)
+    sources = server.updater.lists[word_list.name]
+    proxy = WordListClient(server.port)
+    # Words of the index, words replaced by a plugin, and the list after them.
+    steps = [
+        (["getUserName"], None, ["getUserName"]),
+        (None, ["maxValue"], ["getUserName", "maxValue"]),
+        (["userId"], None, ["userId", "maxValue"]),
+        (None, [], ["userId"]),
+    ]
+    failures = 0
+    try:
+        for (index_words, plugin_words, expected) in steps:
+            if index_words is not None:
+                sources.set("index", index_words)
+            if plugin_words is not None:
+                proxy.replace_words(word_list.name, plugin_words)
+                standin_engine.get_engine().run_timers()
+            if list(word_list) != expected:
+                print("FAILED: the list holds %r instead of %r" % (
+                    list(word_list), expected))
+                failures = 1
+    finally:
+        server.stop()
+    print("")
+    print("index and plugin words: %s" % ("FAILED" if failures else "ok"))
+    return failures
+
+
+def _dictate_identifier(commands):
+    """Pushes an identifier to the context word list of the given import of
+    _commands.py, and returns 1 if it cannot be dictated, else 0.
+    """
+    from _action_executor import executor
+    from _pacing import pacer
+    from _word_list_client import WordListClient
+    backend = standin_engine.backend
+    pacer.sleep = backend.sleep
+    server = commands.word_list_server
+    server.stop()
+    server.port = 0
+    server.start()
+    WordListClient(server.port).replace_words(
+        "context_word_list", ["getUserName\\get user name"])
+    time.sleep(commands.word_list_updater.debounce)
+    standin_engine.get_engine().run_timers()
+    backend.reset()
+    try:
+        standin_engine.get_engine().mimic("identifier get user name")
+        executor.wait()
+        typed = "".join(backend.typed()).replace("shift", "")
+    except standin_engine.MimicFailure as e:
+        typed = str(e)
+    finally:
+        server.stop()
+        executor.stop()
+    if typed.lower() != "getusername":
+        print("identifier get user name: FAILED, typed %r" % typed)
+        return 1
+    print("identifier get user name: ok")
+    return 0
+
+
+def _import_commands():
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        import _commands
+    finally:
+        sys.stdout = stdout
+    return _commands
+
+
+def check_commands():
+    """Returns 1 if an identifier pushed to the context word list of
+    _commands.py cannot be dictated, else 0.
+    """
+    print("")
+    return _dictate_identifier(_import_commands())
+
+
+def check_reload():
+    """Unloads _commands.py and imports it again, like NatLink does when the
+    microphone is turned off and on. Returns the number of failures: the
+    grammar stays loaded after unload(), is not loaded again, holds two lists
+    with the same name, or an identifier pushed after the reload cannot be
+    dictated.
+    """
+    commands = _import_commands()
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        commands.unload()
+    finally:
+        sys.stdout = stdout
+    failures = 0
+    if commands.grammar.loaded:
+        print("unload: FAILED, the grammar is still loaded")
+        failures += 1
+    del sys.modules["_commands"]
+    commands = _import_commands()
+    names = [lst.name for lst in commands.grammar.lists]
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if not commands.grammar.loaded or duplicates:
+        print("reload: FAILED, grammar %s, lists %s twice" % (
+            "loaded" if commands.grammar.loaded else "not loaded",
+            ", ".join(duplicates) or "none"))
+        failures += 1
+    else:
+        print("reload: ok")
+    return failures + _dictate_identifier(commands)
+
+
+def main():
+    standin_engine.install()
+    return (check_concurrent() + check_keystrokes() + check_sources()
+            + check_commands() + check_reload())
+
+
+if __name__ == "__main__":
+    sys.exit(main())